@@ -0,0 +1,131 @@
+import io
+import os
+import shutil
+import struct
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+# Zip batches read in place as virtual folders, instead of being unpacked into
+# the tree first.
+#
+# The documents of `batch.zip` are grouped by their directory inside the
+# archive, and each group is handled as the folder it would unpack to:
+# `sub/a.doc` belongs to the folder `batch/sub` next to the archive. That
+# folder only receives what a pass writes anyway (Processed, Unprocessed,
+# directory_info.json, the run journal); the documents themselves are never
+# extracted to it.
+#
+# An ArchiveMember stands in for a document's path: readers given something
+# that is not a path call its open() and stat() instead. open() reads members
+# of up to MEMBER_BUFFER_SIZE bytes into memory and streams larger ones from
+# the archive, so memory stays bounded however big the archive or its members
+# are. Members carry what the central
+# directory says about them (offset, sizes, CRC), so a small stored or
+# deflated member is read with one seek instead of the directory being parsed
+# again for every document. They are small and picklable, so they can go to
+# extraction workers, which open the archive themselves. This module is only
+# imported once an archive is found (operations.ARCHIVE_INGESTION).
+
+# Members up to this size are read into memory, where seeking is free; larger
+# ones are decompressed as they are read, and re-read from the start when a
+# reader seeks backwards
+MEMBER_BUFFER_SIZE = 8 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+LOCAL_HEADER_MAGIC = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+
+MemberStat = namedtuple("MemberStat", ["st_size", "st_mtime_ns"])
+
+
+class ArchiveMember:
+    def __init__(self, archive, info):
+        self.archive = archive
+        self.name = info.filename
+        self.size = info.file_size
+        self.compressed_size = info.compress_size
+        self.compression = info.compress_type
+        self.crc = info.CRC
+        self.header_offset = info.header_offset
+        # Zip timestamps are local time with two-second resolution
+        self.mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+
+    def __str__(self):
+        return os.path.join(self.archive, *self.name.replace("\\", "/").split("/"))
+
+    def __repr__(self):
+        return f"ArchiveMember({self.archive!r}, {self.name!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, ArchiveMember) and (self.archive, self.name) == (other.archive, other.name)
+
+    def __hash__(self):
+        return hash((self.archive, self.name))
+
+    def stat(self):
+        return MemberStat(self.size, self.mtime_ns)
+
+    def open(self):
+        """A seekable binary file of the member's bytes."""
+        if self.size <= MEMBER_BUFFER_SIZE and self.compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return io.BytesIO(self._read())
+        with zipfile.ZipFile(self.archive) as archive:
+            member = archive.open(self.name)
+        # The member keeps the archive file open until it is closed itself
+        if self.size > MEMBER_BUFFER_SIZE:
+            return member
+        with member:
+            return io.BytesIO(member.read())
+
+    def _read(self):
+        with open(self.archive, "rb") as f:
+            f.seek(self.header_offset)
+            header = f.read(LOCAL_HEADER_SIZE)
+            if len(header) < LOCAL_HEADER_SIZE or not header.startswith(LOCAL_HEADER_MAGIC):
+                raise zipfile.BadZipFile(f"Bad local header for {self.name} in {self.archive}")
+            name_length, extra_length = struct.unpack_from("<HH", header, 26)
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+            data = f.read(self.compressed_size)
+        if self.compression == zipfile.ZIP_DEFLATED:
+            # At most one byte past the recorded size, so a lying directory cannot blow up memory
+            data = zlib.decompressobj(-15).decompress(data, self.size + 1)
+        if len(data) != self.size or zlib.crc32(data) != self.crc:
+            raise zipfile.BadZipFile(f"Bad CRC-32 or size for {self.name} in {self.archive}")
+        return data
+
+
+def copy_member(member, destination):
+    """Write `member` to `destination` in chunks, with the member's timestamp as copy2 would keep it."""
+    with member.open() as src, open(destination, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    mtime = member.mtime_ns
+    os.utime(destination, ns=(mtime, mtime))
+
+
+def archive_folder(archive_path):
+    """The folder `archive_path` stands for: its path without the extension."""
+    return os.path.splitext(archive_path)[0]
+
+
+def list_members(archive_path, extensions):
+    """{virtual folder: {file name: ArchiveMember}} for the documents in the zip at `archive_path`.
+
+    Only the central directory is read. Directory entries, encrypted members
+    and names that would leave the folder (absolute, or with "..") are left out;
+    a name stored twice keeps its last entry, as unpacking would.
+    """
+    root = archive_folder(archive_path)
+    folders = {}
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            parts = info.filename.replace("\\", "/").split("/")
+            if info.is_dir() or info.flag_bits & 0x1 or info.filename.startswith("/") \
+                    or any(part in ("", ".", "..") for part in parts[:-1]) or not parts[-1]:
+                continue
+            if os.path.splitext(parts[-1])[1].lower() not in extensions:
+                continue
+            folder = os.path.join(root, *parts[:-1])
+            folders.setdefault(folder, {})[parts[-1]] = ArchiveMember(archive_path, info)
+    return folders
@@ -0,0 +1,161 @@
+"""Reproducible synthetic document trees for the pipeline benchmarks.
+
+    python benchmarks/_corpus.py OUTPUT_DIR [--depth 2] [--fan-out 3] [--files 40]
+                                 [--mix table=3,paragraph=3,footer=2,text=1,legacy=1,link=1]
+                                 [--filler 0] [--duplicates 0] [--seed 0]
+
+Every directory below OUTPUT_DIR (fan_out subdirectories per level, `depth`
+levels) gets `files` documents. Kinds are drawn by weight from `mix`:
+
+    table      .docx with a Patient/DOB/Admit Date table
+    paragraph  .docx with "Patient:"/"DOB:"/"Date:" paragraphs
+    footer     .docx whose only patient data is the footer line
+    text       plain text saved with a .doc name
+    legacy     Word 97-2003 (OLE2) .doc with paragraphs and a footer
+    link       corrupt files python-docx rejects with "Package not found"
+
+`filler` adds that many paragraphs of note text to each document.
+`duplicates` adds that fraction of `files` to each directory again as
+byte-identical copies of documents picked from anywhere in the tree, as when
+one referral is dropped into several folders. The same
+arguments and seed always produce the same names and contents. Document names
+are unique across the tree (the replace write mode deletes by document name);
+patient names repeat on purpose, so Processed names need suffixes.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+
+from _support import write_footer_docx, write_legacy_doc, write_paragraph_docx, write_table_docx
+
+KINDS = ("table", "paragraph", "footer", "text", "legacy", "link")
+DEFAULT_MIX = {"table": 3, "paragraph": 3, "footer": 2, "text": 1, "legacy": 1, "link": 1}
+
+LEGACY_FILLER_MAX = 500
+
+FIRST_NAMES = ["Jane", "John", "Anne", "Omar", "Priya", "Luis", "Mei", "Sam", "Ada", "Ravi"]
+LAST_NAMES = ["Doe", "Roe", "Smith", "Khan", "Garcia", "Chen", "Okafor", "Novak", "Silva", "Ito"]
+
+
+def parse_mix(text):
+    """"table=3,text=1" -> {"table": 3, "text": 1}"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"Unknown document kind {kind!r}; expected one of {KINDS}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def _date(rnd, start_year, end_year):
+    return f"{rnd.randint(1, 12):02d}/{rnd.randint(1, 28):02d}/{rnd.randint(start_year, end_year)}"
+
+
+def write_document(path, kind, rnd, filler):
+    first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+    dob, adm_dt = _date(rnd, 1930, 2010), _date(rnd, 2015, 2024)
+    note = [f"Progress note line {i} without any identifying fields." for i in range(filler)]
+
+    if kind == "table":
+        write_table_docx(path, f"{first} {last}", dob, adm_dt)
+    elif kind == "paragraph":
+        write_paragraph_docx(path, f"{first} {last}", dob, adm_dt, filler=filler)
+    elif kind == "footer":
+        write_footer_docx(path, last, first, dob, adm_dt)
+    elif kind == "text":
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join([f"Patient: {first} {last}", f"DOB: {dob}", f"Date: {adm_dt}"] + note) + "\n")
+    elif kind == "legacy":
+        # write_legacy_doc only writes documents that fit one FAT sector (about 60 KB)
+        write_legacy_doc(path, [f"Patient: {first} {last}", f"DOB: {dob}", f"Date: {adm_dt}"] + note[:LEGACY_FILLER_MAX],
+                         footer=f"{last}, {first} 12345 {dob} {adm_dt}")
+    else:
+        # Half look like a damaged zip package, half are arbitrary bytes
+        header = b"PK\x03\x04" if rnd.random() < 0.5 else b""
+        with open(path, "wb") as f:
+            f.write(header + bytes(rnd.getrandbits(8) for _ in range(rnd.randint(256, 4096))))
+
+
+def build_corpus(root, depth=2, fan_out=3, files=40, mix=None, filler=0, seed=0, duplicates=0.0):
+    """Write the tree under `root` and return a description of it (folders, files, bytes, kinds, copies)."""
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, weights = zip(*sorted(mix.items()))
+    extensions = {"table": ".docx", "paragraph": ".docx", "footer": ".docx",
+                  "text": ".doc", "legacy": ".doc", "link": (".doc", ".docx")}
+
+    folders = []
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(parent, f"folder_{i}") for parent in level for i in range(fan_out)]
+        folders.extend(level)
+
+    counts = dict.fromkeys(kinds, 0)
+    total_bytes = 0
+    for number, folder in enumerate(folders):
+        os.makedirs(folder, exist_ok=True)
+        for i in range(files):
+            kind = rnd.choices(kinds, weights)[0]
+            extension = extensions[kind]
+            if isinstance(extension, tuple):
+                extension = rnd.choice(extension)
+            path = os.path.join(folder, f"{kind}_{number}_{i}{extension}")
+            write_document(path, kind, rnd, filler)
+            counts[kind] += 1
+            total_bytes += os.path.getsize(path)
+
+    copies = 0
+    if duplicates:
+        # Drawn separately so the documents above stay the same for a given seed
+        rnd = random.Random(seed + 1)
+        documents = sorted(os.path.join(folder, name) for folder in folders for name in os.listdir(folder)
+                           if os.path.isfile(os.path.join(folder, name)))
+        for number, folder in enumerate(folders):
+            for i in range(int(files * duplicates)):
+                original = rnd.choice(documents)
+                path = os.path.join(folder, f"copy_{number}_{i}{os.path.splitext(original)[1]}")
+                shutil.copyfile(original, path)
+                copies += 1
+                total_bytes += os.path.getsize(path)
+
+    return {
+        "folders": len(folders),
+        "files": sum(counts.values()) + copies,
+        "bytes": total_bytes,
+        "kinds": counts,
+        "copies": copies,
+        "settings": {"depth": depth, "fan_out": fan_out, "files": files, "mix": dict(mix),
+                     "filler": filler, "seed": seed, "duplicates": duplicates},
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("--depth", type=int, default=2, help="directory levels below the root")
+    parser.add_argument("--fan-out", type=int, default=3, help="subdirectories per directory")
+    parser.add_argument("--files", type=int, default=40, help="documents per directory")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="kind=weight list, e.g. table=3,paragraph=3,footer=2,text=1,legacy=1,link=1")
+    parser.add_argument("--filler", type=int, default=0, help="extra note paragraphs per document")
+    parser.add_argument("--duplicates", type=float, default=0.0,
+                        help="fraction of --files added per directory as copies of documents elsewhere")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic document tree.")
+    parser.add_argument("output")
+    add_arguments(parser)
+    args = parser.parse_args()
+    description = build_corpus(args.output, args.depth, args.fan_out, args.files, args.mix, args.filler, args.seed,
+                               args.duplicates)
+    json.dump(description, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
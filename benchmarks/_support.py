@@ -0,0 +1,246 @@
+"""Shared helpers for the benchmark scripts.
+
+The benchmarks run against a throwaway directory tree and, where a database is
+needed, a local SQLite stand-in for `patient_data`. They are plain scripts:
+
+    python benchmarks/bench_document_parses.py
+"""
+import os
+import sys
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def use_sqlite_config(db_path):
+    """Point `config.config.CONNECTION_STRING` at a SQLite file unless a real config is importable.
+
+    Called again, it moves the stand-in config to the new file; modules that
+    already read the connection string keep the old one.
+    """
+    stub = sys.modules.get("config.config")
+    if stub is not None and getattr(stub, "BENCH_STUB", False):
+        stub.CONNECTION_STRING = f"sqlite:///{db_path}"
+        return True
+    try:
+        import config.config  # noqa: F401
+        return False
+    except ImportError:
+        pass
+    package = types.ModuleType("config")
+    module = types.ModuleType("config.config")
+    module.BENCH_STUB = True
+    module.CONNECTION_STRING = f"sqlite:///{db_path}"
+    package.config = module
+    sys.modules["config"] = package
+    sys.modules["config.config"] = module
+    return True
+
+
+def write_table_docx(path, patient, dob, adm_dt):
+    from docx import Document
+    doc = Document()
+    table = doc.add_table(rows=3, cols=2)
+    for row, (key, value) in zip(table.rows, [("Patient Name:", patient), ("DOB:", dob), ("Admit Date:", adm_dt)]):
+        row.cells[0].text = key
+        row.cells[1].text = value
+    doc.save(path)
+
+
+def write_paragraph_docx(path, patient, dob, adm_dt, filler=0):
+    from docx import Document
+    doc = Document()
+    doc.add_paragraph(f"Patient: {patient}")
+    doc.add_paragraph(f"DOB: {dob}")
+    doc.add_paragraph(f"Date: {adm_dt}")
+    for i in range(filler):
+        doc.add_paragraph(f"Progress note line {i} without any identifying fields.")
+    doc.save(path)
+
+
+def write_footer_docx(path, last_name, first_name, dob, adm_dt):
+    from docx import Document
+    doc = Document()
+    doc.add_paragraph("Consultation note.")
+    doc.sections[0].footer.paragraphs[0].text = f"{last_name}, {first_name} 12345 {dob} {adm_dt}"
+    doc.save(path)
+
+
+def write_large_report_docx(path, patient, dob, adm_dt, lab_rows):
+    """Header table followed by a `lab_rows`-row lab table, written straight as package XML."""
+    import zipfile
+    from docx import Document
+    from xml.sax.saxutils import escape
+
+    def row(*cells):
+        return "<w:tr>" + "".join(
+            f"<w:tc><w:p><w:r><w:t xml:space=\"preserve\">{escape(c)}</w:t></w:r></w:p></w:tc>" for c in cells
+        ) + "</w:tr>"
+
+    header = row("Patient Name:", patient) + row("DOB:", dob) + row("Admit Date:", adm_dt)
+    labs = "".join(row(f"Test {i}", f"{i % 97}.{i % 10}", "mmol/L") for i in range(lab_rows))
+    body = f"<w:tbl>{header}</w:tbl><w:p/><w:tbl>{labs}</w:tbl><w:p/>"
+
+    template = path + ".tmpl"
+    Document().save(template)
+    with zipfile.ZipFile(template) as src, zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == "word/document.xml":
+                xml = data.decode("utf-8")
+                start = xml.index("<w:body>") + len("<w:body>")
+                data = (xml[:start] + body + xml[start:]).encode("utf-8")
+            dst.writestr(item, data)
+    os.remove(template)
+
+
+PATIENT_DATA_DDL = """
+CREATE TABLE IF NOT EXISTS patient_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_first_name TEXT,
+    patient_last_name TEXT,
+    dob TIMESTAMP,
+    request_date TIMESTAMP,
+    old_document TEXT,
+    new_document TEXT,
+    old_document_path TEXT,
+    new_document_path TEXT,
+    is_deleted INTEGER
+)
+"""
+
+
+def create_patient_data_table(engine):
+    """Create the SQLite stand-in for `patient_data` on `engine` and empty it."""
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text(PATIENT_DATA_DDL))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS patient_data_old_document_path ON patient_data (old_document_path)"))
+        conn.execute(text("DELETE FROM patient_data"))
+
+
+def patient_rows(count, folder="C:/Data/Referrals"):
+    """Row dicts with the patient_data columns and "yyyy-mm-dd" dates, for `count` distinct documents."""
+    rows = []
+    for i in range(count):
+        old_document = f"referral_{i}.docx"
+        new_document = f"doe_{i}_19800102_20240304.docx"
+        rows.append({
+            "id": i + 1,
+            "patient_first_name": f"Jane{i}",
+            "patient_last_name": "Doe",
+            "dob": "1980-01-02",
+            "request_date": "2024-03-04",
+            "old_document": old_document,
+            "new_document": new_document,
+            "is_deleted": 0,
+            "old_document_path": f"{folder}/{old_document}",
+            "new_document_path": f"{folder}/Processed/{new_document}",
+        })
+    return rows
+
+
+def patient_rows_frame(count, folder="C:/Data/Referrals"):
+    """A DataFrame shaped like the one process_folder used to build, with `count` distinct documents."""
+    import pandas as pd
+    return pd.DataFrame(patient_rows(count, folder))
+
+
+def patient_records(count, folder="C:/Data/Referrals"):
+    """PatientRecords as process_folder hands them to insert_patient_records."""
+    from patient_records import PatientRecord
+    return [PatientRecord.from_row(row) for row in patient_rows(count, folder)]
+
+
+def write_legacy_doc(path, paragraphs, footer=None, cells=None):
+    """Write a minimal Word 97-2003 .doc (OLE2) with `paragraphs`, optional key/value `cells` rows and a footer.
+
+    Only the parts ole_doc reads are present: a FIB, compressed (cp1252) text
+    in one piece, the CLX and, with a footer, a PlcfHdd for one section. Both
+    streams are padded past the mini-stream cutoff so they live in regular
+    sectors.
+    """
+    import struct
+
+    body = "".join(p + "\r" for p in paragraphs)
+    for key, value in cells or []:
+        body += f"{key}\x07{value}\x07\x07"
+    footer_story = f"{footer}\r" if footer else ""
+    text = (body + footer_story).encode("cp1252")
+    ccp_text, ccp_hdd = len(body), len(footer_story)
+
+    # FIB: FibBase, 14 words, 22 longs, 93 fc/lcb pairs, no FibRgCswNew
+    fib = bytearray(32 + 2 + 28 + 2 + 88 + 2 + 93 * 8 + 2)
+    struct.pack_into("<HH", fib, 0, 0xA5EC, 0x00C1)
+    struct.pack_into("<H", fib, 0x0A, 0x0200)  # fWhichTblStm: 1Table
+    struct.pack_into("<H", fib, 32, 14)
+    lw = 34 + 28
+    struct.pack_into("<H", fib, lw, 22)
+    struct.pack_into("<III", fib, lw + 2 + 3 * 4, ccp_text, 0, ccp_hdd)
+    fc = lw + 2 + 88
+    struct.pack_into("<H", fib, fc, 93)
+    text_offset = 1024
+    word_stream = bytes(fib).ljust(text_offset, b"\0") + text
+
+    clx_body = struct.pack("<II", 0, len(text)) + struct.pack("<HIH", 0, (text_offset * 2) | 0x40000000, 0)
+    clx = b"\x02" + struct.pack("<I", len(clx_body)) + clx_body
+    plcf_hdd = b""
+    if footer:
+        # 6 empty separators, then even/odd header, even/odd footer, first header/footer of section 1
+        cps = [0] * 10 + [ccp_hdd] * 3
+        plcf_hdd = struct.pack(f"<{len(cps)}I", *cps)
+    table_stream = clx + plcf_hdd
+    fib_with_offsets = bytearray(word_stream)
+    struct.pack_into("<II", fib_with_offsets, fc + 2 + 33 * 8, 0, len(clx))
+    if plcf_hdd:
+        struct.pack_into("<II", fib_with_offsets, fc + 2 + 11 * 8, len(clx), len(plcf_hdd))
+    word_stream = bytes(fib_with_offsets)
+
+    sector = 512
+    streams = [word_stream.ljust(4096, b"\0"), table_stream.ljust(4096, b"\0")]
+    sizes = [len(s) for s in streams]
+    data_sectors = [-(-len(s) // sector) for s in streams]
+    total_sectors = 2 + sum(data_sectors)  # FAT + directory + data
+    if total_sectors > sector // 4:
+        raise ValueError("document too large for the single-FAT-sector writer")
+
+    fat = [0xFFFFFFFD, 0xFFFFFFFE]
+    starts = []
+    next_sector = 2
+    for count in data_sectors:
+        starts.append(next_sector)
+        fat.extend(range(next_sector + 1, next_sector + count))
+        fat.append(0xFFFFFFFE)
+        next_sector += count
+    fat += [0xFFFFFFFF] * (sector // 4 - len(fat))
+
+    def entry(name, kind, start, size, child=0xFFFFFFFF, right=0xFFFFFFFF):
+        raw = bytearray(128)
+        encoded = (name + "\0").encode("utf-16-le")
+        raw[:len(encoded)] = encoded
+        struct.pack_into("<HBB", raw, 64, len(encoded), kind, 1)
+        struct.pack_into("<III", raw, 68, 0xFFFFFFFF, right, child)
+        struct.pack_into("<IQ", raw, 116, start, size)
+        return bytes(raw)
+
+    directory = (entry("Root Entry", 5, 0xFFFFFFFE, 0, child=1)
+                 + entry("WordDocument", 2, starts[0], sizes[0], right=2)
+                 + entry("1Table", 2, starts[1], sizes[1])
+                 + bytes(128))
+
+    header = bytearray(512)
+    header[:8] = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+    struct.pack_into("<HHHHH", header, 0x18, 0x003E, 3, 0xFFFE, 9, 6)
+    struct.pack_into("<II", header, 0x2C, 1, 1)
+    struct.pack_into("<5I", header, 0x38, 4096, 0xFFFFFFFE, 0, 0xFFFFFFFE, 0)
+    difat = [0] + [0xFFFFFFFF] * 108
+    struct.pack_into("<109I", header, 0x4C, *difat)
+
+    with open(path, "wb") as f:
+        f.write(bytes(header))
+        f.write(struct.pack(f"<{sector // 4}I", *fat))
+        f.write(directory)
+        for stream, count in zip(streams, data_sectors):
+            f.write(stream.ljust(count * sector, b"\0"))
@@ -0,0 +1,74 @@
+"""Compare the old row-by-row insert with insert_patient_records' batched path.
+
+The DataFrame entry point, getDataFromDfandInsertInDB, is timed as well; the
+difference to the record path is the cost of converting the frame.
+
+Runs against a local SQLite stand-in for `patient_data`. SQLite has no network
+round-trip, so the gap on a real server is larger than what is printed here.
+"""
+import os
+import tempfile
+import time
+
+from _support import create_patient_data_table, patient_records, patient_rows_frame, use_sqlite_config
+
+ROWS = 5000
+
+
+def legacy_insert(db, df):
+    """The iterrows() loop getDataFromDfandInsertInDB used before batching."""
+    import pandas as pd
+    from sqlalchemy import text
+    df = df.copy()
+    df = df.drop(columns=["id"])
+    df["dob"] = pd.to_datetime(df["dob"], errors="coerce")
+    df["request_date"] = pd.to_datetime(df["request_date"], errors="coerce")
+    old_documents = df["old_document"].dropna().unique().tolist()
+    with db.get_engine().connect() as conn:
+        placeholders = ", ".join([f":doc{i}" for i in range(len(old_documents))])
+        params = {f"doc{i}": doc for i, doc in enumerate(old_documents)}
+        conn.execute(text(f"DELETE FROM patient_data WHERE old_document IN ({placeholders})"), params)
+        conn.commit()
+    with db.get_engine().begin() as conn:
+        for _, row in df.iterrows():
+            # pyodbc took the Timestamps as datetimes; the sqlite3 driver needs the real type
+            params = {key: value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+                      for key, value in row.to_dict().items()}
+            conn.execute(db.get_insert_query(), params)
+
+
+def count_rows(db):
+    from sqlalchemy import text
+    with db.get_engine().connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM patient_data")).scalar()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import db_data_insert as db
+
+        create_patient_data_table(db.get_engine())
+        df = patient_rows_frame(ROWS)
+
+        start = time.perf_counter()
+        legacy_insert(db, df)
+        print(f"row-by-row  rows={count_rows(db)} time={time.perf_counter() - start:.3f}s")
+
+        records = patient_records(ROWS)
+        for batch_size in (100, 500, 2000):
+            create_patient_data_table(db.get_engine())
+            db.INSERT_BATCH_SIZE = batch_size
+            start = time.perf_counter()
+            db.insert_patient_records(records)
+            print(f"batch={batch_size:<5d} rows={count_rows(db)} time={time.perf_counter() - start:.3f}s")
+
+        create_patient_data_table(db.get_engine())
+        db.INSERT_BATCH_SIZE = 500
+        start = time.perf_counter()
+        db.getDataFromDfandInsertInDB(df.copy())
+        print(f"DataFrame   rows={count_rows(db)} time={time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
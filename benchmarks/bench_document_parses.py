@@ -0,0 +1,71 @@
+"""Count python-docx parses per file for the old and the shared-analysis call patterns.
+
+Footer-only documents are the worst case: the table/paragraph strategy finds
+nothing, so the footer strategy has to look at the same file again.
+"""
+import os
+import tempfile
+import time
+
+import docx
+
+from _support import use_sqlite_config, write_footer_docx, write_paragraph_docx, write_table_docx
+
+FILES_PER_KIND = 20
+
+
+def build_corpus(directory):
+    paths = []
+    for i in range(FILES_PER_KIND):
+        for kind, writer, args in (
+            ("table", write_table_docx, (f"Jane Doe{i}", "01/02/1980", "03/04/2024")),
+            ("para", write_paragraph_docx, (f"John Roe{i}", "05/06/1975", "07/08/2024")),
+            ("footer", write_footer_docx, ("Smith", f"Anne{i}", "09/10/1960", "11/12/2024")),
+        ):
+            path = os.path.join(directory, f"{kind}_{i}.docx")
+            writer(path, *args)
+            paths.append(path)
+    return paths
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+
+        paths = build_corpus(tmp)
+        calls = {"count": 0}
+        # DocumentAnalysis looks Document up on the docx package when it first parses
+        real_document = docx.Document
+
+        def counting_document(*args, **kwargs):
+            calls["count"] += 1
+            return real_document(*args, **kwargs)
+
+        docx.Document = counting_document
+        try:
+            def legacy(path):
+                result = ed.extract_data(path)
+                if not all(result):
+                    ed.extract_from_footer(path)
+
+            def shared(path):
+                analysis = ed.DocumentAnalysis(path)
+                result = ed.extract_data(analysis)
+                if not all(result):
+                    ed.extract_from_footer(analysis)
+
+            for name, run in (("separate parses", legacy), ("shared analysis", shared)):
+                calls["count"] = 0
+                start = time.perf_counter()
+                for path in paths:
+                    run(path)
+                elapsed = time.perf_counter() - start
+                print(f"{name:16s} files={len(paths)} parses={calls['count']} "
+                      f"parses/file={calls['count'] / len(paths):.2f} time={elapsed:.3f}s")
+        finally:
+            docx.Document = real_document
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Check extract_data.FieldScanner against the three regex searches it replaced, and time both.
+
+The regression corpus is generated from the labels the patterns know (and
+words that merely contain them, like "Procedure:"), dates, times, blank
+paragraphs and punctuation, fed both as paragraphs and as one string; any
+difference from patient_regex/dob_regex/adm_dt_regex searching the joined
+text is printed and fails the run. The timing corpus is long letters whose
+patient and date sit near the top, with many "re:" occurrences in long
+paragraphs and, in half of them, the DOB only at the end.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from _support import use_sqlite_config
+
+CASES = 20000
+LETTERS = 40
+
+LABELS = ["Patient", "PATIENT", "Name", "Patient Information", "RE", "Re", "DOB", "Date of Birth",
+          "DateOfBirth", "Date", "ADM DT", "Admit Date", "Request Date", "Date ordered", "DATE OF CONSULT",
+          "Procedure", "Update", "Surname", "Candidate"]
+WORDS = ["Jane", "Doe,", "Smith", "referred", "for", "review", "-", "x.", "01/02/1980", "12/3/2024",
+         "20240101", "10:30AM", "3:05", "  ", "", "\t", "re:", "date:", "(age 40)", "Dr.", "name:"]
+
+
+def search_fields(ed, text):
+    patient_match = ed.patient_regex.search(text)
+    dob_match = ed.dob_regex.search(text)
+    adm_dt_match = ed.adm_dt_regex.search(text)
+    patient = patient_match.group(1).strip() if patient_match else None
+    dob = (dob_match.group(1) or dob_match.group(2)) if dob_match else None
+    adm_dt = adm_dt_match.group(1) if adm_dt_match else None
+    return patient, dob, adm_dt
+
+
+def random_paragraphs(rnd):
+    paragraphs = []
+    for _ in range(rnd.randint(0, 12)):
+        parts = []
+        for _ in range(rnd.randint(0, 8)):
+            if rnd.random() < 0.25:
+                parts.append(rnd.choice(LABELS) + rnd.choice([":", ": ", ":  ", " :", ""]))
+            else:
+                parts.append(rnd.choice(WORDS))
+        paragraphs.append(rnd.choice([" ", "", " ,"]).join(parts))
+    return paragraphs
+
+
+def letter(i):
+    # Half the letters have their DOB at the end, so every search has to get there
+    body = "We are writing re: your referral of this patient; see the attached results. " * 40
+    paragraphs = [f"Patient: Jane Doe {i}", "Date: 03/04/2024 10:30AM", ""] + [body] * 50
+    if i % 2:
+        return paragraphs[:2] + ["DOB: 01/02/1980"] + paragraphs[2:]
+    return paragraphs + ["DOB: 01/02/1980"]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+
+        rnd = random.Random(13)
+        mismatches = 0
+        for _ in range(CASES):
+            paragraphs = random_paragraphs(rnd)
+            text = "\n".join(paragraphs)
+            expected = search_fields(ed, text)
+            for got in (ed.scan_fields(paragraphs), ed.extract_from_text(text)):
+                if got != expected:
+                    mismatches += 1
+                    print(f"mismatch: {text!r}\n  searches={expected}\n  scanner={got}")
+        print(f"regression: {CASES} cases, {mismatches} mismatches")
+
+        letters = [letter(i) for i in range(LETTERS)]
+        size = sum(len("\n".join(p)) for p in letters)
+        print(f"letters: {LETTERS}, {size / 1024 / 1024:.1f} MiB of text")
+
+        start = time.perf_counter()
+        for paragraphs in letters:
+            search_fields(ed, "\n".join(paragraphs))
+        print(f"three searches  time={time.perf_counter() - start:.3f}s")
+
+        start = time.perf_counter()
+        for paragraphs in letters:
+            ed.scan_fields(paragraphs)
+        print(f"scan_fields     time={time.perf_counter() - start:.3f}s")
+
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
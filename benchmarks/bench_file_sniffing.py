@@ -0,0 +1,67 @@
+"""Time is_txt_file against doc_formats.sniff_file_type on a mixed corpus.
+
+is_txt_file reads and decodes every file in full; the sniffer reads a small
+header. The corpus mixes large OOXML reports, legacy OLE2 files, RTF, HTML
+saved as .doc and plain text, in roughly the proportions seen on the shares.
+"""
+import os
+import tempfile
+import time
+
+from _support import use_sqlite_config, write_large_report_docx
+
+COPIES = 20
+OLE2_SIZE = 2 * 1024 * 1024
+
+
+def build_corpus(directory):
+    import doc_formats
+
+    template = os.path.join(directory, "template.docx")
+    write_large_report_docx(template, "Jane Doe", "01/02/1980", "03/04/2024", 2000)
+    with open(template, "rb") as f:
+        docx_bytes = f.read()
+    os.remove(template)
+
+    ole2_bytes = doc_formats.OLE2_MAGIC + os.urandom(OLE2_SIZE)
+    rtf_bytes = (b"{\\rtf1\\ansi Patient: Jane Doe\\par DOB: 01/02/1980\\par Date: 03/04/2024\\par "
+                 + b"Progress note text.\\par " * 2000 + b"}")
+    html_bytes = (b"<html><body><p>Patient: Jane Doe</p><p>DOB: 01/02/1980</p>"
+                  + b"<p>Progress note text.</p>" * 2000 + b"</body></html>")
+    text_bytes = b"Patient: Jane Doe\nDOB: 01/02/1980\nDate: 03/04/2024\n" + b"Progress note text.\n" * 2000
+
+    paths = []
+    for i in range(COPIES):
+        for name, data in (("report.docx", docx_bytes), ("legacy.doc", ole2_bytes), ("letter.doc", rtf_bytes),
+                           ("web.doc", html_bytes), ("note.doc", text_bytes)):
+            path = os.path.join(directory, f"{i}_{name}")
+            with open(path, "wb") as f:
+                f.write(data)
+            paths.append(path)
+    return paths
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import doc_formats
+        import extract_data as ed
+
+        paths = build_corpus(tmp)
+        total = sum(os.path.getsize(p) for p in paths)
+        print(f"corpus: {len(paths)} files, {total / 1024 / 1024:.1f} MiB")
+
+        start = time.perf_counter()
+        text_files = sum(1 for p in paths if ed.is_txt_file(p))
+        print(f"is_txt_file      time={time.perf_counter() - start:.3f}s text={text_files}")
+
+        start = time.perf_counter()
+        kinds = {}
+        for p in paths:
+            kind = doc_formats.sniff_file_type(p)
+            kinds[kind] = kinds.get(kind, 0) + 1
+        print(f"sniff_file_type  time={time.perf_counter() - start:.3f}s kinds={kinds}")
+
+
+if __name__ == "__main__":
+    main()
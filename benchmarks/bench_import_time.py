@@ -0,0 +1,133 @@
+"""Measure how long `import operations` takes and fail if startup regressed.
+
+Runs a fresh interpreter with `-X importtime` a few times and keeps the
+fastest run, then does the same for a bare import of the `deferred` modules
+that are installed, which is what startup used to pay. The result is checked
+against import_time_baseline.json next to this script:
+
+  * `import operations` must take at most `max_ratio` times as long as that
+    reference import, measured on the same machine in the same way, so the
+    check does not depend on how fast the machine is;
+  * none of the `deferred` modules (pandas, python-docx, SQLAlchemy, ...)
+    may be imported at startup; they belong behind first use;
+  * importing must not create the Logs directory.
+
+    python benchmarks/bench_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from _support import REPO_ROOT
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_time_baseline.json")
+RUNS = 5
+
+# Imported in a clean interpreter; stands in for config/config.py when the real one is absent
+BOOTSTRAP = """
+import sys, types
+sys.path.insert(0, {root!r})
+try:
+    import config.config
+except ImportError:
+    package = types.ModuleType("config")
+    module = types.ModuleType("config.config")
+    module.CONNECTION_STRING = "sqlite://"
+    package.config = module
+    sys.modules["config"] = package
+    sys.modules["config.config"] = module
+import operations
+"""
+
+# Imports those of the deferred modules that are installed and prints how long that took, in us
+REFERENCE = """
+import importlib.util, time
+names = [name for name in {names!r} if importlib.util.find_spec(name.split(".")[0]) is not None]
+start = time.perf_counter()
+for name in names:
+    __import__(name)
+print(int((time.perf_counter() - start) * 1e6) if names else "")
+"""
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from `-X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        times[fields[2].strip()] = (self_us, cumulative_us)
+    return times
+
+
+def measure_once(directory, code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=directory, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def reference_us(directory, deferred):
+    """Fastest time of importing the installed `deferred` modules, or None if none are."""
+    runs = []
+    for _ in range(RUNS):
+        result = subprocess.run([sys.executable, "-c", REFERENCE.format(names=deferred)],
+                                cwd=directory, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.exit(f"importing the deferred modules failed:\n{result.stderr[-2000:]}")
+        if not result.stdout.strip():
+            return None
+        runs.append(int(result.stdout))
+    return min(runs)
+
+
+def main():
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [measure_once(tmp, BOOTSTRAP.format(root=REPO_ROOT)) for _ in range(RUNS)]
+        logs_created = os.path.exists(os.path.join(tmp, "Logs"))
+        reference = reference_us(tmp, baseline["deferred"])
+    times = min(runs, key=lambda run: run["operations"][1])
+    total = times["operations"][1]
+
+    print(f"import operations: {total / 1000:.1f} ms (best of {RUNS})")
+    heaviest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    for name, (self_us, cumulative_us) in heaviest:
+        print(f"  {self_us / 1000:7.1f} ms self {cumulative_us / 1000:7.1f} ms cumulative  {name}")
+
+    failures = []
+    if reference is None:
+        print("none of the deferred modules is installed; skipping the time check")
+    else:
+        ratio = total / reference
+        print(f"deferred modules: {reference / 1000:.1f} ms; import operations takes {ratio:.2f}x that")
+        if ratio > baseline["max_ratio"]:
+            failures.append(f"import took {ratio:.2f}x as long as importing the deferred modules, "
+                            f"over the {baseline['max_ratio']}x allowed")
+    for name in baseline["deferred"]:
+        if name in times:
+            failures.append(f"{name} is imported at startup")
+    if logs_created:
+        failures.append("importing created the Logs directory")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Folder pass time with one oversized document, with and without isolated extraction.
+
+The folder holds FILES ordinary text documents plus one of HUGE_MB megabytes.
+Without a budget the pass waits for the big document. With DOCUMENT_TIMEOUT
+it is quarantined after TIMEOUT seconds, and with DOCUMENT_MEMORY_LIMIT once
+its worker's resident memory passes MEMORY_LIMIT. Either way the ordinary
+documents must come out exactly as in the unbounded run.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from _support import use_sqlite_config
+
+FILES = 200
+HUGE_MB = 150
+TIMEOUT = 0.5
+MEMORY_LIMIT = 256 * 2**20
+
+
+def build_folder(directory):
+    os.makedirs(directory)
+    for i in range(FILES):
+        with open(os.path.join(directory, f"note_{i}.doc"), "w", encoding="utf-8") as f:
+            f.write(f"Patient: Jane Doe{i % 7}\nDOB: 01/02/1980\nDate: 03/04/2024\n")
+    line = "Progress note line without any identifying fields.\n"
+    with open(os.path.join(directory, "huge.doc"), "w", encoding="utf-8") as f:
+        f.write("Patient: Huge Report\n")
+        f.write(line * (HUGE_MB * 2**20 // len(line)))
+        f.write("DOB: 05/06/1970\nDate: 07/08/2024\n")
+
+
+def run(ed, source, folder, timeout, memory_limit):
+    shutil.copytree(source, folder)
+    ed.DOCUMENT_TIMEOUT = timeout
+    ed.DOCUMENT_MEMORY_LIMIT = memory_limit
+    ed.processed_folder, ed.unprocessed_folder, _, _ = ed.initialize_folders(folder)
+    start = time.perf_counter()
+    records = ed.process_files_in_current_directory(folder, None)
+    elapsed = time.perf_counter() - start
+    ed.shutdown_extraction_pool()
+
+    log = os.path.join(folder, "Unprocessed", ed.QUARANTINE_FOLDER, ed.QUARANTINE_LOG)
+    quarantined = []
+    if os.path.exists(log):
+        with open(log, "r", encoding="utf-8") as f:
+            quarantined = [json.loads(line) for line in f]
+    return elapsed, sorted(record.values()[:6] for record in records if record.old_document != "huge.doc"), quarantined
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+        ed.RUN_JOURNAL = False
+
+        source = os.path.join(tmp, "source")
+        build_folder(source)
+
+        baseline = None
+        for name, timeout, memory_limit in [("unbounded", None, None),
+                                            ("timeout", TIMEOUT, None),
+                                            ("memory limit", None, MEMORY_LIMIT)]:
+            elapsed, records, quarantined = run(ed, source, os.path.join(tmp, name.replace(" ", "_")), timeout, memory_limit)
+            reasons = [entry["reason"] for entry in quarantined]
+            print(f"{name:<13s} time={elapsed:.3f}s rows={len(records)} quarantined={reasons}")
+            if baseline is None:
+                baseline = records
+            else:
+                print(f"{name:<13s} other documents match the unbounded run: {records == baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Check and time the OLE2 .doc extractor on Word 97-2003 files.
+
+First the files in legacy_doc_samples/, written by Word and other word
+processors (see NOTICE there), are read and classified and compared with
+expected.json: text, footers and classification, or the reader's error.
+
+Then generated files cover the three layouts the .docx path handles:
+key/value table, labelled paragraphs and footer only. Each layout's
+classification is compared with the expected result before timing, and a
+file must be read only once however many strategies look at it.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from _support import use_sqlite_config, write_legacy_doc
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "legacy_doc_samples")
+
+FILES_PER_KIND = 200
+
+EXPECTED = {
+    "table": ("processed", ("Jane Roe", "19800102", "20240304", "jane_roe_19800102_20240304")),
+    "para": ("processed", ("John Roe", "19750506", "20240708", "john_roe_19750506_20240708")),
+    "footer": ("processed", ("Anne Smith", "19600910", "20241112", "anne_smith_19600910_20241112")),
+}
+
+
+def build_corpus(directory):
+    paths = []
+    for i in range(FILES_PER_KIND):
+        table = os.path.join(directory, f"table_{i}.doc")
+        write_legacy_doc(table, ["Referral"], cells=[("Patient Name:", "Jane Roe"), ("DOB:", "01/02/1980 (44y)"),
+                                                     ("Admit Date:", "03/04/2024 10:30")])
+        para = os.path.join(directory, f"para_{i}.doc")
+        write_legacy_doc(para, ["Referral", "Date: 07/08/2024", "DOB: 05/06/1975", "Patient: John Roe"])
+        footer = os.path.join(directory, f"footer_{i}.doc")
+        write_legacy_doc(footer, ["Consultation note."], footer="Smith, Anne 12345 09/10/1960 11/12/2024")
+        paths += [("table", table), ("para", para), ("footer", footer)]
+    return paths
+
+
+def check_samples(ed, ole_doc):
+    """Differences between the samples as read now and expected.json."""
+    with open(os.path.join(SAMPLES_DIR, "expected.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    failures = []
+    for name, want in expected.items():
+        path = os.path.join(SAMPLES_DIR, name)
+        got = {}
+        try:
+            document = ole_doc.read_word_document(path)
+            got["text"], got["footers"] = document.body, document.footer_texts()
+        except ole_doc.OleError as e:
+            got["error"] = str(e)
+        got["classification"] = json.loads(json.dumps(ed.classify_file(path)))
+        for key, value in got.items():
+            if want.get(key) != value:
+                failures.append(f"{name}: {key} {value!r} != {want.get(key)!r}")
+    return len(expected), failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+        import ole_doc
+
+        count, failures = check_samples(ed, ole_doc)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"{count} sample files match expected.json")
+
+        paths = build_corpus(tmp)
+        reads = {"count": 0}
+        real_read = ole_doc.read_word_document
+
+        def counting_read(*args, **kwargs):
+            reads["count"] += 1
+            return real_read(*args, **kwargs)
+
+        ole_doc.read_word_document = counting_read
+        try:
+            for kind, path in paths[:3]:
+                reads["count"] = 0
+                result = ed.classify_file(path)
+                assert result == EXPECTED[kind], f"{kind}: {result!r} != {EXPECTED[kind]!r}"
+                assert reads["count"] == 1, f"{kind}: read {reads['count']} times"
+        finally:
+            ole_doc.read_word_document = real_read
+        print("classification matches for table, paragraph and footer layouts, one read per file")
+
+        start = time.perf_counter()
+        for _, path in paths:
+            ed.classify_file(path)
+        elapsed = time.perf_counter() - start
+        print(f"files={len(paths)} time={elapsed:.3f}s files/sec={len(paths) / elapsed:.0f}")
+
+
+if __name__ == "__main__":
+    main()
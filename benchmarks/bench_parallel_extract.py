@@ -0,0 +1,54 @@
+"""Time process_files_in_current_directory with and without extraction workers.
+
+Each run works on its own copy of the same folder, and the resulting rows are
+compared so that a worker pool which changes the output is caught here.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from _support import use_sqlite_config, write_footer_docx, write_paragraph_docx, write_table_docx
+
+FILES_PER_KIND = 100
+
+
+def build_folder(directory):
+    os.makedirs(directory)
+    for i in range(FILES_PER_KIND):
+        # Repeated names on purpose so get_unique_filename has to add suffixes
+        write_table_docx(os.path.join(directory, f"table_{i}.docx"), f"Jane Doe{i % 7}", "01/02/1980", "03/04/2024")
+        write_paragraph_docx(os.path.join(directory, f"para_{i}.docx"), f"John Roe{i % 5}", "05/06/1975", "07/08/2024", filler=50)
+        write_footer_docx(os.path.join(directory, f"footer_{i}.docx"), "Smith", f"Anne{i % 3}", "09/10/1960", "11/12/2024")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+
+        source = os.path.join(tmp, "source")
+        build_folder(source)
+        worker_counts = sorted({1, 2, os.cpu_count() or 1})
+
+        results = {}
+        for workers in worker_counts:
+            folder = os.path.join(tmp, f"run_{workers}")
+            shutil.copytree(source, folder)
+            ed.EXTRACTION_WORKERS = workers
+            ed.processed_folder, ed.unprocessed_folder, _, _ = ed.initialize_folders(folder)
+            start = time.perf_counter()
+            records = ed.process_files_in_current_directory(folder, None)
+            elapsed = time.perf_counter() - start
+            # Paths differ between the run folders; everything else must match
+            results[workers] = sorted(record.values()[:6] for record in records)
+            print(f"workers={workers:2d} files={3 * FILES_PER_KIND} rows={len(records)} time={elapsed:.3f}s")
+        ed.shutdown_extraction_pool()
+
+        baseline = results[1]
+        for workers, rows in results.items():
+            print(f"workers={workers:2d} output matches serial run: {rows == baseline}")
+
+
+if __name__ == "__main__":
+    main()
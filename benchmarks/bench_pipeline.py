@@ -0,0 +1,389 @@
+"""End-to-end throughput of the folder pipeline on a synthetic corpus.
+
+Builds a reproducible tree with _corpus.py (docx tables, paragraphs and
+footers, text saved as .doc, legacy OLE .doc and corrupt "link" files), then
+runs the pipeline on a copy of it against a SQLite `patient_data`:
+
+  * mode "tree" walks it with operations.list_directory_contents, as the
+    service does (scan, directory_info.json, per-run metrics JSON);
+  * mode "folders" calls extract_data.process_folder on each folder.
+
+The run happens in a fresh interpreter so the peak RSS it reports (its own
+and its extraction workers') is the pipeline's alone. With --instances N,
+N such interpreters process the same tree side by side, claiming folders
+through leases.py as separate operations.py instances would. With
+--archive the tree holds the corpus as one zip batch, read in place with
+operations.ARCHIVE_INGESTION, and the same corpus is also run unpacked: the
+outcomes and row count must match, damaged "link" members included (half of
+them start like a zip package, which python-docx must still report as not a
+package).
+Reported: files/sec, database rows, peak RSS and the metrics stage breakdown.
+
+The same run also times a plain reference in a fresh interpreter: every
+document of the corpus opened with python-docx, copied with shutil.copy2 and
+inserted into SQLite one row at a time, with a commit per folder. The
+pipeline's speed and peak RSS are checked as multiples of the reference's,
+measured on the same machine in the same way, so the check does not depend
+on how fast the machine is. The speed leaves out process_folder's one-second
+pause after each folder's synchronous insert, which is fixed whatever the
+machine.
+
+    python benchmarks/bench_pipeline.py --depth 2 --fan-out 3 --files 40
+    python benchmarks/bench_pipeline.py --save-baseline     # record under the config's name
+    python benchmarks/bench_pipeline.py                     # compare with that baseline
+
+Baselines live in baselines/pipeline.json next to this script, one entry per
+configuration; the default configuration's is committed. A run is a
+regression when its speed relative to the reference drops, or its relative
+peak RSS grows, by more than --tolerance, and a configuration without a
+baseline fails until one is recorded. The default --writer is "sync", what
+ships (extract_data.BACKGROUND_DB_WRITER is False).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from _corpus import add_arguments, build_corpus
+from _support import create_patient_data_table, use_sqlite_config
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process and of its largest finished child, or None if unknown."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return {"self": psutil.Process().memory_info().peak_wset, "children": None}
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def measure(tree, result_path, args):
+    """Run the pipeline on `tree` in this process and write the results to `result_path`."""
+    use_sqlite_config(os.path.join(os.path.dirname(result_path), "bench.db"))
+    import extract_data as ed
+    import metrics
+    import operations
+
+    metrics.ENABLED = True
+    if args.instances > 1:
+        operations.start_leases()
+    operations.SUBDIRECTORY_DELAY = 0
+    operations.ARCHIVE_INGESTION = args.archive
+    ed.EXTRACTION_WORKERS = args.workers
+    ed.EXTRACTION_ENGINE = args.engine
+    ed.BACKGROUND_DB_WRITER = args.writer == "background"
+    if args.content_index:
+        ed.CONTENT_INDEX_PATH = os.path.join(os.path.dirname(result_path), "content_index.db")
+
+    folders = sorted(os.path.join(parent, name) for parent, names, _ in os.walk(tree) for name in names)
+    start = time.perf_counter()
+    if args.mode == "tree":
+        operations.list_directory_contents(tree)
+    else:
+        leases = operations.lease_manager
+        for folder in folders:
+            if leases is not None and not leases.acquire(folder):
+                continue
+            ed.process_folder(folder, None,
+                              on_complete=lambda result, processed, folder=folder: leases and leases.release(folder))
+    if ed.BACKGROUND_DB_WRITER:
+        ed.get_db_writer().close()
+    ed.shutdown_extraction_pool()
+    elapsed = time.perf_counter() - start
+    if operations.lease_manager is not None:
+        operations.lease_manager.close()
+
+    summary = metrics.run_summary(metrics.delta({"stages": {}, "counters": {}}, metrics.snapshot()), elapsed)
+    summary["work_seconds"] = round(elapsed - summary["stages"].get("pause", {}).get("seconds", 0.0), 6)
+    summary["peak_rss"] = peak_rss_bytes()
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def reference(tree, result_path):
+    """Read, copy and record every document of `tree` the plain way and write the timing to `result_path`."""
+    import sqlite3
+    import docx
+    from docx.opc.exceptions import PackageNotFoundError
+
+    directory = os.path.dirname(result_path)
+    copies = os.path.join(directory, "copies")
+    os.makedirs(copies)
+    connection = sqlite3.connect(os.path.join(directory, "reference.db"))
+    connection.execute("CREATE TABLE documents (document TEXT, characters INTEGER)")
+    files = 0
+    start = time.perf_counter()
+    for parent, _, names in sorted(os.walk(tree)):
+        for name in sorted(names):
+            path = os.path.join(parent, name)
+            try:
+                characters = sum(len(paragraph.text) for paragraph in docx.Document(path).paragraphs)
+            except (PackageNotFoundError, zipfile.BadZipFile, KeyError):
+                characters = 0  # text and legacy .doc files, and the corrupt "link" ones
+            shutil.copy2(path, os.path.join(copies, f"{files}_{name}"))
+            connection.execute("INSERT INTO documents VALUES (?, ?)", (name, characters))
+            files += 1
+        connection.commit()
+    elapsed = time.perf_counter() - start
+    connection.close()
+
+    result = {"wall_seconds": round(elapsed, 6), "files": files,
+              "files_per_second": round(files / elapsed, 3) if elapsed > 0 else None,
+              "peak_rss_bytes": (peak_rss_bytes() or {}).get("self")}
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+
+def run_reference(directory, source):
+    """Time reference() on the corpus at `source` in a fresh interpreter and return its result."""
+    os.makedirs(directory)
+    result_path = os.path.join(directory, "reference.json")
+    run = subprocess.run([sys.executable, os.path.abspath(__file__), "--reference", source, result_path], cwd=directory)
+    if run.returncode != 0:
+        sys.exit(f"reference run failed with exit code {run.returncode}")
+    with open(result_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def pack(source, archive_path):
+    """Zip the tree at `source` into `archive_path`, as the upstream system sends batches."""
+    os.makedirs(os.path.dirname(archive_path))
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for parent, _, names in os.walk(source):
+            for name in sorted(names):
+                path = os.path.join(parent, name)
+                archive.write(path, os.path.relpath(path, source).replace(os.sep, "/"))
+
+
+def run_pipeline(directory, source, args, archive):
+    """Copy (or zip) the corpus at `source` under `directory`, run the instances on it and return the combined result."""
+    tree = os.path.join(directory, "tree")
+    if archive:
+        pack(source, os.path.join(tree, "corpus.zip"))
+    else:
+        shutil.copytree(source, tree)
+
+    # Each --measure run below writes to bench.db in its own directory
+    db_path = os.path.join(directory, "bench.db")
+    from sqlalchemy import create_engine, text
+    if use_sqlite_config(db_path):
+        engine = create_engine(f"sqlite:///{db_path}")
+    else:
+        import db_data_insert
+        engine = db_data_insert.get_engine()
+    create_patient_data_table(engine)
+
+    # Logs/ is created in the working directory
+    output = None if args.verbose else subprocess.DEVNULL
+    result_paths = [os.path.join(directory, f"result_{number}.json") for number in range(args.instances)]
+    runs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--measure", tree, path] + sys.argv[1:],
+                             cwd=directory, stdout=output)
+            for path in result_paths]
+    for run in runs:
+        if run.wait() != 0:
+            sys.exit(f"pipeline run failed with exit code {run.returncode}")
+    results = []
+    for path in result_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            results.append(json.load(f))
+    result = combine(results)
+    with engine.connect() as conn:
+        result["db_row_count"] = conn.execute(text("SELECT COUNT(*) FROM patient_data")).scalar()
+    engine.dispose()
+    return result
+
+
+def combine(results):
+    """One result for instances that ran side by side: summed work, the longest wall time, the largest RSS."""
+    if len(results) == 1:
+        return results[0]
+    combined = dict(results[0])
+    combined["wall_seconds"] = max(result["wall_seconds"] for result in results)
+    combined["work_seconds"] = max(result["work_seconds"] for result in results)
+    combined["files"] = sum(result["files"] for result in results)
+    combined["files_per_second"] = round(combined["files"] / combined["wall_seconds"], 3)
+    for key in ("outcomes", "stages"):
+        totals = {}
+        for result in results:
+            for name, value in result[key].items():
+                if isinstance(value, dict):
+                    entry = totals.setdefault(name, {"calls": 0, "seconds": 0.0})
+                    entry["calls"] += value["calls"]
+                    entry["seconds"] += value["seconds"]
+                else:
+                    totals[name] = totals.get(name, 0) + value
+        combined[key] = totals
+    rss = [result["peak_rss"] for result in results if result.get("peak_rss")]
+    if rss:
+        combined["peak_rss"] = {part: max((r[part] for r in rss if r[part] is not None), default=None)
+                                for part in ("self", "children")}
+    combined["instances"] = [{"files": result["files"], "wall_seconds": result["wall_seconds"]} for result in results]
+    return combined
+
+
+def config_name(args):
+    mix = ",".join(f"{kind}={weight:g}" for kind, weight in sorted(args.mix.items()))
+    instances = f"-x{args.instances}" if args.instances > 1 else ""
+    duplicates = f"-dup{args.duplicates:g}" if args.duplicates else ""
+    index = "-index" if args.content_index else ""
+    archive = "-zip" if args.archive else ""
+    return (f"{args.mode}{archive}{instances}-d{args.depth}-f{args.fan_out}-n{args.files}-filler{args.filler}{duplicates}"
+            f"-seed{args.seed}-{args.engine}-w{args.workers}-{args.writer}{index}-{mix}")
+
+
+def peak_rss(result):
+    rss = result.get("peak_rss")
+    if not rss:
+        return None
+    return max(value for value in rss.values() if value is not None)
+
+
+def relative(result, reference):
+    """The pipeline's speed (without pauses) and peak RSS as multiples of the reference's."""
+    speed = result["files"] / result["work_seconds"] if result["work_seconds"] > 0 else None
+    rss = peak_rss(result)
+    return {
+        "speed": round(speed / reference["files_per_second"], 3) if speed and reference["files_per_second"] else None,
+        "peak_rss": round(rss / reference["peak_rss_bytes"], 3) if rss and reference["peak_rss_bytes"] else None,
+    }
+
+
+def report(corpus, result):
+    print(f"corpus: {corpus['files']} files in {corpus['folders']} folders, "
+          f"{corpus['bytes'] / 1e6:.1f} MB, kinds {corpus['kinds']}, copies {corpus['copies']}")
+    print(f"time={result['wall_seconds']:.3f}s files={result['files']} "
+          f"files/sec={result['files_per_second']} db rows={result['db_row_count']}")
+    print(f"outcomes: {result['outcomes']}")
+    for number, instance in enumerate(result.get("instances", [])):
+        print(f"  instance {number}: files={instance['files']} time={instance['wall_seconds']:.3f}s")
+    rss = result.get("peak_rss")
+    if rss:
+        children = f"{rss['children'] / 2**20:.1f} MiB" if rss["children"] is not None else "n/a"
+        print(f"peak RSS: {rss['self'] / 2**20:.1f} MiB (largest worker {children})")
+    print("stages:")
+    for name, stage in sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        share = stage["seconds"] / result["wall_seconds"] if result["wall_seconds"] else 0
+        print(f"  {name:<24s} calls={stage['calls']:7d} {stage['seconds']:9.3f}s {share:7.1%}")
+
+
+def compare(name, result, ratios, tolerance):
+    """Regression messages against the stored baseline for `name`; None when there is no baseline."""
+    if not os.path.exists(BASELINE_PATH):
+        return None
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get(name)
+    if baseline is None:
+        return None
+
+    failures = []
+    old, new = baseline["relative_speed"], ratios["speed"]
+    print(f"baseline speed={old}x reference now={new}x")
+    if old and new is not None and new < old * (1 - tolerance):
+        failures.append(f"speed relative to the reference fell from {old}x to {new}x (more than {tolerance:.0%})")
+    old, new = baseline.get("relative_peak_rss"), ratios["peak_rss"]
+    if old and new and new > old * (1 + tolerance):
+        failures.append(f"peak RSS relative to the reference grew from {old}x to {new}x (more than {tolerance:.0%})")
+    if baseline.get("outcomes") != result["outcomes"]:
+        failures.append(f"outcomes changed from {baseline.get('outcomes')} to {result['outcomes']}")
+    return failures
+
+
+def save_baseline(name, corpus, result, ratios):
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    baselines[name] = {
+        "recorded": result["finished"],
+        "files": corpus["files"],
+        "relative_speed": ratios["speed"],
+        "relative_peak_rss": ratios["peak_rss"],
+        "outcomes": result["outcomes"],
+        "stages": result["stages"],
+    }
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"baseline {name!r} saved to {BASELINE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--mode", choices=("tree", "folders"), default="tree")
+    parser.add_argument("--workers", type=int, default=1, help="extract_data.EXTRACTION_WORKERS")
+    parser.add_argument("--engine", choices=("docx", "stream"), default="docx", help="extract_data.EXTRACTION_ENGINE")
+    parser.add_argument("--writer", choices=("background", "sync"), default="sync",
+                        help="sync is extract_data.BACKGROUND_DB_WRITER's default")
+    parser.add_argument("--instances", type=int, default=1,
+                        help="pipelines run side by side on the same tree, sharing it through leases.py")
+    parser.add_argument("--content-index", action="store_true", help="skip duplicate documents (CONTENT_INDEX_PATH)")
+    parser.add_argument("--archive", action="store_true", help="zip the corpus and read it in place (tree mode only)")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    parser.add_argument("--measure", nargs=2, metavar=("TREE", "RESULT"), help=argparse.SUPPRESS)
+    parser.add_argument("--reference", nargs=2, metavar=("TREE", "RESULT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure, args)
+        return
+    if args.reference:
+        reference(*args.reference)
+        return
+    if args.archive and args.mode != "tree":
+        parser.error("--archive needs --mode tree")
+
+    name = config_name(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source")
+        corpus = build_corpus(source, args.depth, args.fan_out, args.files, args.mix, args.filler, args.seed,
+                              args.duplicates)
+        result = run_pipeline(os.path.join(tmp, "run"), source, args, args.archive)
+        # The same documents unpacked, which the zip batch must come out exactly like
+        unpacked = run_pipeline(os.path.join(tmp, "unpacked"), source, args, False) if args.archive else None
+        plain = run_reference(os.path.join(tmp, "reference"), source)
+
+    print(f"config: {name}")
+    report(corpus, result)
+    if unpacked is not None:
+        print(f"unpacked: outcomes {unpacked['outcomes']} db rows={unpacked['db_row_count']}")
+        if (unpacked["outcomes"], unpacked["db_row_count"]) != (result["outcomes"], result["db_row_count"]):
+            sys.exit("FAIL: the zip batch did not come out like the unpacked documents")
+    ratios = relative(result, plain)
+    rss = f"{plain['peak_rss_bytes'] / 2**20:.1f} MiB" if plain["peak_rss_bytes"] else "n/a"
+    print(f"reference: time={plain['wall_seconds']:.3f}s files/sec={plain['files_per_second']} peak RSS: {rss}")
+    print(f"relative to the reference: speed={ratios['speed']}x (pauses left out) peak RSS={ratios['peak_rss']}x")
+
+    if args.save_baseline:
+        save_baseline(name, corpus, result, ratios)
+        return
+    failures = compare(name, result, ratios, args.tolerance)
+    if failures is None:
+        sys.exit(f"FAIL: no baseline for {name!r} in {BASELINE_PATH}; record one with --save-baseline")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
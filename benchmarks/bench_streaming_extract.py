@@ -0,0 +1,69 @@
+"""Compare the python-docx and streaming engines on a large consult note.
+
+The document has the patient header table first and a large lab table after
+it, which is the shape of our slowest reports. Both engines must give the
+same result for it, and for a paragraph and a footer-only document; any
+difference fails the run.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from _support import use_sqlite_config, write_footer_docx, write_large_report_docx, write_paragraph_docx
+
+LAB_ROWS = 5000
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+
+        path = os.path.join(tmp, "large_report.docx")
+        write_large_report_docx(path, "Jane Doe", "01/02/1980", "03/04/2024", LAB_ROWS)
+        print(f"document: {LAB_ROWS} lab rows, {os.path.getsize(path) / 1024:.0f} KiB on disk")
+
+        results = {}
+        for name, func in (("docx", ed.extract_data), ("stream", ed.extract_data_streaming)):
+            result, elapsed, peak = measure(func, path)
+            results[name] = result
+            print(f"{name:7s} result={result} time={elapsed:.3f}s peak_mem={peak / 1024 / 1024:.1f} MiB")
+
+        failures = []
+        if results["docx"] != results["stream"]:
+            failures.append(f"large report: stream {results['stream']} != docx {results['docx']}")
+
+        paragraph = os.path.join(tmp, "paragraph.docx")
+        write_paragraph_docx(paragraph, "John Roe", "05/06/1975", "07/08/2024")
+        footer = os.path.join(tmp, "footer.docx")
+        write_footer_docx(footer, "Smith", "Anne", "09/10/1960", "11/12/2024")
+        for layout, doc_path in (("paragraph", paragraph), ("footer", footer)):
+            for step, docx_func, stream_func in (
+                ("data", ed.extract_data, ed.extract_data_streaming),
+                ("footer", ed.extract_from_footer, ed.extract_from_footer_streaming),
+            ):
+                expected, got = docx_func(doc_path), stream_func(doc_path)
+                if expected != got:
+                    failures.append(f"{layout} {step}: stream {got} != docx {expected}")
+
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Count directory reads and create_or_update_json calls for one pass over a deep tree.
+
+The old walker read every directory twice (once for itself, once from its
+parent) and handed each subfolder to create_or_update_json twice; the scandir
+walker should do one read and one call per directory.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from _support import use_sqlite_config
+
+FAN_OUT = 4
+DEPTH = 4
+FILES_PER_DIR = 5
+
+
+def build_tree(directory, depth):
+    for i in range(FILES_PER_DIR):
+        open(os.path.join(directory, f"doc_{i}.docx"), "w").close()
+    if depth == 0:
+        return 1
+    count = 1
+    for i in range(FAN_OUT):
+        child = os.path.join(directory, f"sub_{i}")
+        os.makedirs(child)
+        count += build_tree(child, depth - 1)
+    return count
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import operations
+
+        root = os.path.join(tmp, "tree")
+        os.makedirs(root)
+        directories = build_tree(root, DEPTH)
+
+        counts = {"reads": 0, "json": 0}
+        real_scandir, real_listdir = os.scandir, os.listdir
+
+        def counting_scandir(path="."):
+            counts["reads"] += 1
+            return real_scandir(path)
+
+        def counting_listdir(path="."):
+            counts["reads"] += 1
+            return real_listdir(path)
+
+        def count_json(directory, files, sources=None):
+            counts["json"] += 1
+
+        operations.create_or_update_json = count_json
+        operations.SUBDIRECTORY_DELAY = 0
+        os.scandir, os.listdir = counting_scandir, counting_listdir
+        try:
+            start = time.perf_counter()
+            operations.list_directory_contents(root)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.scandir, os.listdir = real_scandir, real_listdir
+
+        print(f"directories={directories} reads={counts['reads']} "
+              f"create_or_update_json calls={counts['json']} time={elapsed:.3f}s")
+        if counts["json"] != directories:
+            sys.exit(f"FAIL: expected one create_or_update_json call per directory ({directories})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Compare get_unique_filename's probing with FilenameAllocator for a common base name.
+
+Every file in the run maps to the same patient/date, which is the worst case
+for probing: the n-th copy costs n existence checks.
+"""
+import os
+import tempfile
+import time
+
+from _support import use_sqlite_config
+
+COPIES = 2000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import extract_data as ed
+
+        probing = os.path.join(tmp, "probing")
+        os.makedirs(probing)
+        checks = {"count": 0}
+        real_exists = os.path.exists
+
+        def counting_exists(path):
+            checks["count"] += 1
+            return real_exists(path)
+
+        ed.os.path.exists = counting_exists
+        try:
+            start = time.perf_counter()
+            for _ in range(COPIES):
+                name = ed.get_unique_filename(probing, "doe_jane_19800102_20240304", ".docx")
+                open(os.path.join(probing, name), "w").close()
+            elapsed = time.perf_counter() - start
+        finally:
+            ed.os.path.exists = real_exists
+        print(f"get_unique_filename names={COPIES} exists_calls={checks['count']} time={elapsed:.3f}s")
+
+        allocated = os.path.join(tmp, "allocator")
+        os.makedirs(allocated)
+        start = time.perf_counter()
+        allocator = ed.FilenameAllocator(allocated)
+        names = [allocator.allocate("doe_jane_19800102_20240304", ".docx") for _ in range(COPIES)]
+        elapsed = time.perf_counter() - start
+        print(f"FilenameAllocator   names={len(set(names))} listings=1 time={elapsed:.3f}s")
+        print(f"same names: {sorted(names) == sorted(os.listdir(probing))}")
+
+
+if __name__ == "__main__":
+    main()
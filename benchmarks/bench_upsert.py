@@ -0,0 +1,123 @@
+"""Harness for db_data_insert's upsert mode against a SQLite `patient_data`.
+
+Seeds the table, then writes a second pass in which some documents changed
+and some are new, once with WRITE_MODE "replace" and once with "upsert".
+Both must leave the same rows (ignoring ids); the upsert report must count
+exactly the changed, new and untouched documents, and a repeat of the same
+pass must leave everything unchanged. Finally two threads upsert the same
+new documents at once, as two instances would; each document must end up
+with exactly one row. Any difference fails the run.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from _support import create_patient_data_table, patient_records, use_sqlite_config
+
+ROWS = 5000
+CHANGED_EVERY = 10
+NEW_ROWS = 250
+CONCURRENT_ROWS = 2000
+
+
+def second_pass():
+    """patient_records(ROWS) with every CHANGED_EVERY-th DOB changed, plus NEW_ROWS new documents."""
+    records = patient_records(ROWS + NEW_ROWS)
+    for record in records[:ROWS:CHANGED_EVERY]:
+        record.dob = datetime(1981, 5, 6)
+    return records
+
+
+def table_rows(db):
+    from sqlalchemy import text
+    columns = ", ".join(c for c in db.COLUMNS)
+    with db.get_engine().connect() as conn:
+        rows = conn.execute(text(f"SELECT {columns} FROM patient_data")).fetchall()
+    return sorted(tuple(db._stored_value(c, v) for c, v in zip(db.COLUMNS, row)) for row in rows)
+
+
+def create_table(db):
+    """create_patient_data_table with the unique index upsert mode expects."""
+    from sqlalchemy import text
+    create_patient_data_table(db.get_engine())
+    with db.get_engine().begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS patient_data_old_document_path_unique"))
+        conn.execute(text(db.UPSERT_INDEX_SQL))
+
+
+def concurrent_pass(db):
+    """Upsert the same new documents from two threads at once; returns (rows, documents, reports)."""
+    from sqlalchemy import text
+    create_table(db)
+    reports = [db.WriteReport(), db.WriteReport()]
+    threads = [threading.Thread(target=db.upsert_patient_records, args=(patient_records(CONCURRENT_ROWS), report))
+               for report in reports]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with db.get_engine().connect() as conn:
+        rows, documents = conn.execute(
+            text("SELECT COUNT(*), COUNT(DISTINCT old_document_path) FROM patient_data")).one()
+    return rows, documents, reports
+
+
+def run(db, mode):
+    create_table(db)
+    db.WRITE_MODE = "replace"
+    db.insert_patient_records(patient_records(ROWS))
+    db.WRITE_MODE = mode
+    report = db.WriteReport()
+    start = time.perf_counter()
+    if mode == "upsert":
+        db.upsert_patient_records(second_pass(), report)
+    else:
+        db.insert_patient_records(second_pass())
+    elapsed = time.perf_counter() - start
+    print(f"{mode:<8s} time={elapsed:.3f}s {report.summary() if mode == 'upsert' else ''}")
+    return table_rows(db), report
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_sqlite_config(os.path.join(tmp, "bench.db"))
+        import db_data_insert as db
+
+        failures = []
+        replaced, _ = run(db, "replace")
+        upserted, report = run(db, "upsert")
+        if replaced != upserted:
+            failures.append("replace and upsert left different rows")
+        changed = len(range(0, ROWS, CHANGED_EVERY))
+        expected = (NEW_ROWS, changed, ROWS - changed, 0)
+        got = (report.inserted, report.updated, report.unchanged, report.failed)
+        if got != expected:
+            failures.append(f"upsert report {got}, expected (inserted, updated, unchanged, failed) = {expected}")
+
+        repeat = db.WriteReport()
+        start = time.perf_counter()
+        db.upsert_patient_records(second_pass(), repeat)
+        print(f"repeat   time={time.perf_counter() - start:.3f}s {repeat.summary()}")
+        if repeat.unchanged != ROWS + NEW_ROWS or table_rows(db) != upserted:
+            failures.append("repeating the pass changed rows")
+
+        rows, documents, reports = concurrent_pass(db)
+        print(f"concurrent rows={rows} documents={documents} "
+              + " / ".join(report.summary() for report in reports))
+        if rows != CONCURRENT_ROWS or documents != CONCURRENT_ROWS:
+            failures.append(f"two concurrent upserts of {CONCURRENT_ROWS} documents left {rows} rows")
+        if sum(report.failed for report in reports):
+            failures.append("concurrent upserts failed rows")
+
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print("ok")
+
+
+if __name__ == "__main__":
+    main()
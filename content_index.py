@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Tree-wide index of document contents, so a referral dropped into several
+# folders is only handled once.
+#
+# `documents` maps the SHA-256 of each document placed to where it came from,
+# its outcome and where it was placed (the Processed copy, or its Unprocessed
+# subfolder). A byte-identical file found later, in any folder, is recorded
+# in `aliases` against that first occurrence instead of being extracted,
+# copied and inserted again.
+#
+# The same path seen again (its folder reprocessed) is not an alias of
+# itself, and neither is a copy of a document whose placed file has since
+# been removed: that copy is handled normally and becomes the new first
+# occurrence.
+
+
+class ContentIndex:
+    def __init__(self, path):
+        self.path = path
+        # Connections do not survive fork(); get_content_index reopens in other processes
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " content_hash TEXT PRIMARY KEY,"
+                " source_path TEXT NOT NULL,"
+                " outcome TEXT NOT NULL,"
+                " placed_path TEXT,"
+                " first_seen REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                " source_path TEXT PRIMARY KEY,"
+                " content_hash TEXT NOT NULL,"
+                " original_path TEXT NOT NULL,"
+                " seen REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS aliases_content_hash ON aliases (content_hash)")
+
+    def original(self, content_hash, source_path):
+        """Source path of the first occurrence `source_path` duplicates, or None if it is not a duplicate."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_path, placed_path FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None or os.path.normcase(row[0]) == os.path.normcase(source_path) \
+                or (row[1] is not None and not os.path.exists(row[1])):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def add_documents(self, documents):
+        """Record (content hash, source path, outcome, placed path) for documents handled as first occurrences."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (content_hash, source_path, outcome, placed_path, first_seen) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(content_hash, source_path, outcome, placed_path, now)
+                 for content_hash, source_path, outcome, placed_path in documents],
+            )
+
+    def add_aliases(self, aliases):
+        """Record (source path, content hash, original path) for skipped duplicates."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO aliases (source_path, content_hash, original_path, seen) VALUES (?, ?, ?, ?)",
+                [(source_path, content_hash, original_path, now)
+                 for source_path, content_hash, original_path in aliases],
+            )
+
+    def aliases(self, content_hash):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT source_path FROM aliases WHERE content_hash = ? ORDER BY seen", (content_hash,)
+            )]
+
+    def stats(self):
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            aliases = self._conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+        return {"documents": documents, "aliases": aliases, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._conn.close()
@@ -1,54 +1,223 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
+import threading
 import traceback
 import warnings
 from config.config import CONNECTION_STRING
 warnings.simplefilter("ignore")
 
 from logger import general_logger, dir_logger
-from datetime import datetime
+import metrics
+from patient_records import COLUMNS, PatientRecord
+from datetime import date, datetime
 
 # Define connection string for SQLAlchemy
 conn_str = CONNECTION_STRING
 
-# Create SQLAlchemy engine
-engine = create_engine(conn_str)
+# Rows sent per executemany call, and documents per DELETE ... IN (...) statement
+INSERT_BATCH_SIZE = 500
+DELETE_BATCH_SIZE = 500
+# "replace" deletes the rows of every document written and inserts them again;
+# "upsert" matches rows on old_document_path and only writes what changed
+# (give patient_data UPSERT_INDEX_SQL's unique index for this mode)
+WRITE_MODE = "replace"
+# Documents looked up per SELECT ... IN (...) in upsert mode
+UPSERT_BATCH_SIZE = 500
 
-def getDataFromDfandInsertInDB(df):
+INSERT_SQL = """
+    INSERT INTO patient_data 
+    (patient_first_name, patient_last_name, dob, request_date, 
+    old_document, new_document, old_document_path, new_document_path, is_deleted) 
+    VALUES (:patient_first_name, :patient_last_name, :dob, :request_date, 
+    :old_document, :new_document, :old_document_path, :new_document_path, :is_deleted)
+"""
+
+# SQLAlchemy is imported and the engine created on first use, not when the
+# service starts
+_engine = None
+_insert_query = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine, _insert_query
+    with _engine_lock:
+        if _engine is None:
+            from sqlalchemy import create_engine, text
+            _insert_query = text(INSERT_SQL)
+            _engine = create_engine(conn_str)
+    return _engine
+
+def get_insert_query():
+    get_engine()
+    return _insert_query
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def execute_rows(query, rows, action="inserting"):
+    """Execute `query` for (index, params) pairs in one transaction, bisecting on failure.
+
+    A batch that fails is rolled back and retried as two halves, so a bad row
+    only costs log2(batch) extra round-trips and is still reported by its index.
+    Returns the number of rows written.
+    """
     try:
-        df['request_date'].fillna(pd.Timestamp('1900-01-01'), inplace=True)
-        df['patient_last_name'].fillna("", inplace=True)
-        df = df.drop(columns=['id'])
-        df.drop_duplicates(inplace=True)
-        df["dob"] = pd.to_datetime(df["dob"], errors='coerce')
-        df["request_date"] = pd.to_datetime(df["request_date"], errors='coerce')
+        with get_engine().begin() as conn:
+            conn.execute(query, [params for _, params in rows])
+        return len(rows)
+    except Exception as row_error:
+        if len(rows) == 1:
+            index = rows[0][0]
+            general_logger.error(f"Error {action} row {index}: {row_error}", exc_info=True)
+            print(f"Error {action} row {index}, skipping...")
+            return 0
+        middle = len(rows) // 2
+        return execute_rows(query, rows[:middle], action) + execute_rows(query, rows[middle:], action)
+
+def execute_batches(query, rows, action="inserting"):
+    """execute_rows for `rows` in INSERT_BATCH_SIZE batches, committed together when none fails.
+
+    A commit per batch made large writes slower than the old row-by-row loop
+    on drivers where a commit is expensive. Should a batch fail, everything is
+    rolled back and written again batch by batch with execute_rows, which
+    finds the bad rows. Returns the number of rows written.
+    """
+    try:
+        with get_engine().begin() as conn:
+            for batch in chunked(rows, INSERT_BATCH_SIZE):
+                conn.execute(query, [params for _, params in batch])
+        return len(rows)
+    except Exception as e:
+        general_logger.error(f"Error {action} {len(rows)} rows in one transaction, retrying batch by batch: {e}")
+        return sum(execute_rows(query, batch, action) for batch in chunked(rows, INSERT_BATCH_SIZE))
+
+def insert_rows(rows):
+    """Insert (index, PatientRecord) pairs, see execute_batches; returns the number inserted."""
+    return execute_batches(get_insert_query(), [(index, record.params()) for index, record in rows])
+
+def insert_patient_records(records):
+    """Replace the patient_data rows of the records' documents with `records`.
 
-        old_documents = df["old_document"].dropna().unique().tolist()
+    Identical records are inserted once; rows are reported by their position
+    in `records`. With WRITE_MODE "upsert" this is upsert_patient_records.
+    """
+    if WRITE_MODE == "upsert":
+        return upsert_patient_records(records)
+    with metrics.stage("db_write"):
+        return _replace_patient_records(records)
+
+def _replace_patient_records(records):
+    try:
+        rows, seen = [], set()
+        for index, record in enumerate(records):
+            if record not in seen:
+                seen.add(record)
+                rows.append((index, record))
+
+        old_documents = list(dict.fromkeys(record.old_document for _, record in rows if record.old_document is not None))
 
         if old_documents:
-            with engine.connect() as conn:
-                placeholders = ", ".join([f":doc{i}" for i in range(len(old_documents))])
-                delete_query = text(f"DELETE FROM patient_data WHERE old_document IN ({placeholders})")
-                params = {f"doc{i}": doc for i, doc in enumerate(old_documents)}
-                conn.execute(delete_query, params)
+            from sqlalchemy import text
+            with get_engine().connect() as conn:
+                for chunk in chunked(old_documents, DELETE_BATCH_SIZE):
+                    placeholders = ", ".join([f":doc{i}" for i in range(len(chunk))])
+                    delete_query = text(f"DELETE FROM patient_data WHERE old_document IN ({placeholders})")
+                    params = {f"doc{i}": doc for i, doc in enumerate(chunk)}
+                    conn.execute(delete_query, params)
                 conn.commit()
 
-        # Insert row-by-row
-        with engine.begin() as conn:
-            for index, row in df.iterrows():
-                try:
-                    row_dict = row.to_dict()
-                    insert_query = text("""
-                        INSERT INTO patient_data 
-                        (patient_first_name, patient_last_name, dob, request_date, 
-                        old_document, new_document, old_document_path, new_document_path, is_deleted) 
-                        VALUES (:patient_first_name, :patient_last_name, :dob, :request_date, 
-                        :old_document, :new_document, :old_document_path, :new_document_path, :is_deleted)
-                    """)
-                    conn.execute(insert_query, row_dict)
-                except Exception as row_error:
-                    general_logger.error(f"Error inserting row {index}: {row_error}", exc_info=True)
-                    print(f"Error inserting row {index}, skipping...")
+        # Insert in batches; a failing batch is split until the bad rows are found
+        if rows:
+            written = insert_rows(rows)
+            metrics.count("db_rows", written, result="inserted")
+            metrics.count("db_rows", len(rows) - written, result="failed")
+
+        print("Data updated successfully.")
+        return True
+
+    except Exception as e:
+        print("Error occurred in main function:")
+        traceback.print_exc()
+        general_logger.error(f"Main function error: {e}", exc_info=True)
+        return False
+
+class WriteReport:
+    """What upsert_patient_records did with the records it was given."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates_removed = 0
+        self.failed = 0
+
+    def merge(self, other):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.duplicates_removed += other.duplicates_removed
+        self.failed += other.failed
+
+    def summary(self):
+        return (f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, "
+                f"{self.duplicates_removed} duplicate rows removed, {self.failed} failed")
+
+# Upsert totals since the service started
+write_totals = WriteReport()
+
+# Lets the database refuse a second row for a document, so two instances
+# upserting the same new document cannot both insert it: the loser's
+# transaction fails and is retried, and then finds the winner's row. Rows left
+# by the replace mode must be down to one per document first (an upsert pass
+# without the index removes the extra ones).
+UPSERT_INDEX_SQL = (
+    "CREATE UNIQUE INDEX patient_data_old_document_path_unique ON patient_data (old_document_path) "
+    "WHERE old_document_path IS NOT NULL"
+)
+
+UPDATE_SQL = (
+    "UPDATE patient_data SET "
+    + ", ".join(f"{column} = :{column}" for column in COLUMNS if column != "old_document_path")
+    + " WHERE id = :id"
+)
+DATE_COLUMNS = ("dob", "request_date")
+
+def _stored_value(column, value):
+    """A value read back from patient_data, in the form PatientRecord holds it."""
+    if column in DATE_COLUMNS and value is not None and not isinstance(value, datetime):
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        try:
+            # Drivers without a native datetime type (SQLite) return the stored text
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            return value
+    return value
+
+def upsert_patient_records(records, report=None):
+    """Write `records` keyed on old_document_path, touching only rows whose values changed.
+
+    For each chunk of documents the existing rows are read with one SELECT;
+    documents without a row are inserted, rows that differ from the record are
+    updated in place and equal rows are left alone. Should a document have
+    several rows (left by the delete-and-insert mode), the oldest is kept and
+    the others are deleted. When a document occurs more than once in
+    `records`, the last occurrence wins. The counts are added to `report`, a
+    WriteReport, if given, and to write_totals.
+
+    The lookups and the writes run in one transaction, so the rows cannot
+    change between them; should it fail, it is rolled back and the records
+    are upserted again in halves, down to the single records that fail.
+    """
+    with metrics.stage("db_write"):
+        return _upsert_patient_records(records, report)
+
+def _upsert_patient_records(records, report):
+    counts = WriteReport()
+    try:
+        latest = {}
+        for index, record in enumerate(records):
+            latest[record.old_document_path] = (index, record)
+        _upsert_rows(list(latest.values()), counts)
 
         print("Data updated successfully.")
         return True
@@ -57,4 +226,85 @@ def getDataFromDfandInsertInDB(df):
         print("Error occurred in main function:")
         traceback.print_exc()
         general_logger.error(f"Main function error: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+    finally:
+        for result in ("inserted", "updated", "unchanged", "failed"):
+            metrics.count("db_rows", getattr(counts, result), result=result)
+        if report is not None:
+            report.merge(counts)
+        write_totals.merge(counts)
+        dir_logger.info(f"Upsert: {counts.summary()}")
+        dir_logger.info(f"Upsert since start: {write_totals.summary()}")
+
+def _upsert_rows(rows, counts):
+    """Upsert (index, PatientRecord) pairs with distinct paths in one transaction, bisecting on failure."""
+    try:
+        with get_engine().begin() as conn:
+            written = _upsert_in_transaction(conn, rows)
+        counts.merge(written)
+    except Exception as row_error:
+        if len(rows) == 1:
+            index = rows[0][0]
+            general_logger.error(f"Error upserting row {index}: {row_error}", exc_info=True)
+            print(f"Error upserting row {index}, skipping...")
+            counts.failed += 1
+            return
+        middle = len(rows) // 2
+        _upsert_rows(rows[:middle], counts)
+        _upsert_rows(rows[middle:], counts)
+
+def _upsert_in_transaction(conn, rows):
+    from sqlalchemy import text
+
+    counts = WriteReport()
+    compared = [column for column in COLUMNS if column != "old_document_path"]
+    inserts, updates, duplicates = [], [], []
+    for chunk in chunked(rows, UPSERT_BATCH_SIZE):
+        placeholders = ", ".join([f":path{i}" for i in range(len(chunk))])
+        select_query = text(
+            f"SELECT id, {', '.join(compared)}, old_document_path FROM patient_data "
+            f"WHERE old_document_path IN ({placeholders}) ORDER BY id"
+        )
+        params = {f"path{i}": record.old_document_path for i, (_, record) in enumerate(chunk)}
+        existing = conn.execute(select_query, params).fetchall()
+
+        stored = {}
+        for row in existing:
+            path = row[-1]
+            if path in stored:
+                duplicates.append(row[0])
+            else:
+                stored[path] = (row[0], tuple(_stored_value(c, v) for c, v in zip(compared, row[1:-1])))
+
+        for _, record in chunk:
+            current = stored.get(record.old_document_path)
+            if current is None:
+                inserts.append(record.params())
+            elif current[1] != tuple(getattr(record, column) for column in compared):
+                updates.append(dict(record.params(), id=current[0]))
+            else:
+                counts.unchanged += 1
+
+    # Written after all lookups, so the batches span chunks
+    for ids in chunked(duplicates, DELETE_BATCH_SIZE):
+        id_placeholders = ", ".join([f":id{i}" for i in range(len(ids))])
+        conn.execute(text(f"DELETE FROM patient_data WHERE id IN ({id_placeholders})"),
+                     {f"id{i}": row_id for i, row_id in enumerate(ids)})
+    for batch in chunked(updates, INSERT_BATCH_SIZE):
+        conn.execute(text(UPDATE_SQL), batch)
+    for batch in chunked(inserts, INSERT_BATCH_SIZE):
+        conn.execute(get_insert_query(), batch)
+    counts.duplicates_removed = len(duplicates)
+    counts.updated = len(updates)
+    counts.inserted = len(inserts)
+    return counts
+
+def getDataFromDfandInsertInDB(df):
+    """insert_patient_records for a DataFrame with the patient_data columns and "yyyy-mm-dd" dates."""
+    try:
+        records = [PatientRecord.from_row(row) for row in df.to_dict("records")]
+    except Exception as e:
+        general_logger.error(f"Main function error: {e}", exc_info=True)
+        return False
+    return insert_patient_records(records)
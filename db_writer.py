@@ -0,0 +1,101 @@
+import queue
+import threading
+
+from logger import general_logger, dir_logger
+import metrics
+
+# Background stage that writes PatientRecords to the database.
+#
+# A folder pass hands its records to submit() and goes on with the next
+# folder; one thread drains the queue and writes several folders' records in
+# one insert_patient_records call, up to `batch_rows`. Each submission's
+# on_commit(result) runs on that thread once its batch was written, so the
+# caller can record progress (processedItems) only for committed rows.
+#
+# The queue holds at most `max_pending` submissions; when the database falls
+# behind, submit() blocks and the tree walk slows down with it instead of
+# piling up records in memory.
+#
+# insert_patient_records deletes the rows of the batch's documents before
+# inserting. Two submissions naming the same document are never combined, so
+# the second still replaces the first exactly as when written one by one.
+#
+# While metrics are enabled, `last_write` holds the database stages and
+# counters of the batch just written, for the on_commit callbacks: a folder's
+# run summary adds them to what its pass measured before queueing, as the
+# process-wide totals by then include other folders' work.
+
+# What a batch write records in metrics
+DB_STAGES = ("db_write",)
+DB_COUNTERS = ("db_rows",)
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    def __init__(self, write, max_pending=16, batch_rows=2000):
+        self.write = write
+        self.batch_rows = batch_rows
+        self.batches = 0
+        self.rows = 0
+        self.last_write = None
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, records, on_commit=None):
+        """Queue `records`; blocks while `max_pending` submissions are waiting to be written."""
+        records = list(records)
+        documents = {record.old_document for record in records}
+        if self._queue.full():
+            dir_logger.info("Database writer is behind; waiting for queued batches to be written")
+        self._queue.put((records, documents, on_commit))
+
+    def close(self):
+        """Write everything queued so far and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self):
+        carry = None
+        while True:
+            job = carry if carry is not None else self._queue.get()
+            carry = None
+            if job is _STOP:
+                return
+            jobs, documents, rows = [job], set(job[1]), len(job[0])
+            while rows < self.batch_rows:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP or not documents.isdisjoint(job[1]):
+                    # Written after this batch
+                    carry = job
+                    break
+                jobs.append(job)
+                documents.update(job[1])
+                rows += len(job[0])
+            self._flush(jobs)
+
+    def _flush(self, jobs):
+        records = [record for job in jobs for record in job[0]]
+        before = metrics.snapshot() if metrics.ENABLED else None
+        try:
+            result = self.write(records)
+        except Exception as e:
+            general_logger.error(f"Database writer failed on {len(records)} rows: {e}", exc_info=True)
+            result = False
+        if before is not None:
+            # Only this thread writes to the database; the other threads keep counting meanwhile
+            self.last_write = metrics.select(metrics.delta(before, metrics.snapshot()), DB_STAGES, DB_COUNTERS)
+        self.batches += 1
+        self.rows += len(records)
+        for _, _, on_commit in jobs:
+            if on_commit is None:
+                continue
+            try:
+                on_commit(result)
+            except Exception as e:
+                general_logger.error(f"Error after writing a database batch: {e}", exc_info=True)
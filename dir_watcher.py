@@ -0,0 +1,223 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# Change detection for the directory tree under base_directory.
+#
+# Instead of rescanning every folder on a timer, a watcher reports the
+# directories whose contents changed. On Linux it uses inotify (through
+# ctypes, so nothing extra has to be installed); elsewhere, or when inotify
+# is unavailable, it polls the mtime of every known directory, which costs
+# one stat per directory and no readdir unless something changed.
+#
+# A directory is only reported after it has been quiet for `settle_seconds`,
+# so a folder that is still being filled is processed once, not once per file.
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Watcher:
+    def __init__(self, root, excluded_dirs, valid_extensions, settle_seconds):
+        self.root = os.path.abspath(root)
+        self.excluded_dirs = set(excluded_dirs)
+        self.valid_extensions = {ext.lower() for ext in valid_extensions}
+        self.settle_seconds = settle_seconds
+        self.pending = {}
+
+    def _touch(self, directory):
+        self.pending[directory] = time.monotonic()
+
+    def _is_relevant_file(self, name):
+        return os.path.splitext(name)[1].lower() in self.valid_extensions
+
+    def _subdirectories(self, directory):
+        try:
+            with os.scandir(directory) as entries:
+                return [entry.path for entry in entries
+                        if entry.name not in self.excluded_dirs and entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return []
+
+    def changed_directories(self, timeout):
+        """Wait up to `timeout` seconds and return the directories whose changes have settled."""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            ready = sorted(d for d, changed in self.pending.items() if now - changed >= self.settle_seconds)
+            if ready:
+                for directory in ready:
+                    del self.pending[directory]
+                return ready
+            if now >= deadline:
+                return []
+            wait = deadline - now
+            if self.pending:
+                wait = min(wait, min(changed + self.settle_seconds for changed in self.pending.values()) - now)
+            self._collect(max(wait, 0.0))
+
+    def defer(self, directory):
+        """Report `directory` again after another `settle_seconds`, when it could not be handled now."""
+        self._touch(directory)
+
+    def mark_seen(self, directory):
+        """Called after `directory` was handled, so the handler's own writes are not reported back."""
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(_Watcher):
+    """Compares cached directory mtimes every `poll_interval` seconds."""
+
+    def __init__(self, root, excluded_dirs, valid_extensions, settle_seconds=2.0, poll_interval=5.0):
+        super().__init__(root, excluded_dirs, valid_extensions, settle_seconds)
+        self.poll_interval = poll_interval
+        self.mtimes = {}
+        self.last_poll = time.monotonic()
+        self._register(self.root, notify=False)
+
+    def _register(self, directory, notify):
+        try:
+            self.mtimes[directory] = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        if notify:
+            self._touch(directory)
+        for child in self._subdirectories(directory):
+            if child not in self.mtimes:
+                self._register(child, notify)
+
+    def _poll(self):
+        for directory, mtime in list(self.mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self.mtimes.pop(directory, None)
+                self.pending.pop(directory, None)
+                continue
+            if current != mtime:
+                self.mtimes[directory] = current
+                self._touch(directory)
+                for child in self._subdirectories(directory):
+                    if child not in self.mtimes:
+                        self._register(child, notify=True)
+
+    def _collect(self, wait):
+        time.sleep(min(wait, max(self.poll_interval - (time.monotonic() - self.last_poll), 0.0)))
+        if time.monotonic() - self.last_poll >= self.poll_interval:
+            self.last_poll = time.monotonic()
+            self._poll()
+
+    def mark_seen(self, directory):
+        try:
+            self.mtimes[directory] = os.stat(directory).st_mtime_ns
+        except OSError:
+            self.mtimes.pop(directory, None)
+
+
+class InotifyWatcher(_Watcher):
+    """One inotify watch per directory; new subdirectories are watched as they appear."""
+
+    def __init__(self, root, excluded_dirs, valid_extensions, settle_seconds=2.0):
+        super().__init__(root, excluded_dirs, valid_extensions, settle_seconds)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.paths = {}
+        try:
+            self._add_tree(self.root, notify=False)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self.paths[wd] = directory
+
+    def _add_tree(self, directory, notify):
+        self._add_watch(directory)
+        if notify:
+            # Files may have landed before the watch existed
+            self._touch(directory)
+        for child in self._subdirectories(directory):
+            self._add_tree(child, notify)
+
+    def _collect(self, wait):
+        readable, _, _ = select.select([self.fd], [], [], wait)
+        if not readable:
+            return
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            self._handle(wd, mask, os.fsdecode(name))
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped; fall back to revisiting every watched directory
+            for directory in self.paths.values():
+                self._touch(directory)
+            return
+        directory = self.paths.get(wd)
+        if directory is None:
+            return
+        if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+            if mask & IN_IGNORED:
+                del self.paths[wd]
+            self.pending.pop(directory, None)
+            return
+        if mask & IN_ISDIR:
+            if name in self.excluded_dirs:
+                return
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_tree(os.path.join(directory, name), notify=True)
+                except OSError:
+                    pass
+            return
+        if self._is_relevant_file(name):
+            self._touch(directory)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(root, excluded_dirs, valid_extensions, settle_seconds=2.0, poll_interval=5.0):
+    """inotify on Linux, otherwise (or if inotify cannot be set up) mtime polling."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, excluded_dirs, valid_extensions, settle_seconds)
+        except (OSError, AttributeError):
+            # AttributeError: libc without inotify symbols; OSError: e.g. the watch limit was reached
+            pass
+    return PollingWatcher(root, excluded_dirs, valid_extensions, settle_seconds, poll_interval)
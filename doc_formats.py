@@ -0,0 +1,215 @@
+import io
+import os
+import re
+import zipfile
+from html.parser import HTMLParser
+
+# Cheap identification of what a .doc/.docx file really contains.
+#
+# Files on the shares are named .doc/.docx but may be OOXML packages, legacy
+# OLE2 Word files, RTF, HTML saved from Word, or plain text. sniff_file_type
+# decides from the first SNIFF_SIZE bytes instead of reading and decoding the
+# whole file, so the caller can go straight to the matching extractor. The
+# converters below turn RTF and HTML into plain text for the regex extractor.
+
+SNIFF_SIZE = 4096
+
+ZIP_MAGICS = (b"PK\x03\x04", b"PK\x05\x06")
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+RTF_MAGIC = b"{\\rtf"
+UTF8_BOM = b"\xef\xbb\xbf"
+
+# Types handled by reading the file as text
+TEXT_TYPES = ("text", "rtf", "html")
+
+
+def _open_binary(path):
+    # An ArchiveMember (archives.py) opens itself; archives is only loaded when zip batches are read
+    return open(path, "rb") if isinstance(path, (str, os.PathLike)) else path.open()
+
+
+def _is_utf8_text(header, complete):
+    if b"\x00" in header:
+        return False
+    try:
+        header.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the header is fine
+        if complete or e.reason != "unexpected end of data":
+            return False
+    return True
+
+
+def _is_html(header):
+    start = header.lstrip(UTF8_BOM + b" \t\r\n").lower()
+    return start.startswith((b"<!doctype html", b"<html")) or (start.startswith(b"<") and b"<html" in start)
+
+
+def sniff_file_type(path):
+    """Return "zip", "ole2", "rtf", "html", "text", "empty" or "binary" for the file at `path`.
+
+    "text" follows the old is_txt_file rule (UTF-8 that is not just
+    whitespace) but only looks at the header; the whole file is read only
+    when the header is all whitespace.
+    """
+    with _open_binary(path) as f:
+        header = f.read(SNIFF_SIZE)
+        complete = len(header) < SNIFF_SIZE
+
+        if not header:
+            return "empty"
+        if header.startswith(ZIP_MAGICS):
+            return "zip"
+        if header.startswith(OLE2_MAGIC):
+            return "ole2"
+        if header.lstrip(UTF8_BOM).startswith(RTF_MAGIC):
+            return "rtf"
+        if _is_html(header):
+            return "html"
+        if _is_utf8_text(header, complete):
+            if header.strip():
+                return "text"
+            if complete:
+                return "empty"
+            # Only whitespace so far; settle it the way is_txt_file did
+            try:
+                rest = f.read().decode("utf-8", errors="strict")
+            except UnicodeDecodeError:
+                return "binary"
+            return "text" if rest.strip() else "empty"
+
+        # Zip data does not have to start at offset 0 (e.g. a prepended stub)
+        return "zip" if zipfile.is_zipfile(f) else "binary"
+
+
+# RTF to text, following the usual control-word tokenizer: groups whose
+# destination is not document text (fonts, styles, pictures, ...) are skipped.
+_RTF_TOKEN = re.compile(
+    r"\\([a-z]{1,32})(-?\d{1,10})?[ ]?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|(.)",
+    re.IGNORECASE | re.DOTALL,
+)
+_RTF_SKIP_DESTINATIONS = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "themedata",
+    "colorschememapping", "latentstyles", "datastore", "listtable", "listoverridetable",
+    "rsidtbl", "generator", "xmlnstbl", "mmathPr", "filetbl", "revtbl", "fldinst",
+    "datafield", "bkmkstart", "bkmkend", "listtext", "pntext", "pntxta", "pntxtb",
+}
+_RTF_SPECIAL = {
+    "par": "\n", "line": "\n", "sect": "\n", "page": "\n", "row": "\n",
+    "tab": "\t", "cell": "\t", "emdash": "\u2014", "endash": "\u2013",
+    "lquote": "\u2018", "rquote": "\u2019", "ldblquote": "\u201c", "rdblquote": "\u201d",
+    "bullet": "\u2022",
+}
+
+
+def rtf_to_text(rtf):
+    stack = []
+    ignorable = False
+    uc_skip = 1
+    pending_skip = 0
+    out = []
+    for match in _RTF_TOKEN.finditer(rtf):
+        word, arg, hex_code, symbol, brace, char = match.groups()
+        if brace:
+            pending_skip = 0
+            if brace == "{":
+                stack.append((uc_skip, ignorable))
+            elif stack:
+                uc_skip, ignorable = stack.pop()
+        elif symbol:
+            pending_skip = 0
+            if symbol == "*":
+                ignorable = True
+            elif not ignorable:
+                if symbol == "~":
+                    out.append("\xa0")
+                elif symbol == "_":
+                    out.append("-")
+                elif symbol in "{}\\":
+                    out.append(symbol)
+        elif word:
+            pending_skip = 0
+            if word in _RTF_SKIP_DESTINATIONS:
+                ignorable = True
+            elif ignorable:
+                pass
+            elif word in _RTF_SPECIAL:
+                out.append(_RTF_SPECIAL[word])
+            elif word == "uc":
+                uc_skip = int(arg or 1)
+            elif word == "u" and arg:
+                code = int(arg)
+                out.append(chr(code + 0x10000 if code < 0 else code))
+                pending_skip = uc_skip
+        elif hex_code:
+            if pending_skip > 0:
+                pending_skip -= 1
+            elif not ignorable:
+                out.append(bytes([int(hex_code, 16)]).decode("cp1252", errors="replace"))
+        elif char:
+            if pending_skip > 0:
+                pending_skip -= 1
+            elif not ignorable:
+                out.append(char)
+    return "".join(out)
+
+
+class _HTMLText(HTMLParser):
+    BLOCK_TAGS = {"p", "div", "br", "tr", "li", "table", "h1", "h2", "h3", "h4", "h5", "h6", "title"}
+    CELL_TAGS = {"td", "th"}
+    SKIP_TAGS = {"script", "style", "xml", "head"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in self.CELL_TAGS:
+            self.parts.append("\t")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            # Word wraps long lines in its HTML; the line breaks are not content
+            self.parts.append(" ".join(data.split("\n")))
+
+
+def html_to_text(html):
+    parser = _HTMLText()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.parts)
+
+
+def decode_document_bytes(data):
+    """UTF-8 if it decodes, otherwise Windows-1252, which is what Word writes for HTML and RTF."""
+    if data.startswith(UTF8_BOM):
+        data = data[len(UTF8_BOM):]
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def read_document_text(path, file_type):
+    """Plain text of a "text", "rtf" or "html" file, ready for the regex extractor."""
+    if file_type == "text":
+        with io.TextIOWrapper(_open_binary(path), encoding="utf-8") as f:
+            return f.read().strip()
+    with _open_binary(path) as f:
+        content = decode_document_bytes(f.read())
+    if file_type == "rtf":
+        content = rtf_to_text(content)
+    elif file_type == "html":
+        content = html_to_text(content)
+    return content.strip()
@@ -0,0 +1,213 @@
+import os
+import posixpath
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+
+# Streaming reader for .docx packages.
+#
+# Reads word/document.xml and the footer parts straight out of the zip with
+# iterparse, handing back one table row or paragraph at a time and discarding
+# it afterwards. Text is produced the same way python-docx builds
+# `Paragraph.text` / `_Cell.text`, so the extraction rules in extract_data can
+# be applied unchanged.
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS = "word/_rels/document.xml.rels"
+
+W_BODY = f"{{{W_NS}}}body"
+W_P = f"{{{W_NS}}}p"
+W_R = f"{{{W_NS}}}r"
+W_HYPERLINK = f"{{{W_NS}}}hyperlink"
+W_TBL = f"{{{W_NS}}}tbl"
+W_TR = f"{{{W_NS}}}tr"
+W_TC = f"{{{W_NS}}}tc"
+W_TCPR = f"{{{W_NS}}}tcPr"
+W_GRIDSPAN = f"{{{W_NS}}}gridSpan"
+W_VMERGE = f"{{{W_NS}}}vMerge"
+W_SECTPR = f"{{{W_NS}}}sectPr"
+W_FOOTER_REF = f"{{{W_NS}}}footerReference"
+W_VAL = f"{{{W_NS}}}val"
+W_TYPE = f"{{{W_NS}}}type"
+R_ID = f"{{{R_NS}}}id"
+
+RUN_TEXT = {
+    f"{{{W_NS}}}tab": "\t",
+    f"{{{W_NS}}}ptab": "\t",
+    f"{{{W_NS}}}cr": "\n",
+    f"{{{W_NS}}}noBreakHyphen": "-",
+}
+W_T = f"{{{W_NS}}}t"
+W_BR = f"{{{W_NS}}}br"
+
+
+class PackageNotFoundError(Exception):
+    """Raised for files that are not zip packages, worded like python-docx's error."""
+
+
+# What reading a damaged or unreadable package can raise: not a zip, a
+# corrupt zip or compressed data, a missing part, malformed XML, or the file
+# itself failing
+PACKAGE_ERRORS = (PackageNotFoundError, zipfile.BadZipFile, zlib.error, KeyError, ET.ParseError, OSError)
+
+
+def run_text(r):
+    parts = []
+    for child in r:
+        if child.tag == W_T:
+            parts.append(child.text or "")
+        elif child.tag == W_BR:
+            parts.append("\n" if child.get(W_TYPE, "textWrapping") == "textWrapping" else "")
+        else:
+            parts.append(RUN_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
+
+def paragraph_text(p):
+    """Text of a `w:p` element, matching python-docx `Paragraph.text`."""
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+
+def cell_text(tc):
+    return "\n".join(paragraph_text(p) for p in tc if p.tag == W_P)
+
+
+def _tc_layout(tc):
+    grid_span, continues = 1, False
+    tc_pr = tc.find(W_TCPR)
+    if tc_pr is not None:
+        span = tc_pr.find(W_GRIDSPAN)
+        if span is not None:
+            grid_span = int(span.get(W_VAL, "1"))
+        merge = tc_pr.find(W_VMERGE)
+        if merge is not None:
+            continues = merge.get(W_VAL, "continue") == "continue"
+    return grid_span, continues
+
+
+def row_cell_texts(tr, previous_row):
+    """Grid-expanded cell texts for a `w:tr`, like python-docx `_Row.cells`.
+
+    `previous_row` is the result for the row above and supplies the text of
+    vertically merged continuation cells.
+    """
+    texts = []
+    for tc in tr:
+        if tc.tag != W_TC:
+            continue
+        grid_span, continues = _tc_layout(tc)
+        if continues:
+            start = len(texts)
+            above = previous_row[start:start + grid_span] if previous_row else []
+            texts.extend(above + [""] * (grid_span - len(above)))
+        else:
+            texts.extend([cell_text(tc)] * grid_span)
+    return texts
+
+
+def open_package(doc_path):
+    # A document inside a zip batch (an ArchiveMember, see archives.py) is read from an open file instead
+    source = doc_path if isinstance(doc_path, (str, os.PathLike)) else doc_path.open()
+    if not zipfile.is_zipfile(source):
+        raise PackageNotFoundError(f"Package not found at '{doc_path}'")
+    return zipfile.ZipFile(source)
+
+
+def iter_body(package, text=True):
+    """Yield ("row", cell_texts), ("paragraph", text), ("table_end", None) and ("sectPr", footer_rid) events.
+
+    Only top-level body tables and paragraphs are reported, in document order.
+    Each top-level element is removed from the tree once it has been handled,
+    so memory stays bounded by the largest single row or paragraph. With
+    `text=False` rows and paragraphs are skipped and only sections are reported.
+    """
+    stack = []
+    previous_row = None
+    with package.open(DOCUMENT_PART) as stream:
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            parent = stack[-1] if stack else None
+            parent_tag = parent.tag if parent is not None else None
+
+            if elem.tag == W_SECTPR and (parent_tag == W_BODY or (len(stack) >= 3 and stack[-3].tag == W_BODY and stack[-2].tag == W_P)):
+                ref = None
+                for footer_ref in elem.iter(W_FOOTER_REF):
+                    if footer_ref.get(W_TYPE) == "default":
+                        ref = footer_ref.get(R_ID)
+                yield "sectPr", ref
+            elif elem.tag == W_TR and parent_tag == W_TBL and len(stack) >= 2 and stack[-2].tag == W_BODY:
+                if text:
+                    previous_row = row_cell_texts(elem, previous_row)
+                    yield "row", previous_row
+                parent.remove(elem)
+            elif text and elem.tag == W_P and parent_tag == W_BODY:
+                yield "paragraph", paragraph_text(elem)
+            elif text and elem.tag == W_TBL and parent_tag == W_BODY:
+                previous_row = None
+                yield "table_end", None
+
+            if parent_tag == W_BODY:
+                parent.remove(elem)
+
+
+def _relationship_targets(package):
+    try:
+        with package.open(DOCUMENT_RELS) as stream:
+            tree = ET.parse(stream)
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in tree.getroot().iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = posixpath.normpath(posixpath.join("word", rel.get("Target", "")))
+        targets[rel.get("Id")] = target.lstrip("/")
+    return targets
+
+
+def footer_part_texts(package, footer_rids):
+    """Non-empty footer paragraph texts for the sections' default footers.
+
+    A section without its own default footer inherits the previous section's,
+    as python-docx does through `is_linked_to_previous`.
+    """
+    targets = _relationship_targets(package)
+    cache = {}
+    footer_texts = []
+    current = None
+    for rid in footer_rids:
+        if rid is not None:
+            current = rid
+        if current is None or current not in targets:
+            continue
+        if current not in cache:
+            texts = []
+            with package.open(targets[current]) as stream:
+                root = ET.parse(stream).getroot()
+            for p in root:
+                if p.tag == W_P:
+                    text = paragraph_text(p).strip()
+                    if text:
+                        texts.append(text)
+            cache[current] = texts
+        footer_texts.extend(cache[current])
+    return footer_texts
+
+
+def iter_section_footer_rids(package):
+    for kind, value in iter_body(package, text=False):
+        if kind == "sectPr":
+            yield value
@@ -1,12 +1,22 @@
+import hashlib
+import json
 import os
 import re
-import shutil
-import pandas as pd
-from docx import Document
 import time
+import threading
+from functools import partial
 import warnings
 warnings.filterwarnings("ignore")
-from db_data_insert import getDataFromDfandInsertInDB
+import docx_stream
+import doc_formats
+import ole_doc
+import manifest
+import db_writer
+import metrics
+import run_journal
+from patient_records import MISSING_REQUEST_DATE, PatientRecord, parse_db_date
+from placement import PlacementStats, place_file
+from db_data_insert import insert_patient_records
 from datetime import datetime
 from logger import general_logger, dir_logger
 
@@ -27,82 +37,507 @@ def initialize_folders(base_directory):
 # Regular Expressions with fallback if no table is found in document
 patient_regex = re.compile(r'(?:PATIENT|Patient|Name|Patient Information|RE):\s*\n*\s*([\w\s,]+)', re.IGNORECASE)
 
-dob_regex = re.compile(
-    r'(?:DOB|Date of Birth|DateOfBirth):\s*\n*\s*(\d{1,4}/\d{1,2}/\d{1,4}|\d{8})'
-    r'|Re:\s+.*?\b(\d{1,4}/\d{1,2}/\d{1,4}|\d{8})\b',
+dob_label_regex = re.compile(r'(?:DOB|Date of Birth|DateOfBirth):\s*\n*\s*(\d{1,4}/\d{1,2}/\d{1,4}|\d{8})', re.IGNORECASE)
+# "Re: ... 01/02/1980" - the first date on the line after "Re:"
+dob_re_regex = re.compile(r'Re:\s+.*?\b(\d{1,4}/\d{1,2}/\d{1,4}|\d{8})\b', re.IGNORECASE)
+dob_regex = re.compile(dob_label_regex.pattern + '|' + dob_re_regex.pattern, re.IGNORECASE)
+adm_dt_regex = re.compile(r'(?:Date|ADM DT|Admit Date|Request Date|Date ordered|DATE OF CONSULT):\s*\n*\s*(\d{1,4}/\d{1,2}/\d{1,4}(?:\s*\d{1,2}:\d{2}(?:AM|PM)?)?)', re.IGNORECASE)
+
+# Every match of the three patterns above starts at one of their labels followed
+# by a colon; FieldScanner only tries the patterns at these positions.
+FIELD_LABEL_START = re.compile(
+    r'(?=(?:PATIENT|Patient|Name|Patient Information|RE|DOB|Date of Birth|DateOfBirth|Re'
+    r'|Date|ADM DT|Admit Date|Request Date|Date ordered|DATE OF CONSULT):)',
     re.IGNORECASE
 )
-adm_dt_regex = re.compile(r'(?:Date|ADM DT|Admit Date|Request Date|Date ordered|DATE OF CONSULT):\s*\n*\s*(\d{1,4}/\d{1,2}/\d{1,4}(?:\s*\d{1,2}:\d{2}(?:AM|PM)?)?)', re.IGNORECASE)
+# Longer than any label plus its colon
+FIELD_LABEL_LENGTH = 20
+FIELDS = ("patient", "dob", "adm_dt")
+WHITESPACE_RUN = re.compile(r'\s*')
+
+class FieldScanner:
+    """Find patient, DOB and date in body text fed one paragraph at a time.
+
+    The result is what patient_regex, dob_regex and adm_dt_regex give when each
+    searches the paragraphs joined with newlines, but the text is walked once:
+    the label positions are found with one pattern and only the fields not yet
+    found are tried there. A label is only tried once the text after it is
+    long enough to settle the match (the rest of its line and the next two
+    non-blank lines; the patterns can skip blank lines and run on across
+    lines), so feeding can stop as soon as `done` is true.
+
+    The "Re:" form of the DOB looks for a date anywhere on the rest of the
+    line. Once that failed, a later "Re:" whose date would be looked for on the
+    same line cannot succeed either, so it is not tried again; this keeps long
+    letters with many "re:" linear instead of quadratic.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        # End of the line on which the last "Re:" found no date
+        self._re_searched_to = -1
+
+    @property
+    def done(self):
+        return len(self.fields) == len(FIELDS)
+
+    def feed(self, paragraph):
+        self._text += "\n" + paragraph if self._started else paragraph
+        self._started = True
+        self._scan(final=False)
+
+    def finish(self):
+        self._scan(final=True)
+        return self.fields.get("patient"), self.fields.get("dob"), self.fields.get("adm_dt")
+
+    def _settled(self, start):
+        text = self._text
+        line_end = text.find("\n", start)
+        lines = 0
+        while line_end >= 0 and lines < 2:
+            next_end = text.find("\n", line_end + 1)
+            if next_end < 0:
+                return False
+            if text[line_end + 1:next_end].strip():
+                lines += 1
+            line_end = next_end
+        return lines == 2
+
+    def _match_dob(self, text, start):
+        match = dob_label_regex.match(text, start)
+        if match is not None or not text.startswith(":", start + 2):
+            return match
+        after = start + 3
+        # First character the date search can start from, as in dob_re_regex
+        date_from = WHITESPACE_RUN.match(text, after).end()
+        if date_from == after or date_from < self._re_searched_to:
+            return None
+        match = dob_re_regex.match(text, start)
+        if match is None:
+            line_end = text.find("\n", date_from)
+            self._re_searched_to = len(text) if line_end < 0 else line_end
+        return match
+
+    def _scan(self, final):
+        text = self._text
+        while not self.done:
+            label = FIELD_LABEL_START.search(text, self._pos)
+            if label is None:
+                # A label cannot straddle paragraphs, but keep the tail in case
+                # the text was fed in smaller pieces
+                self._pos = len(text) if final else max(self._pos, len(text) - FIELD_LABEL_LENGTH)
+                break
+            start = label.start()
+            if not final and not self._settled(start):
+                self._pos = start
+                break
+            for field in FIELDS:
+                if field in self.fields:
+                    continue
+                if field == "patient":
+                    match = patient_regex.match(text, start)
+                elif field == "dob":
+                    match = self._match_dob(text, start)
+                else:
+                    match = adm_dt_regex.match(text, start)
+                if match is None:
+                    continue
+                if not final and match.end() == len(text):
+                    # The name could go on in the next paragraph
+                    self._pos = start
+                    return self._trim()
+                if field == "patient":
+                    self.fields[field] = match.group(1).strip()
+                else:
+                    self.fields[field] = match.group(1)
+            self._pos = start + 1
+        self._trim()
+
+    def _trim(self):
+        # Nothing before the next candidate can still match
+        if self._pos:
+            self._text = self._text[self._pos:]
+            self._re_searched_to -= self._pos
+            self._pos = 0
+
+def scan_fields(paragraphs):
+    """(patient, dob, adm_dt) from an iterable of paragraph texts, stopping once all three are found."""
+    with metrics.stage("regex"):
+        scanner = FieldScanner()
+        for paragraph in paragraphs:
+            scanner.feed(paragraph)
+            if scanner.done:
+                break
+        return scanner.finish()
 
 FOOTER_PATTERN = re.compile(r"([A-Za-z\-']+),\s+([A-Za-z\-'\.]+(?:\s+[A-Za-z\-'\.]+)*)\s+(\d+)?\s+(\d{2}/\d{2}/\d{4})\s+(\d{2}/\d{2}/\d{4})")
 
+# Engine used for .docx files: "docx" builds the python-docx object model,
+# "stream" reads the package XML incrementally (see extract_data_streaming).
+EXTRACTION_ENGINE = "docx"
+# Characters of body text the streaming engine keeps for the regex fallback
+STREAM_TEXT_LIMIT = 2 * 1024 * 1024
+# Worker processes used to extract the files of a folder; 1 keeps extraction in-process
+EXTRACTION_WORKERS = 1
+# SQLite file caching extraction results by document content hash; None disables the cache
+EXTRACTION_CACHE_PATH = None
+EXTRACTION_CACHE_MAX_ENTRIES = 100000
+# Bump when the extraction rules change in a way the patterns below do not capture
+EXTRACTION_CACHE_VERSION = 1
+# How documents are put into Processed/Unprocessed: "copy", "hardlink", "reflink" or "move" (see placement.py)
+PLACEMENT_MODE = "copy"
+# Placement totals since the service started
+placement_totals = PlacementStats()
+# Write each folder's rows from a background thread (see db_writer.py) so the
+# tree walk goes on while the database catches up; False inserts before returning
+BACKGROUND_DB_WRITER = False
+# Folders whose rows may wait for the writer before process_folder blocks
+DB_WRITER_MAX_PENDING = 16
+# Rows the writer combines into one insert_patient_records call
+DB_WRITER_BATCH_ROWS = 2000
+# Journal each folder pass (see run_journal.py) so a pass cut short by a crash resumes where it stopped
+RUN_JOURNAL = True
+# fsync the journal at each step; False only flushes it to the operating system
+JOURNAL_FSYNC = True
+# Seconds one document may take to classify before its worker is killed and the
+# file quarantined; None (and no memory limit) classifies without isolated workers
+DOCUMENT_TIMEOUT = None
+# Resident memory cap in bytes for each isolated worker, or None
+DOCUMENT_MEMORY_LIMIT = None
+# Subfolder of Unprocessed for documents over their budget; the reasons go to QUARANTINE_LOG inside it
+QUARANTINE_FOLDER = "Quarantine"
+QUARANTINE_LOG = "quarantine.jsonl"
+# SQLite file indexing document contents across the tree (see content_index.py):
+# byte-identical copies are recorded as aliases instead of being extracted,
+# copied and inserted again. None disables it
+CONTENT_INDEX_PATH = None
+
+class DocumentAnalysis:
+    """Open a Word document once and share its parts between the extraction strategies.
+
+    The python-docx package is loaded lazily on first access and kept for the
+    lifetime of the object, so the table, paragraph and footer strategies all
+    read from the same parsed document. A failed load is remembered in `error`
+    instead of being retried. Word 97-2003 files are read with ole_doc instead,
+    also once, see word_document().
+    """
+
+    def __init__(self, doc_path):
+        self.path = doc_path
+        self.error = None
+        self.parse_count = 0
+        self.content_hash = None
+        self._document = None
+        self._loaded = False
+        self._word_document = None
+
+    @property
+    def document(self):
+        if not self._loaded:
+            self._loaded = True
+            self.parse_count += 1
+            try:
+                from docx import Document
+                with metrics.stage("parse"):
+                    if not isinstance(self.path, (str, os.PathLike)):
+                        self._document = open_member_document(Document, self.path)
+                    else:
+                        self._document = Document(self.path)
+            except Exception as e:
+                self.error = e
+        return self._document
+
+    def word_document(self):
+        """The ole_doc.WordDocument of a .doc, read on first use; raises the read's error every time."""
+        if self._word_document is None:
+            try:
+                self._word_document = ole_doc.read_word_document(self.path, STREAM_TEXT_LIMIT)
+            except Exception as e:
+                self._word_document = e
+        if isinstance(self._word_document, Exception):
+            raise self._word_document
+        return self._word_document
+
+    @property
+    def tables(self):
+        doc = self.document
+        return doc.tables if doc is not None else []
+
+    @property
+    def paragraphs(self):
+        doc = self.document
+        return doc.paragraphs if doc is not None else []
+
+    def body_text(self):
+        """Body paragraphs joined the same way the regex fallback expects."""
+        return "\n".join([p.text for p in self.paragraphs])
+
+    def footer_texts(self):
+        """Non-empty footer paragraph texts across all sections."""
+        doc = self.document
+        if doc is None:
+            return []
+        footer_texts = []
+        for section in doc.sections:
+            footer = section.footer
+            if footer and footer.paragraphs:
+                footer_texts.extend([p.text.strip() for p in footer.paragraphs if p.text.strip()])
+        return footer_texts
+
+
+def open_member_document(Document, member):
+    """Document() for an ArchiveMember, failing like python-docx does for a path that is not a package.
+
+    python-docx checks a path with is_zipfile and raises PackageNotFoundError,
+    which classify_file sends to Links; given a stream it would raise
+    BadZipFile instead and the same damaged file would end up in Files.
+    """
+    import zipfile
+    with member.open() as f:
+        if not zipfile.is_zipfile(f):
+            from docx.opc.exceptions import PackageNotFoundError
+            raise PackageNotFoundError(f"Package not found at '{member}'")
+        f.seek(0)
+        return Document(f)
+
+def get_document_analysis(doc_path):
+    """Return `doc_path` if it is already a DocumentAnalysis, otherwise wrap it."""
+    if isinstance(doc_path, DocumentAnalysis):
+        return doc_path
+    return DocumentAnalysis(doc_path)
+
+def extraction_cache_version():
+    """Changes whenever a pattern used by the extractors changes, invalidating cached results."""
+    patterns = [patient_regex, dob_regex, adm_dt_regex, FOOTER_PATTERN]
+    parts = [str(EXTRACTION_CACHE_VERSION), str(STREAM_TEXT_LIMIT)] + [f"{p.pattern}/{p.flags}" for p in patterns]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+_extraction_cache = None
+
+def get_extraction_cache():
+    """The ExtractionCache at EXTRACTION_CACHE_PATH, opened on first use, or None when disabled.
+
+    A process forked from the one that opened it (an extraction worker) gets
+    its own connection; the inherited one is left alone, as closing it could
+    disturb the parent's.
+    """
+    global _extraction_cache
+    if EXTRACTION_CACHE_PATH is None:
+        return None
+    if _extraction_cache is None or _extraction_cache.path != EXTRACTION_CACHE_PATH \
+            or _extraction_cache.pid != os.getpid():
+        try:
+            from extraction_cache import ExtractionCache
+            _extraction_cache = ExtractionCache(
+                EXTRACTION_CACHE_PATH, extraction_cache_version(), EXTRACTION_CACHE_MAX_ENTRIES
+            )
+        except Exception as e:
+            general_logger.error(f"Extraction cache unavailable at {EXTRACTION_CACHE_PATH}: {e}")
+            return None
+    return _extraction_cache
+
+_content_index = None
+
+def get_content_index():
+    """The ContentIndex at CONTENT_INDEX_PATH, opened on first use (again after a fork), or None when disabled."""
+    global _content_index
+    if CONTENT_INDEX_PATH is None:
+        return None
+    if _content_index is None or _content_index.path != CONTENT_INDEX_PATH \
+            or _content_index.pid != os.getpid():
+        try:
+            from content_index import ContentIndex
+            _content_index = ContentIndex(CONTENT_INDEX_PATH)
+        except Exception as e:
+            general_logger.error(f"Content index unavailable at {CONTENT_INDEX_PATH}: {e}")
+            return None
+    return _content_index
+
+def find_duplicates(index, file_paths):
+    """Split `file_paths` into first occurrences and copies of documents seen before.
+
+    Returns ({path: content hash} for the first occurrences, [(path, content
+    hash, original path)] for copies of a document in the index, [(path,
+    content hash, first path)] for copies of an earlier path in the list).
+    Only the index copies can be aliased right away; the others wait until
+    their first path has been placed. Files that cannot be read count as
+    first occurrences with no hash.
+    """
+    firsts, duplicates, copies, first_in_pass = {}, [], [], {}
+    for path in file_paths:
+        try:
+            content_hash = manifest.file_sha256(path)
+        except OSError:
+            firsts[path] = None
+            continue
+        if content_hash in first_in_pass:
+            copies.append((path, content_hash, first_in_pass[content_hash]))
+            continue
+        original = index.original(content_hash, str(path))
+        if original is None:
+            first_in_pass[content_hash] = path
+            firsts[path] = content_hash
+        else:
+            duplicates.append((str(path), content_hash, str(original)))
+    return firsts, duplicates, copies
+
+def document_content_hash(doc_path):
+    """SHA-256 of the file, computed once per DocumentAnalysis."""
+    if isinstance(doc_path, DocumentAnalysis):
+        if doc_path.content_hash is None:
+            doc_path.content_hash = manifest.file_sha256(doc_path.path)
+        return doc_path.content_hash
+    return manifest.file_sha256(doc_path)
+
+def cached_extraction(doc_path, kind, extract):
+    """Return extract(doc_path)'s result, looked up in and stored to the extraction cache.
+
+    `extract` returns (result tuple, strategy). Exceptions in the result are
+    stored as their message, which is all the callers look at.
+    """
+    if not metrics.ENABLED:
+        return _cached_extraction(doc_path, kind, extract)[0]
+    with metrics.stage("extract:" + kind):
+        result, strategy = _cached_extraction(doc_path, kind, extract)
+    if strategy:
+        metrics.count("strategy", strategy=strategy, hit="yes" if any(result[:3]) else "no")
+    return result
+
+def _cached_extraction(doc_path, kind, extract):
+    cache = get_extraction_cache()
+    if cache is None:
+        return extract(doc_path)
+    try:
+        content_hash = document_content_hash(doc_path)
+    except OSError:
+        return extract(doc_path)
+    entry = cache.get(content_hash, kind)
+    if entry is not None:
+        metrics.count("cache", result="hit")
+        return entry
+    metrics.count("cache", result="miss")
+    result, strategy = extract(doc_path)
+    result = tuple(str(value) if isinstance(value, BaseException) else value for value in result)
+    try:
+        cache.put(content_hash, kind, result, strategy)
+    except Exception as e:
+        general_logger.error(f"Error writing extraction cache: {e}")
+    return result, strategy
+
 def extract_data(doc_path):
+    return cached_extraction(doc_path, "data", _extract_data)
+
+def _extract_data(doc_path):
     try:
-        doc = Document(doc_path)
+        analysis = get_document_analysis(doc_path)
+        if analysis.document is None:
+            return (None, None, None), None
         patient, dob, adm_dt = None, None, None
-        
+        tables = analysis.tables
+        strategy = "table" if tables else "regex"
+
         # Check if the document has any tables
-        if doc.tables:
-            for table in doc.tables:
+        if tables:
+            for table in tables:
                 for row in table.rows:
                     if len(row.cells) >= 2:
-                        key = row.cells[0].text.strip()
-                        value = row.cells[1].text.strip()
-                        
-                        # Normalize whitespace and remove any trailing colons
-                        key_clean = " ".join(key.split()).lower().replace(":", "").strip()
-                        value_clean = " ".join(value.split()).strip()
-
-                        if key_clean in ["patient", "patient name", "name"]:
-                            patient = value_clean
-                        elif key_clean in ["date of birth", "dob"]:
-                            dob = value_clean.split(" ")[0]  # Remove extra text like age
-                        elif key_clean in ["date", "admit date", "date of visit"]:
-                            adm_dt = value_clean
+                        field, value = table_row_field(row.cells[0].text, row.cells[1].text)
+                        if field == "patient":
+                            patient = value
+                        elif field == "dob":
+                            dob = value
+                        elif field == "adm_dt":
+                            adm_dt = value
         else:
             # Fallback: extract from paragraphs using regex
-            text = "\n".join([p.text for p in doc.paragraphs])
-            patient_match = patient_regex.search(text)
-            dob_match = dob_regex.search(text)
-            adm_dt_match = adm_dt_regex.search(text)
-            
-            patient = patient_match.group(1).strip() if patient_match else None
-            if dob_match:
-                dob = dob_match.group(1) or dob_match.group(2)
-            else:
-                dob = None
-            adm_dt = adm_dt_match.group(1) if adm_dt_match else None
+            patient, dob, adm_dt = scan_fields(p.text for p in analysis.paragraphs)
         
-        # Strip off any time portion from adm_dt
-        if adm_dt:
-            adm_dt = adm_dt.split(" ")[0]
-
-        # Optional: remove unwanted trailing words from patient name if needed
-        for unwanted in ["UNIT", "OtherIdNumber", "DATE OF BIRTH", "DOB", "DOB:", "DOB :", "DOB : ", "DOB :  ", "DOB :   ", "PATIENT:", "DATE", "DATE OF"]:
-            if patient and patient.endswith(unwanted):
-                patient = patient.rsplit(" ", 1)[0]
-                
-        return patient, dob, adm_dt
+        return clean_extracted_fields(patient, dob, adm_dt), strategy
     except Exception as e:
         a=1
-        return None, None, None
+        return (None, None, None), None
+
+def table_row_field(key, value):
+    """Map a two-column table row to ("patient" | "dob" | "adm_dt" | None, cleaned value)."""
+    key = key.strip()
+    value = value.strip()
+
+    # Normalize whitespace and remove any trailing colons
+    key_clean = " ".join(key.split()).lower().replace(":", "").strip()
+    value_clean = " ".join(value.split()).strip()
+
+    if key_clean in ["patient", "patient name", "name"]:
+        return "patient", value_clean
+    elif key_clean in ["date of birth", "dob"]:
+        return "dob", value_clean.split(" ")[0]  # Remove extra text like age
+    elif key_clean in ["date", "admit date", "date of visit"]:
+        return "adm_dt", value_clean
+    return None, value_clean
+
+def clean_extracted_fields(patient, dob, adm_dt):
+    """Final clean-up shared by the .docx extraction engines."""
+    # Strip off any time portion from adm_dt
+    if adm_dt:
+        adm_dt = adm_dt.split(" ")[0]
+
+    # Optional: remove unwanted trailing words from patient name if needed
+    for unwanted in ["UNIT", "OtherIdNumber", "DATE OF BIRTH", "DOB", "DOB:", "DOB :", "DOB : ", "DOB :  ", "DOB :   ", "PATIENT:", "DATE", "DATE OF"]:
+        if patient and patient.endswith(unwanted):
+            patient = patient.rsplit(" ", 1)[0]
+
+    return patient, dob, adm_dt
+
+def extract_data_streaming(doc_path):
+    return cached_extraction(doc_path, "data:stream", _extract_data_streaming)
+
+def _extract_data_streaming(doc_path):
+    """Same result shape as extract_data, read incrementally from the package XML.
+
+    Table rows are taken in document order and the first non-empty value for
+    each field wins, which lets the scan stop as soon as patient, DOB and date
+    are all known instead of visiting every row of large lab tables. Documents
+    that repeat a label in later tables can therefore differ from extract_data,
+    which keeps the last value. Documents without tables keep at most
+    STREAM_TEXT_LIMIT characters of body text for the regex fallback.
+    """
+    try:
+        with docx_stream.open_package(doc_path) as package:
+            fields = {}
+            has_tables = False
+            text_parts, text_size = [], 0
+            for kind, value in docx_stream.iter_body(package):
+                if kind == "row":
+                    has_tables = True
+                    text_parts = []
+                    if len(value) >= 2:
+                        field, cleaned = table_row_field(value[0], value[1])
+                        if field and cleaned and field not in fields:
+                            fields[field] = cleaned
+                            if len(fields) == 3:
+                                break
+                elif kind == "table_end":
+                    has_tables = True
+                    text_parts = []
+                elif kind == "paragraph" and not has_tables and text_size < STREAM_TEXT_LIMIT:
+                    text_parts.append(value)
+                    text_size += len(value) + 1
+
+        if has_tables:
+            patient, dob, adm_dt = fields.get("patient"), fields.get("dob"), fields.get("adm_dt")
+        else:
+            patient, dob, adm_dt = extract_from_text("\n".join(text_parts)[:STREAM_TEXT_LIMIT])
+        return clean_extracted_fields(patient, dob, adm_dt), "table" if has_tables else "regex"
+    except docx_stream.PACKAGE_ERRORS:
+        return (None, None, None), None
     
 # Function to extract data from text files
 def extract_from_text(content):
     """Extract patient details from plain text using regex."""
     try:
-        patient_match = patient_regex.search(content)
-        dob_match = dob_regex.search(content)
-        adm_dt_match = adm_dt_regex.search(content)
-
-        patient = patient_match.group(1).strip() if patient_match else None
-        if dob_match:
-            dob = dob_match.group(1) or dob_match.group(2)
-        else:
-            dob = None
-        adm_dt = adm_dt_match.group(1) if adm_dt_match else None
-
-        return patient, dob, adm_dt
+        return scan_fields(content.split("\n"))
     except Exception as e:
         a=1
         return None, None, None
@@ -110,22 +545,89 @@ def extract_from_text(content):
 def extract_footer_text(doc_path):
     """Extract footer text from a Word document."""
     try:
-        doc = Document(doc_path)
-        footer_texts = []
-
-        for section in doc.sections:
-            footer = section.footer
-            if footer and footer.paragraphs:
-                footer_texts.extend([p.text.strip() for p in footer.paragraphs if p.text.strip()])
+        analysis = get_document_analysis(doc_path)
+        if analysis.document is None:
+            return None, analysis.error
+        footer_texts = analysis.footer_texts()
 
         return " ".join(footer_texts) if footer_texts else None, ""
     except Exception as e:
         a=1
         return None, e
 
+def extract_footer_text_streaming(doc_path):
+    """extract_footer_text for the streaming engine: reads only section properties and footer parts."""
+    try:
+        with docx_stream.open_package(doc_path) as package:
+            footer_rids = list(docx_stream.iter_section_footer_rids(package))
+            footer_texts = docx_stream.footer_part_texts(package, footer_rids)
+
+        return " ".join(footer_texts) if footer_texts else None, ""
+    except docx_stream.PACKAGE_ERRORS as e:
+        return None, e
+
 def extract_from_footer(doc_path):
     """Extracts patient details from the footer."""
+    return cached_extraction(doc_path, "footer", _extract_from_footer)
+
+def _extract_from_footer(doc_path):
     footer_text, error = extract_footer_text(doc_path)
+    return match_footer_text(footer_text, error), "footer"
+
+def extract_from_footer_streaming(doc_path):
+    """extract_from_footer using the streaming engine."""
+    return cached_extraction(doc_path, "footer:stream", _extract_from_footer_streaming)
+
+def _extract_from_footer_streaming(doc_path):
+    footer_text, error = extract_footer_text_streaming(doc_path)
+    return match_footer_text(footer_text, error), "footer"
+
+def extract_data_legacy(doc_path):
+    """extract_data for Word 97-2003 (OLE2) .doc files, read with ole_doc.
+
+    Key/value pairs of consecutive table cells take the place of two-column
+    rows; without tables the body text goes through the same regexes.
+    """
+    return cached_extraction(doc_path, "data:ole2", _extract_data_legacy)
+
+def _extract_data_legacy(doc_path):
+    try:
+        document = get_document_analysis(doc_path).word_document()
+        cells = document.table_cells()
+        if cells:
+            patient, dob, adm_dt = None, None, None
+            i = 0
+            while i < len(cells) - 1:
+                field, value = table_row_field(cells[i], cells[i + 1])
+                if field == "patient":
+                    patient = value
+                elif field == "dob":
+                    dob = value
+                elif field == "adm_dt":
+                    adm_dt = value
+                i += 2 if field else 1
+            strategy = "table"
+        else:
+            patient, dob, adm_dt = scan_fields(document.paragraphs())
+            strategy = "regex"
+        return clean_extracted_fields(patient, dob, adm_dt), strategy
+    except Exception as e:
+        a=1
+        return (None, None, None), None
+
+def extract_from_footer_legacy(doc_path):
+    """extract_from_footer for Word 97-2003 (OLE2) .doc files."""
+    return cached_extraction(doc_path, "footer:ole2", _extract_from_footer_legacy)
+
+def _extract_from_footer_legacy(doc_path):
+    try:
+        footer_texts = get_document_analysis(doc_path).word_document().footer_texts()
+        footer_text, error = (" ".join(footer_texts) if footer_texts else None), ""
+    except Exception as e:
+        footer_text, error = None, e
+    return match_footer_text(footer_text, error), "footer"
+
+def match_footer_text(footer_text, error):
     if not footer_text:
         return None, None, None, error
 
@@ -151,11 +653,66 @@ def get_unique_filename(directory, filename, extension):
         counter += 1
     return unique_filename
 
+class FilenameAllocator:
+    """Hands out the names get_unique_filename would, from one listing of `directory`.
+
+    The directory is read once; after that each base name remembers the next
+    suffix to try, so allocating is O(1) amortised instead of one stat per
+    candidate. Each name is claimed by creating it exclusively, so a name
+    taken by another process after the listing is skipped rather than
+    overwritten. The caller then copies over the empty placeholder, or
+    releases the name if it does not place the file after all.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.names = set(os.listdir(directory))
+        self._taken = {os.path.normcase(name) for name in self.names}
+        self._next_counter = {}
+
+    def allocate(self, filename, extension):
+        with self._lock:
+            key = (filename, extension)
+            counter = self._next_counter.get(key, 0)
+            while True:
+                candidate = f"{filename}{extension}" if counter == 0 else f"{filename}_{counter}{extension}"
+                counter += 1
+                if os.path.normcase(candidate) in self._taken:
+                    continue
+                self._taken.add(os.path.normcase(candidate))
+                try:
+                    os.close(os.open(os.path.join(self.directory, candidate), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                except FileExistsError:
+                    continue
+                self._next_counter[key] = counter
+                self.names.add(candidate)
+                return candidate
+
+    def claim(self, name):
+        """Mark a name allocated by an interrupted pass as taken, without creating it."""
+        with self._lock:
+            self._taken.add(os.path.normcase(name))
+            self.names.add(name)
+
+    def release(self, name):
+        """Remove the placeholder for a name whose copy failed; the name is not handed out again."""
+        with self._lock:
+            self.names.discard(name)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def count(self, extensions):
+        """Files in the directory ending with `extensions`, without listing it again."""
+        with self._lock:
+            return len([name for name in self.names if name.endswith(extensions)])
+
 # Function to check if a file is a .docx file
 def is_docx_file(file_path):
     try:
-        doc = Document(file_path)
-        return bool(doc.paragraphs)  
+        return bool(get_document_analysis(file_path).paragraphs)
     except Exception:
         return False
 
@@ -181,16 +738,18 @@ def clean_patient_name(name):
     return re.sub(r'\s*\d+$', '', name).strip()
 
 # Function to process text files
-def process_text_file(file_path):
-    """Extract patient details from text files."""
+def process_text_file(file_path, file_type="text"):
+    """Extract patient details from text files; `file_type` "rtf" or "html" converts the markup first."""
+    return cached_extraction(file_path, file_type, partial(_process_text_file, file_type=file_type))
+
+def _process_text_file(file_path, file_type="text"):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            patient, dob, adm_dt = extract_from_text(content)  
-            return patient, dob, adm_dt
+        content = doc_formats.read_document_text(file_path, file_type)
+        patient, dob, adm_dt = extract_from_text(content)  
+        return (patient, dob, adm_dt), "regex"
     except Exception as e:
         a=1
-        return None, None, None
+        return (None, None, None), None
 
 # Function to convert date formats
 def convert_date_format(date_str):
@@ -219,82 +778,339 @@ def format_date_for_csv(yyyymmdd):
         return f"{yyyymmdd[:4]}-{yyyymmdd[4:6]}-{yyyymmdd[6:]}"  # Convert to yyyy-mm-dd
     return None  # Return None for invalid entries
 
-def process_files_in_current_directory(base_directory, files_list):
-    csv_data = []
-    current_directory = base_directory
-    files_list = os.listdir(current_directory)
-    
-    for file in files_list:
-        if file.endswith(".doc") or file.endswith(".docx"):
-            file_path = os.path.join(current_directory, file)
+def classify_file(file_path, engine="docx"):
+    """Run the extraction strategies for one file without touching the output folders.
 
-            if is_txt_file(file_path):  # If it's actually a text file
-                patient, dob, adm_dt = process_text_file(file_path)
-            else:  # Process as a doc/docx file
-                patient, dob, adm_dt = extract_data(file_path)
+    Returns ("processed", (patient, dob, adm_dt, safe_base_name)) when the file
+    can be renamed, otherwise ("links", None) or ("files", None) for the
+    Unprocessed subfolder it belongs in. Only reads the file, so it can run in
+    a worker process.
+    """
+    # Parsed at most once and shared by the table/paragraph and footer strategies
+    analysis = DocumentAnalysis(file_path)
+    # Decided from the first few KB instead of decoding the whole file
+    with metrics.stage("sniff"):
+        file_type = doc_formats.sniff_file_type(file_path)
 
-            patient = clean_patient_name(patient) if patient else None
+    if file_type in doc_formats.TEXT_TYPES:  # Text, RTF or HTML saved with a .doc name
+        patient, dob, adm_dt = process_text_file(file_path, file_type)
+    elif file_type == "ole2":  # Word 97-2003 binary
+        patient, dob, adm_dt = extract_data_legacy(analysis)
+    elif file_type != "zip":
+        # Empty or unknown binary: python-docx cannot open it, see the footer step below
+        patient, dob, adm_dt = None, None, None
+    elif engine == "stream":
+        patient, dob, adm_dt = extract_data_streaming(file_path)
+    else:  # Process as a doc/docx file
+        patient, dob, adm_dt = extract_data(analysis)
 
-            if patient == "Patient:" or patient == "Patient" or patient == "PATIENT" or patient == "PATIENT:" or patient == "Name" or patient == "Name:" or patient == "Patient Information" or patient == "Patient Information:" or patient == "RE:" or patient == "RE":
-                patient = None
+    patient = clean_patient_name(patient) if patient else None
 
-            if (patient and dob and adm_dt) or (patient and dob):
-                dob = convert_date_format(dob)
-                adm_dt = convert_date_format(adm_dt)
+    if patient == "Patient:" or patient == "Patient" or patient == "PATIENT" or patient == "PATIENT:" or patient == "Name" or patient == "Name:" or patient == "Patient Information" or patient == "Patient Information:" or patient == "RE:" or patient == "RE":
+        patient = None
 
-                if not adm_dt:
-                    base_name = f"{patient.lower()}_{dob}"
-                else:
-                    base_name = f"{patient.lower()}_{dob}_{adm_dt}"
+    if (patient and dob and adm_dt) or (patient and dob):
+        dob = convert_date_format(dob)
+        adm_dt = convert_date_format(adm_dt)
 
-                safe_base_name = re.sub(r'[^\w]+', '_', base_name)
-                extension = os.path.splitext(file)[1]
+        if not adm_dt:
+            base_name = f"{patient.lower()}_{dob}"
+        else:
+            base_name = f"{patient.lower()}_{dob}_{adm_dt}"
 
-                new_filename = get_unique_filename(processed_folder, safe_base_name, extension)
-                new_file_path = os.path.join(processed_folder, new_filename)
+        safe_base_name = re.sub(r'[^\w]+', '_', base_name)
+        return "processed", (patient, dob, adm_dt, safe_base_name)
 
-                try:
-                    shutil.copy2(file_path, new_file_path)
-                    csv_data.append([patient, dob, adm_dt, file, new_filename])
-                except Exception as e:
-                    a=1
+    elif not patient or not dob or not adm_dt:
+        if file_type == "ole2":
+            patient, dob, adm_dt, error = extract_from_footer_legacy(analysis)
+        elif file_type != "zip":
+            # python-docx would fail with "Package not found" for anything that is not a zip package
+            return "links", None
+        elif engine == "stream":
+            patient, dob, adm_dt, error = extract_from_footer_streaming(file_path)
+        else:
+            patient, dob, adm_dt, error = extract_from_footer(analysis)
+
+        if patient and dob and adm_dt:
+            dob = convert_date_format(dob)
+            adm_dt = convert_date_format(adm_dt)
+
+            base_name = f"{patient.lower()}_{dob}_{adm_dt}"
+            safe_base_name = re.sub(r'[^\w]+', '_', base_name)
+            return "processed", (patient, dob, adm_dt, safe_base_name)
+        elif error and "Package not found" in str(error):
+            return "links", None
+        else:
+            return "files", None
+    else:
+        return "files", None
+
+def _classify_file_safely(file_path, engine, reraise=()):
+    try:
+        with metrics.stage("classify"):
+            outcome = classify_file(file_path, engine)
+    except reraise:
+        raise
+    except Exception as e:
+        general_logger.error(f"Error extracting {file_path}: {e}")
+        outcome = "files", None
+    metrics.count("files", outcome=outcome[0])
+    return outcome
+
+def _classify_file_measured(file_path, engine, reraise=()):
+    """_classify_file_safely in a worker process, returning its metrics for the parent to merge."""
+    metrics.ENABLED = True
+    before = metrics.snapshot()
+    outcome = _classify_file_safely(file_path, engine, reraise)
+    return outcome, metrics.delta(before, metrics.snapshot())
+
+_extraction_pool = None
+_extraction_pool_size = 0
+_isolated_workers = None
+
+def get_extraction_pool(workers):
+    """Process pool shared by all folders, created on first use and resized when EXTRACTION_WORKERS changes."""
+    global _extraction_pool, _extraction_pool_size
+    if _extraction_pool is None or _extraction_pool_size != workers:
+        shutdown_extraction_pool()
+        from concurrent.futures import ProcessPoolExecutor
+        _extraction_pool = ProcessPoolExecutor(max_workers=workers)
+        _extraction_pool_size = workers
+    return _extraction_pool
+
+def shutdown_extraction_pool():
+    global _extraction_pool, _extraction_pool_size, _isolated_workers
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown()
+    _extraction_pool = None
+    _extraction_pool_size = 0
+    if _isolated_workers is not None:
+        _isolated_workers.close()
+    _isolated_workers = None
+
+def get_isolated_workers():
+    """Killable workers for DOCUMENT_TIMEOUT/DOCUMENT_MEMORY_LIMIT, recreated when those settings change."""
+    global _isolated_workers
+    settings = (max(1, EXTRACTION_WORKERS), DOCUMENT_TIMEOUT, DOCUMENT_MEMORY_LIMIT)
+    if _isolated_workers is not None and (_isolated_workers.size, _isolated_workers.timeout,
+                                          _isolated_workers.memory_limit) != settings:
+        _isolated_workers.close()
+        _isolated_workers = None
+    if _isolated_workers is None:
+        import isolation
+        _isolated_workers = isolation.IsolatedWorkers(*settings)
+    return _isolated_workers
+
+def classify_files_isolated(file_paths):
+    """classify_files in isolated workers; a file over its time or memory budget is ("quarantine", reason)."""
+    measured = metrics.ENABLED
+    classify = _classify_file_measured if measured else _classify_file_safely
+    target = partial(classify, engine=EXTRACTION_ENGINE, reraise=(MemoryError,))
+    outcomes = []
+    for file_path, (finished, value) in zip(file_paths, get_isolated_workers().map(target, file_paths)):
+        if not finished:
+            general_logger.error(f"Quarantining {file_path}: {value}")
+            metrics.count("files", outcome="quarantine")
+            outcomes.append(("quarantine", value))
+        elif measured:
+            outcome, changes = value
+            metrics.merge(changes)
+            outcomes.append(outcome)
+        else:
+            outcomes.append(value)
+    return outcomes
+
+def classify_files(file_paths):
+    """classify_file for every path, in input order, using EXTRACTION_WORKERS processes."""
+    if DOCUMENT_TIMEOUT or DOCUMENT_MEMORY_LIMIT:
+        return classify_files_isolated(file_paths) if file_paths else []
+    if EXTRACTION_WORKERS <= 1 or len(file_paths) < 2:
+        return [_classify_file_safely(path, EXTRACTION_ENGINE) for path in file_paths]
+
+    from concurrent.futures.process import BrokenProcessPool
+    pool = get_extraction_pool(EXTRACTION_WORKERS)
+    chunksize = max(1, len(file_paths) // (EXTRACTION_WORKERS * 4))
+    try:
+        if not metrics.ENABLED:
+            return list(pool.map(partial(_classify_file_safely, engine=EXTRACTION_ENGINE), file_paths, chunksize=chunksize))
+        outcomes = []
+        for outcome, changes in pool.map(partial(_classify_file_measured, engine=EXTRACTION_ENGINE), file_paths, chunksize=chunksize):
+            metrics.merge(changes)
+            outcomes.append(outcome)
+        return outcomes
+    except BrokenProcessPool as e:
+        # A worker died (e.g. out of memory); drop the pool and finish this folder in-process
+        general_logger.error(f"Extraction pool failed, continuing without workers: {e}")
+        shutdown_extraction_pool()
+        return [_classify_file_safely(path, EXTRACTION_ENGINE) for path in file_paths]
+
+def quarantine_file(file_path, reason, placement_stats):
+    """Put a document that went over its extraction budget into Unprocessed/Quarantine and log why; returns its new path."""
+    quarantine_folder = os.path.join(unprocessed_folder, QUARANTINE_FOLDER)
+    os.makedirs(quarantine_folder, exist_ok=True)
+    file = os.path.basename(str(file_path))
+    place_file(file_path, os.path.join(quarantine_folder, file), PLACEMENT_MODE, placement_stats)
+    entry = {"file": file, "source": str(file_path), "reason": reason, "time": datetime.now().isoformat(timespec="seconds")}
+    with open(os.path.join(quarantine_folder, QUARANTINE_LOG), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return os.path.join(quarantine_folder, file)
+
+def process_files_in_current_directory(base_directory, files_list, allocator=None, journal=None, duplicates=None,
+                                       sources=None):
+    """Classify, rename and place the documents `files_list` of `base_directory`; returns their PatientRecords.
+
+    With a RunJournal, files an interrupted pass already handled continue from
+    the last step it recorded, and each step is recorded before the next one.
+    With CONTENT_INDEX_PATH, copies of documents already handled are only
+    recorded as aliases, and appended to `duplicates` as (path, content hash,
+    original path). `sources` maps the names of a virtual folder to the
+    ArchiveMembers they are read from (see archives.py).
+    """
+    records = []
+    current_directory = base_directory
+    if files_list is None:
+        files_list = os.listdir(current_directory)
+    files_list = [file for file in files_list if file.endswith(".doc") or file.endswith(".docx")]
+    if sources is not None:
+        file_paths = [sources[file] for file in files_list]
+    else:
+        file_paths = [os.path.join(current_directory, file) for file in files_list]
+
+    resumed = [journal.lookup(file, file_path) if journal is not None else None
+               for file, file_path in zip(files_list, file_paths)]
+    fresh = [i for i, entry in enumerate(resumed) if entry is None]
+    index = get_content_index()
+    content_hashes, copies = {}, []
+
+    def record_aliases(aliases):
+        index.add_aliases(aliases)
+        for path, _, original in aliases:
+            dir_logger.info(f"{path} is identical to {original}; recorded as an alias")
+        metrics.count("files", len(aliases), outcome="duplicate")
+        if duplicates is not None:
+            duplicates.extend(aliases)
+
+    if index is not None and fresh:
+        with metrics.stage("dedupe"):
+            content_hashes, aliases, copies = find_duplicates(index, [file_paths[i] for i in fresh])
+        if aliases:
+            record_aliases(aliases)
+        fresh = [i for i in fresh if file_paths[i] in content_hashes]
+    classified = dict(zip(fresh, classify_files([file_paths[i] for i in fresh])))
+
+    # Extraction may run in worker processes; renaming and copying stay here, in
+    # listing order, so names are handed out the same way as in a serial run.
+    if allocator is None:
+        allocator = FilenameAllocator(processed_folder)
 
-            elif not patient or not dob or not adm_dt:
-                patient, dob, adm_dt, error = extract_from_footer(file_path)
+    # File name -> the Processed name reserved for it until it is placed there
+    reserved = {}
 
-                if patient and dob and adm_dt:
-                    dob = convert_date_format(dob)
-                    adm_dt = convert_date_format(adm_dt)
+    def step(i, outcome, fields):
+        new_filename = None
+        if outcome == "processed":
+            with metrics.stage("allocate"):
+                new_filename = allocator.allocate(fields[3], os.path.splitext(files_list[i])[1])
+            reserved[files_list[i]] = new_filename
+        return files_list[i], file_paths[i], outcome, fields, new_filename
 
-                    base_name = f"{patient.lower()}_{dob}_{adm_dt}"
-                    safe_base_name = re.sub(r'[^\w]+', '_', base_name)
-                    extension = os.path.splitext(file)[1]
+    try:
+        steps, extracted = [], []
+        for i, entry in enumerate(resumed):
+            if entry is None:
+                if i in classified:  # not a duplicate
+                    steps.append(step(i, *classified[i]))
+                    extracted.append(steps[-1])
+                continue
+            metrics.count("resumed", state=entry["state"])
+            if entry["state"] == "extracted":
+                # Placed again under the name allocated before the interruption
+                if entry["outcome"] == "processed":
+                    allocator.claim(entry["name"])
+                    reserved[files_list[i]] = entry["name"]
+                steps.append((files_list[i], file_paths[i], entry["outcome"], entry["fields"], entry["name"]))
+            elif entry["state"] == "placed" and entry["outcome"] == "processed":
+                records.append(journal_patient_record(entry, current_directory))
+        if journal is not None:
+            journal.record_extracted(extracted)
+            for entry in journal.unlisted_placed(files_list, processed_folder):
+                records.append(journal_patient_record(entry, current_directory))
 
-                    new_filename = get_unique_filename(processed_folder, safe_base_name, extension)
-                    new_file_path = os.path.join(processed_folder, new_filename)
+        placement_stats = PlacementStats()
+        placed, indexed = [], []
+        position = {file_path: i for i, file_path in enumerate(file_paths)}
+        while steps:
+            for file, file_path, outcome, fields, new_filename in steps:
+                if outcome == "processed":
+                    patient, dob, adm_dt, _ = fields
+                    destination = os.path.join(processed_folder, new_filename)
 
                     try:
-                        shutil.copy2(file_path, new_file_path)
-                        csv_data.append([patient, dob, adm_dt, file, new_filename])
+                        with metrics.stage("place"):
+                            place_file(file_path, destination, PLACEMENT_MODE, placement_stats)
                     except Exception as e:
-                        a=1
+                        allocator.release(reserved.pop(file))
+                        continue
+                    del reserved[file]
+                    records.append(build_patient_record(patient, dob, adm_dt, file, new_filename,
+                                                        current_directory, processed_folder))
+                elif outcome == "links":
+                    destination = os.path.join(unprocessed_folder, "Links", file)
+                    with metrics.stage("place"):
+                        place_file(file_path, destination, PLACEMENT_MODE, placement_stats)
+                elif outcome == "quarantine":
+                    with metrics.stage("place"):
+                        destination = quarantine_file(file_path, fields, placement_stats)
                 else:
-                    if error and "Package not found" in str(error):
-                        shutil.copy2(file_path, os.path.join(unprocessed_folder, "Links", file))
-                    else:
-                        shutil.copy2(file_path, os.path.join(unprocessed_folder, "Files", file))
-            else:
-                shutil.copy2(file_path, os.path.join(unprocessed_folder, "Files", file))
-
-    # Build the DataFrame with all the columns
-    columns = ["patient_name", "dob", "request_date", "old_document", "new_document"]
-    df = pd.DataFrame(csv_data, columns=columns)
-    df.insert(0, "id", range(1, len(df) + 1))
-    df["is_deleted"] = 0
-    df["dob"] = df["dob"].apply(format_date_for_csv)
-    df["request_date"] = df["request_date"].apply(format_date_for_csv)
-    
-    return df
+                    destination = os.path.join(unprocessed_folder, "Files", file)
+                    with metrics.stage("place"):
+                        place_file(file_path, destination, PLACEMENT_MODE, placement_stats)
+                placed.append(file)
+                if content_hashes.get(file_path):
+                    indexed.append((content_hashes[file_path], str(file_path), outcome, destination))
+            steps = []
+            if not copies:
+                break
+
+            # Copies of a document placed above become aliases of it. Where the
+            # document failed to place, the first copy is handled in its place on
+            # the next round, and the other copies wait for that one.
+            placed_hashes = {content_hash for content_hash, _, _, _ in indexed}
+            aliases = [(str(path), content_hash, str(original)) for path, content_hash, original in copies
+                       if content_hash in placed_hashes]
+            if aliases:
+                record_aliases(aliases)
+            firsts, waiting = {}, []
+            for path, content_hash, original in copies:
+                if content_hash in placed_hashes:
+                    continue
+                if content_hash in firsts:
+                    waiting.append((path, content_hash, firsts[content_hash]))
+                else:
+                    firsts[content_hash] = path
+                    content_hashes[path] = content_hash
+            copies = waiting
+            for path, (outcome, fields) in zip(firsts.values(), classify_files(list(firsts.values()))):
+                steps.append(step(position[path], outcome, fields))
+            if journal is not None:
+                journal.record_extracted(steps)
+    finally:
+        # Left by an error or interruption before these files were placed
+        for new_filename in reserved.values():
+            allocator.release(new_filename)
+    if indexed:
+        index.add_documents(indexed)
+    if journal is not None:
+        journal.record_placed(placed)
+
+    placement_totals.merge(placement_stats)
+    metrics.count("bytes", placement_stats.bytes_copied, kind="copied")
+    metrics.count("bytes", placement_stats.bytes_avoided, kind="avoided")
+    dir_logger.info(f"Placement in {current_directory}: {placement_stats.summary()}")
+    dir_logger.info(f"Placement since start: {placement_totals.summary()}")
+
+    return records
 
 def split_patient_name(name):
     """Splits patient name into first and last name, ensuring each word is capitalized properly."""
@@ -314,8 +1130,56 @@ def split_patient_name(name):
     
     return first_name, last_name
 
-def process_folder(folder_path, files):
-    total_files = len([f for f in os.listdir(folder_path) if f.endswith(('.doc', '.docx'))]) 
+def build_patient_record(patient, dob, adm_dt, old_document, new_document, folder_path, processed_folder):
+    """The patient_data row for a processed document, with the name split and the dates parsed once."""
+    first_name, last_name = split_patient_name(patient)
+    return PatientRecord(
+        first_name,
+        last_name or "",
+        parse_db_date(format_date_for_csv(dob)),
+        parse_db_date(format_date_for_csv(adm_dt), MISSING_REQUEST_DATE),
+        old_document,
+        new_document,
+        os.path.join(folder_path, old_document),
+        os.path.join(processed_folder, new_document),
+    )
+
+def journal_patient_record(entry, folder_path):
+    """build_patient_record for a file the run journal records as placed."""
+    patient, dob, adm_dt, _ = entry["fields"]
+    return build_patient_record(patient, dob, adm_dt, entry["file"], entry["name"], folder_path, processed_folder)
+
+_db_writer = None
+_db_writer_lock = threading.Lock()
+
+def get_db_writer():
+    """The background database writer, started on first use and drained when the service exits."""
+    global _db_writer
+    with _db_writer_lock:
+        if _db_writer is None:
+            import atexit
+            _db_writer = db_writer.BackgroundWriter(insert_patient_records, DB_WRITER_MAX_PENDING, DB_WRITER_BATCH_ROWS)
+            atexit.register(_db_writer.close)
+    return _db_writer
+
+def process_folder(folder_path, files, on_complete=None, sources=None, on_queued=None):
+    """Extract, place and insert the documents `files` of `folder_path`; returns (inserted, processed files).
+
+    `inserted` is True once the rows are written, False if writing them
+    failed, and None when the documents left no rows to write (all placed in
+    Unprocessed, Files or Links), which is not a failure and needs no retry.
+
+    With `on_complete`, process_folder returns None and calls
+    on_complete(inserted, processed files) instead, once the rows are in the
+    database. With BACKGROUND_DB_WRITER that happens later, on the writer
+    thread, and process_folder returns as soon as the rows are queued;
+    on_queued(), if given, is called just before they are.
+    For a virtual folder, `sources` maps `files` to their ArchiveMembers.
+    """
+    # `files` comes from the tree walker's listing; only list the folder when called without one
+    if files is None:
+        files = os.listdir(folder_path)
+    total_files = len([f for f in files if f.endswith(('.doc', '.docx'))])
 
     print(f"⚙️ Processing folder: {folder_path} with {total_files} files.")
 
@@ -323,43 +1187,58 @@ def process_folder(folder_path, files):
     global processed_folder, unprocessed_folder, files_folder, links_folder
     processed_folder, unprocessed_folder, files_folder, links_folder = initialize_folders(folder_path)
     
-    # Call the function and keep the DataFrame in memory
-    df = process_files_in_current_directory(folder_path, files)
+    # Seeded with the one listing of Processed this pass needs, and asked for its count afterwards
+    allocator = FilenameAllocator(processed_folder)
 
-    # Apply the function to split names dynamically
-    if df.empty:
-        df["patient_first_name"] = ""
-        df["patient_last_name"] = ""
-    else:
-        df[['patient_first_name', 'patient_last_name']] = df['patient_name'].apply(
-            lambda name: pd.Series(split_patient_name(name))
-        )
+    journal = run_journal.RunJournal(folder_path, JOURNAL_FSYNC) if RUN_JOURNAL else None
+    records = process_files_in_current_directory(folder_path, files, allocator, journal, sources=sources)
 
-    # Add old and new document paths
-    df['old_document_path'] = df['old_document'].apply(lambda x: os.path.join(folder_path, x))
-    df['new_document_path'] = df['new_document'].apply(lambda x: os.path.join(processed_folder, x))
+    cache = get_extraction_cache()
+    if cache is not None:
+        dir_logger.info(f"Extraction cache after {folder_path}: {cache.stats()}")
+    index = get_content_index()
+    if index is not None:
+        dir_logger.info(f"Content index after {folder_path}: {index.stats()}")
 
-    # Reorder columns to ensure 'patient_first_name' and 'patient_last_name' are in the 2nd and 3rd position
-    desired_order = ['id', 'patient_first_name', 'patient_last_name'] + [col for col in df.columns if col not in ['id', 'patient_first_name', 'patient_last_name']]
-    df = df[desired_order]
+    processed_files = allocator.count(('.doc', '.docx'))
 
-    # Drop the original column if needed
-    df.drop(columns=['patient_name'], inplace=True)
+    if len(records) == 0:
+        # Nothing to insert; the folder was still handled
+        result, length = None, processed_files
+        if journal is not None:
+            journal.close()
+            if journal.committed():
+                # Everything was written before an interruption; only directory_info.json is missing
+                result = True
+            else:
+                # Only Unprocessed placements, which are safe to repeat
+                run_journal.clear(folder_path)
+        if on_complete is not None:
+            on_complete(result, length)
+            return None
+        return result, length
 
-    processed_files = len([f for f in os.listdir(processed_folder) if f.endswith(('.doc', '.docx'))])
-    link_files = len([f for f in os.listdir(links_folder) if f.endswith(('.doc', '.docx'))])
-    
-    if(total_files == 0):
-        accuracy = 0
-    else:
-        accuracy = processed_files / (total_files - link_files ) * 100
-    
-    #print(f"Accuracy of {folder_path} is: {accuracy:.4f}%")
+    def committed(result):
+        if journal is not None:
+            if result:
+                journal.record_committed([record.old_document for record in records])
+            journal.close()
 
-    if len(df) == 0:
-        return False,0
-    else:
-        result = getDataFromDfandInsertInDB(df)
+    if on_complete is not None and BACKGROUND_DB_WRITER:
+        def on_commit(result):
+            committed(result)
+            on_complete(result, processed_files)
+        if on_queued is not None:
+            on_queued()
+        get_db_writer().submit(records, on_commit)
+        return None
+
+    result = insert_patient_records(records)
+    committed(result)
 
-    time.sleep(1)
+    with metrics.stage("pause"):
+        time.sleep(1)
+    if on_complete is not None:
+        on_complete(result, processed_files)
+        return None
     return result,processed_files
\ No newline at end of file
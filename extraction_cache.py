@@ -0,0 +1,99 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# On-disk cache of extraction results keyed by document content.
+#
+# Entries are keyed by the SHA-256 of the file and the extraction kind
+# ("data", "text", "footer", ...), so the same referral dropped into several
+# folders, or seen again after a restart, is only parsed once. Each entry
+# also records which strategy produced it (table, regex or footer).
+#
+# Every entry carries the `version` the cache was opened with; the caller
+# derives it from the extraction regexes, so changing a pattern makes the old
+# entries invisible and they are dropped on the next open. The number of
+# entries is bounded by `max_entries`, evicting the least recently used.
+#
+# A connection must not be used across fork(): `pid` records the process that
+# opened it, and get_extraction_cache opens a new one in any other process.
+
+
+class ExtractionCache:
+    def __init__(self, path, version, max_entries=100000):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " content_hash TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " strategy TEXT,"
+                " result TEXT NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (content_hash, kind))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS extraction_cache_last_used ON extraction_cache (last_used)")
+            self._conn.execute("DELETE FROM extraction_cache WHERE version != ?", (version,))
+        self._size = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+
+    def get(self, content_hash, kind):
+        """Return (result tuple, strategy) or None, marking the entry as recently used."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, strategy FROM extraction_cache WHERE content_hash = ? AND kind = ? AND version = ?",
+                (content_hash, kind, self.version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE extraction_cache SET last_used = ? WHERE content_hash = ? AND kind = ?",
+                    (time.time(), content_hash, kind),
+                )
+            return tuple(json.loads(row[0])), row[1]
+
+    def put(self, content_hash, kind, result, strategy):
+        """Store `result`, a tuple of strings/None, evicting the least recently used entries if full."""
+        payload = json.dumps(list(result))
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (content_hash, kind, version, strategy, result, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, kind, self.version, strategy, payload, time.time()),
+            )
+            self._size += cursor.rowcount
+            if self._size > self.max_entries:
+                # Evict a little more than needed so the delete does not run on every put
+                excess = self._size - self.max_entries + max(1, self.max_entries // 100)
+                evicted = self._conn.execute(
+                    "DELETE FROM extraction_cache WHERE rowid IN "
+                    "(SELECT rowid FROM extraction_cache ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                ).rowcount
+                self._size = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+                self.evictions += evicted
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
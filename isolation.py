@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+
+from logger import general_logger
+
+# Worker processes that run one call per document under a time budget and an
+# optional memory cap, for extraction that must not stall a folder pass.
+#
+# Unlike a ProcessPoolExecutor, each worker is fed one document at a time
+# over its own pipe, so a document that runs past `timeout` seconds can be
+# dealt with on its own: its worker is killed and replaced, and the other
+# workers carry on. The memory cap works the same way: while documents are in
+# flight the parent checks each busy worker's resident set every
+# MEMORY_POLL_INTERVAL seconds (/proc, or psutil where installed) and kills
+# one that went over it. The extraction code catches nearly every exception
+# itself, so a MemoryError inside the worker cannot be relied on to surface.
+# Keep the cap well above what a worker with the extraction libraries
+# imported needs at rest (tens of MB).
+#
+# map() returns (True, result) for each document that finished and
+# (False, reason) for each that did not.
+
+
+MEMORY_POLL_INTERVAL = 0.05
+
+
+def resident_bytes(pid):
+    """Resident set size of process `pid`, or None when it cannot be read here."""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+def _serve(conn):
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        function, item = message
+        try:
+            reply = "ok", function(item)
+        except MemoryError:
+            reply = "memory", None
+        except Exception as e:
+            reply = "error", f"{type(e).__name__}: {e}"
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child,), name="isolated-extraction", daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class IsolatedWorkers:
+    def __init__(self, workers, timeout=None, memory_limit=None):
+        self.size = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._context = multiprocessing.get_context()
+        self._idle = []
+        self._memory_checked = False
+
+    def map(self, function, items):
+        """function(item) for each item in a worker, in order: [(True, result) or (False, reason)]."""
+        results = [None] * len(items)
+        queued = list(enumerate(items))[::-1]
+        busy = {}  # connection -> (worker, index, deadline)
+        try:
+            while queued or busy:
+                while queued and len(busy) < self.size:
+                    index, item = queued.pop()
+                    worker = self._send(function, item)
+                    deadline = time.monotonic() + self.timeout if self.timeout else None
+                    busy[worker.conn] = (worker, index, deadline)
+                self._collect(busy, results)
+        finally:
+            for worker, _, _ in busy.values():
+                worker.kill()
+        return results
+
+    def _send(self, function, item):
+        while self._idle:
+            worker = self._idle.pop()
+            try:
+                worker.conn.send((function, item))
+                return worker
+            except OSError:
+                worker.kill()  # died while idle
+        worker = _Worker(self._context)
+        if self.memory_limit and not self._memory_checked:
+            self._memory_checked = True
+            if resident_bytes(worker.process.pid) is None:
+                general_logger.error("Cannot read worker memory use here (no /proc, psutil not installed); "
+                                     "the document memory limit is not enforced")
+        worker.conn.send((function, item))
+        return worker
+
+    def _collect(self, busy, results):
+        """Wait for the first reply or deadline among the `busy` workers and record what finished."""
+        deadlines = [deadline for _, _, deadline in busy.values() if deadline is not None]
+        wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+        if self.memory_limit:
+            wait_for = MEMORY_POLL_INTERVAL if wait_for is None else min(wait_for, MEMORY_POLL_INTERVAL)
+        for conn in wait(list(busy), wait_for):
+            worker, index, _ = busy.pop(conn)
+            try:
+                status, value = conn.recv()
+            except (EOFError, OSError):
+                # Killed by the system (typically out of memory) or crashed outright
+                worker.kill()
+                results[index] = False, f"worker exited with code {worker.process.exitcode}"
+                continue
+            self._idle.append(worker)
+            if status == "ok":
+                results[index] = True, value
+            elif status == "memory":
+                results[index] = False, "ran out of memory"
+            else:
+                results[index] = False, value
+
+        now = time.monotonic()
+        for conn, (worker, index, deadline) in list(busy.items()):
+            if deadline is not None and deadline <= now:
+                del busy[conn]
+                worker.kill()
+                results[index] = False, f"took longer than {self.timeout:g}s"
+            elif self.memory_limit:
+                used = resident_bytes(worker.process.pid)
+                if used is not None and used > self.memory_limit:
+                    del busy[conn]
+                    worker.kill()
+                    results[index] = False, (f"used {used // 2**20} MiB, over the "
+                                             f"{self.memory_limit // 2**20} MiB memory limit")
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().stop()
@@ -0,0 +1,160 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+from logger import general_logger, dir_logger
+import metrics
+
+# Lease files that let several operations.py instances, on one host or on
+# hosts sharing the mount, split one base_directory between them.
+#
+# A worker claims a directory by creating LEASE_FILENAME in it with O_EXCL,
+# which only one worker can win, and holds the lease while it processes that
+# folder. A heartbeat thread touches each held lease every `heartbeat`
+# seconds. A lease whose mtime is older than `ttl` belongs to a worker that
+# died or hung: the next worker to find it renames it aside (again only one
+# rename succeeds) and claims the directory itself; the run journal lets it
+# continue the dead worker's pass where it stopped.
+#
+# Staleness compares the mtime the file server records with this host's
+# clock, so keep `ttl` well above the clock skew between hosts. A worker that
+# stalls for longer than `ttl` loses its leases; its heartbeat logs that.
+
+LEASE_FILENAME = "directory_lease.json"
+
+
+class LeaseManager:
+    def __init__(self, ttl=120, heartbeat=15, worker_id=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        # Directory -> path of its lease file
+        self._held = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def acquire(self, directory):
+        """Claim `directory`; False while another live worker holds it."""
+        path = os.path.join(directory, LEASE_FILENAME)
+        with self._lock:
+            if directory in self._held:
+                return True
+        if not self._create(path) and not (self._break_stale(path) and self._create(path)):
+            metrics.count("leases", result="busy")
+            return False
+        with self._lock:
+            self._held[directory] = path
+        metrics.count("leases", result="acquired")
+        return True
+
+    def release(self, directory):
+        with self._lock:
+            path = self._held.pop(directory, None)
+        if path is None:
+            return
+        if self._owner(path) == self.worker_id:
+            try:
+                os.remove(path)
+            except OSError as e:
+                general_logger.error(f"Cannot remove lease {path}: {e}")
+
+    def held(self):
+        with self._lock:
+            return list(self._held)
+
+    def order(self, entries):
+        """`entries` rotated by a per-worker offset, so workers start their walks in different places."""
+        if len(entries) < 2:
+            return entries
+        offset = zlib.crc32(self.worker_id.encode("utf-8")) % len(entries)
+        return entries[offset:] + entries[:offset]
+
+    def close(self):
+        """Stop the heartbeat and give up every lease still held."""
+        self._stop.set()
+        self._thread.join()
+        for directory in self.held():
+            self.release(directory)
+
+    def _create(self, path):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        except OSError as e:
+            general_logger.error(f"Cannot create lease {path}: {e}")
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"owner": self.worker_id, "acquired": time.time()}, f)
+        return True
+
+    def _owner(self, path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f).get("owner")
+        except (OSError, ValueError):
+            return None
+
+    def _break_stale(self, path):
+        """Remove the lease at `path` if it expired; True when the directory may be claimed now."""
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except FileNotFoundError:
+            return True  # released in the meantime
+        if age < self.ttl:
+            return False
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale)
+        except OSError:
+            return False  # another worker took it over first
+        try:
+            fresh = time.time() - os.stat(stale).st_mtime < self.ttl
+        except OSError:
+            fresh = False
+        if fresh:
+            # Another worker broke the expired lease and claimed the directory between the stat and the rename
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+            return False
+        dir_logger.info(f"Taking over the lease of {self._owner(stale)} on {os.path.dirname(path)}, "
+                        f"not renewed for {age:.0f}s")
+        metrics.count("leases", result="expired")
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat):
+            for directory in self.held():
+                path = os.path.join(directory, LEASE_FILENAME)
+                owner = self._owner(path)
+                with self._lock:
+                    if directory not in self._held:
+                        continue  # released since the list was taken
+                    lost = owner != self.worker_id
+                    if lost:
+                        self._held.pop(directory)
+                if lost:
+                    general_logger.error(f"Lost the lease on {directory}; another worker may be processing it")
+                    continue
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass  # released meanwhile
+                except OSError as e:
+                    general_logger.error(f"Cannot renew lease {path}: {e}")
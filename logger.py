@@ -3,22 +3,33 @@ import os
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
-# Create Logs directory if it doesn't exist
+# Logs directory, created when the first record is written
 log_dir = "Logs"
-os.makedirs(log_dir, exist_ok=True)
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """Opens its file (creating the directory) on the first record instead of at import."""
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
 
 # Get today's date for log file naming
 today_date = datetime.now().strftime('%Y-%m-%d')
 
 # General Log File
 general_log_filepath = os.path.join(log_dir, f"log_{today_date}.log")
-general_handler = RotatingFileHandler(
+general_handler = LazyRotatingFileHandler(
     general_log_filepath, maxBytes=10 * 1024 * 1024, backupCount=10   
 )
 
 # Directory Processing Log File
 dir_log_filepath = os.path.join(log_dir, "processeddir.log")
-dir_handler = RotatingFileHandler(
+dir_handler = LazyRotatingFileHandler(
     dir_log_filepath, maxBytes=10 * 1024 * 1024, backupCount=10  
 )
 
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+# Per-file manifest kept under "files" in directory_info.json.
+#
+# Each document is recorded by name with its size and mtime (nanoseconds), and
+# optionally a SHA-256 of its content. Comparing a fresh listing with the
+# stored manifest tells which files are new or were replaced, so a folder pass
+# only extracts, copies and inserts those instead of the whole folder.
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    # An ArchiveMember (archives.py) opens itself
+    with open(path, "rb") if isinstance(path, (str, os.PathLike)) else path.open() as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def diff_manifest(directory, files, previous, with_hash=False, sources=None):
+    """Return (manifest, changed) for `files` in `directory` against the `previous` manifest.
+
+    A file is unchanged when its size and mtime match the previous entry. With
+    `with_hash`, a file whose mtime moved but whose content hash is the same
+    (e.g. a re-copy of the same document) also counts as unchanged; hashes are
+    only computed for files that fail the size/mtime check. Files that vanish
+    while being checked are left out of both results. `sources` maps the names
+    of a virtual folder to their ArchiveMembers (see archives.py).
+    """
+    manifest, changed = {}, []
+    for name in files:
+        path = sources[name] if sources is not None else os.path.join(directory, name)
+        try:
+            st = os.stat(path) if sources is None else path.stat()
+            entry = {"size": st.st_size, "mtime": st.st_mtime_ns}
+            old = previous.get(name)
+            if old and old.get("size") == entry["size"] and old.get("mtime") == entry["mtime"]:
+                if "sha256" in old:
+                    entry["sha256"] = old["sha256"]
+                manifest[name] = entry
+                continue
+            if with_hash:
+                entry["sha256"] = file_sha256(path)
+                if old and old.get("sha256") == entry["sha256"]:
+                    manifest[name] = entry
+                    continue
+        except OSError:
+            continue
+        manifest[name] = entry
+        changed.append(name)
+    return manifest, changed
+
+
+def keep_previous(manifest, previous, names):
+    """Put back the previous entries for `names`, so a failed pass retries them next time."""
+    for name in names:
+        if name in previous:
+            manifest[name] = previous[name]
+        else:
+            manifest.pop(name, None)
+    return manifest
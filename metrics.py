@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import time
+
+# Per-stage timers and counters for the folder pipeline.
+#
+# Code under measurement wraps a stage in `with metrics.stage("parse"):` and
+# bumps counters with metrics.count("files", outcome="processed"). While
+# ENABLED is False (the default) stage() hands back one shared do-nothing
+# context manager and count() returns at once, so the calls can stay in the
+# hot path.
+#
+# The numbers are cumulative for the process. snapshot()/delta() give the
+# share of one folder pass, run_summary() turns that into the per-run JSON
+# written next to directory_info.json, and render_prometheus() formats the
+# totals in the Prometheus text format, for a textfile collector
+# (write_textfile) or a local /metrics endpoint (serve).
+
+ENABLED = False
+PREFIX = "docproc"
+
+# Stage name -> [calls, seconds]; (counter name, sorted label items) -> value
+_stages = {}
+_counters = {}
+_lock = threading.Lock()
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name):
+    """Context manager adding its wall time to `name`; free when metrics are disabled."""
+    return _Stage(name) if ENABLED else _NULL_STAGE
+
+
+def add_time(name, seconds, calls=1):
+    if not ENABLED:
+        return
+    with _lock:
+        entry = _stages.get(name)
+        if entry is None:
+            _stages[name] = [calls, seconds]
+        else:
+            entry[0] += calls
+            entry[1] += seconds
+
+
+def count(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def snapshot():
+    """Copy of the current totals: {"stages": {name: [calls, seconds]}, "counters": {key: value}}."""
+    with _lock:
+        return {
+            "stages": {name: list(entry) for name, entry in _stages.items()},
+            "counters": dict(_counters),
+        }
+
+
+def delta(before, after):
+    """What happened between two snapshots."""
+    stages = {}
+    for name, (calls, seconds) in after["stages"].items():
+        old_calls, old_seconds = before["stages"].get(name, (0, 0.0))
+        if calls != old_calls:
+            stages[name] = [calls - old_calls, seconds - old_seconds]
+    counters = {}
+    for key, value in after["counters"].items():
+        if value != before["counters"].get(key, 0):
+            counters[key] = value - before["counters"].get(key, 0)
+    return {"stages": stages, "counters": counters}
+
+
+def merge(changes):
+    """Add a delta() taken elsewhere, e.g. in an extraction worker process."""
+    if not ENABLED:
+        return
+    with _lock:
+        for name, (calls, seconds) in changes["stages"].items():
+            entry = _stages.setdefault(name, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        for key, value in changes["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def select(changes, stages=(), counters=()):
+    """The part of a delta() for the named stages and counters."""
+    return {
+        "stages": {name: entry for name, entry in changes["stages"].items() if name in stages},
+        "counters": {key: value for key, value in changes["counters"].items() if key[0] in counters},
+    }
+
+
+def combine(first, second):
+    """The sum of two delta()s."""
+    stages = {name: list(entry) for name, entry in first["stages"].items()}
+    for name, (calls, seconds) in second["stages"].items():
+        entry = stages.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+    counters = dict(first["counters"])
+    for key, value in second["counters"].items():
+        counters[key] = counters.get(key, 0) + value
+    return {"stages": stages, "counters": counters}
+
+
+def _counter_total(changes, name, **labels):
+    wanted = set(labels.items())
+    return sum(value for (counter, items), value in changes["counters"].items()
+               if counter == name and wanted <= set(items))
+
+
+def _by_label(changes, name, label):
+    totals = {}
+    for (counter, items), value in changes["counters"].items():
+        if counter == name:
+            key = dict(items).get(label, "")
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def run_summary(changes, wall_seconds, **extra):
+    """JSON-ready summary of one folder pass from its delta()."""
+    files = _counter_total(changes, "files")
+    db_rows = _counter_total(changes, "db_rows")
+    db_seconds = changes["stages"].get("db_write", [0, 0.0])[1]
+    strategies = _by_label(changes, "strategy", "strategy")
+    summary = dict(extra)
+    summary.update({
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "wall_seconds": round(wall_seconds, 6),
+        "files": files,
+        "files_per_second": round(files / wall_seconds, 3) if wall_seconds > 0 else None,
+        "outcomes": _by_label(changes, "files", "outcome"),
+        "strategies": {name: {"count": value,
+                              "hits": _counter_total(changes, "strategy", strategy=name, hit="yes"),
+                              "hit_rate": round(_counter_total(changes, "strategy", strategy=name, hit="yes") / value, 4)}
+                       for name, value in strategies.items()},
+        "bytes": _by_label(changes, "bytes", "kind"),
+        "db_rows": _by_label(changes, "db_rows", "result"),
+        "db_rows_per_second": round(db_rows / db_seconds, 3) if db_seconds > 0 else None,
+        "stages": {name: {"calls": calls, "seconds": round(seconds, 6)}
+                   for name, (calls, seconds) in sorted(changes["stages"].items())},
+    })
+    return summary
+
+
+def write_json(path, data):
+    """Write `data` to `path` through a temporary file, so readers never see half a file."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(temporary, path)
+
+
+def _label_text(items):
+    if not items:
+        return ""
+    escaped = [(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for key, value in items]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def render_prometheus():
+    """The cumulative totals in the Prometheus text exposition format."""
+    totals = snapshot()
+    lines = [
+        f"# HELP {PREFIX}_stage_seconds_total Wall time spent per pipeline stage.",
+        f"# TYPE {PREFIX}_stage_seconds_total counter",
+    ]
+    for name, (_, seconds) in sorted(totals["stages"].items()):
+        lines.append(f'{PREFIX}_stage_seconds_total{{stage="{name}"}} {seconds:.6f}')
+    lines += [
+        f"# HELP {PREFIX}_stage_calls_total Times each pipeline stage ran.",
+        f"# TYPE {PREFIX}_stage_calls_total counter",
+    ]
+    for name, (calls, _) in sorted(totals["stages"].items()):
+        lines.append(f'{PREFIX}_stage_calls_total{{stage="{name}"}} {calls}')
+
+    by_name = {}
+    for (name, items), value in totals["counters"].items():
+        by_name.setdefault(name, []).append((items, value))
+    for name in sorted(by_name):
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        for items, value in sorted(by_name[name]):
+            lines.append(f"{PREFIX}_{name}_total{_label_text(items)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Rewrite a Prometheus textfile-collector file with the current totals."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(render_prometheus())
+    os.replace(temporary, path)
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve render_prometheus() at http://host:port/metrics from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
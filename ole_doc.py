@@ -0,0 +1,307 @@
+import os
+import struct
+
+# Text reader for legacy Word 97-2003 .doc files (OLE2 compound files).
+#
+# Only what the extraction rules need is read: the FIB at the start of the
+# WordDocument stream, the piece table (CLX) and header/footer boundaries
+# (PlcfHdd) from the table stream, and the bytes of the main text and footer
+# stories. Sectors are read on demand, so embedded pictures and formatting
+# data are never touched. No Word or LibreOffice installation is involved.
+
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+FREESECT = 0xFFFFFFFF
+ENDOFCHAIN = 0xFFFFFFFE
+MAXREGSECT = 0xFFFFFFFA
+NOSTREAM = 0xFFFFFFFF
+
+STREAM_OBJECT = 2
+ROOT_OBJECT = 5
+
+WORD_IDENT = 0xA5EC
+FIB_ENCRYPTED = 0x0100
+FIB_WHICH_TABLE = 0x0200
+
+# Indexes into FibRgLw97 and FibRgFcLcb97
+LW_CCP_TEXT = 3
+LW_CCP_FTN = 4
+LW_CCP_HDD = 5
+FC_PLCF_HDD = 11
+FC_CLX = 33
+
+# Header/footer stories per section in PlcfHdd, after the 6 note separators
+HDD_SEPARATORS = 6
+HDD_STORIES_PER_SECTION = 6
+HDD_ODD_FOOTER = 3
+
+CELL_MARK = "\x07"
+
+_SPECIAL_CHARS = {
+    "\r": "\n",
+    "\x0b": "\n",   # manual line break
+    "\x0c": "\n",   # page / section break
+    "\x0e": "\n",   # column break
+    "\x1e": "-",    # non-breaking hyphen
+    "\x1f": "",     # optional hyphen
+    CELL_MARK: CELL_MARK,
+    "\t": "\t",
+}
+
+
+class OleError(Exception):
+    """Raised for files that are not readable OLE2 Word documents."""
+
+
+class _Stream:
+    def __init__(self, read_sector, sectors, sector_size, size):
+        self._read_sector = read_sector
+        self._sectors = sectors
+        self._sector_size = sector_size
+        self.size = size
+
+    def read(self, offset, length):
+        """Bytes [offset, offset + length) of the stream, clipped to its size."""
+        end = min(offset + length, self.size)
+        parts = []
+        while offset < end:
+            index, within = divmod(offset, self._sector_size)
+            if index >= len(self._sectors):
+                raise OleError("stream is shorter than its directory entry says")
+            chunk = min(self._sector_size - within, end - offset)
+            parts.append(self._read_sector(self._sectors[index], within, chunk))
+            offset += chunk
+        return b"".join(parts)
+
+
+class CompoundFile:
+    """Minimal OLE2 compound file reader over an open binary file."""
+
+    def __init__(self, f):
+        self._f = f
+        header = f.read(512)
+        if len(header) < 512 or not header.startswith(OLE2_MAGIC):
+            raise OleError("not an OLE2 compound file")
+        sector_shift, mini_shift = struct.unpack_from("<HH", header, 0x1E)
+        if not 7 <= sector_shift <= 16 or not 1 <= mini_shift < sector_shift:
+            raise OleError("bad sector size")
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_shift
+        num_fat, first_dir = struct.unpack_from("<II", header, 0x2C)
+        self.mini_cutoff, first_minifat, num_minifat, first_difat, num_difat = struct.unpack_from("<5I", header, 0x38)
+
+        f.seek(0, 2)
+        self._max_sectors = max(0, f.tell() // self.sector_size - 1)
+
+        fat_sectors = [s for s in struct.unpack_from("<109I", header, 0x4C)[:num_fat]]
+        per_difat = self.sector_size // 4 - 1
+        sector = first_difat
+        for _ in range(num_difat):
+            if len(fat_sectors) >= num_fat or sector > MAXREGSECT:
+                break
+            entries = struct.unpack(f"<{per_difat + 1}I", self._read_sector(sector, 0, self.sector_size))
+            fat_sectors.extend(entries[:per_difat])
+            sector = entries[per_difat]
+        per_fat = self.sector_size // 4
+        self._fat = []
+        for sector in fat_sectors[:num_fat]:
+            self._fat.extend(struct.unpack(f"<{per_fat}I", self._read_sector(sector, 0, self.sector_size)))
+
+        directory = self._regular_stream(first_dir, None)
+        self.entries = []
+        for offset in range(0, directory.size, 128):
+            raw = directory.read(offset, 128)
+            name_length = struct.unpack_from("<H", raw, 64)[0]
+            name = raw[:max(0, min(name_length, 64) - 2)].decode("utf-16-le", errors="replace")
+            entry_type = raw[66]
+            start, size = struct.unpack_from("<IQ", raw, 116)
+            if self.sector_size == 512:
+                size &= 0xFFFFFFFF
+            self.entries.append((name, entry_type, start, size))
+        if not self.entries or self.entries[0][1] != ROOT_OBJECT:
+            raise OleError("missing root directory entry")
+
+        root_start, root_size = self.entries[0][2], self.entries[0][3]
+        self._mini_stream = self._regular_stream(root_start, root_size) if root_size else None
+        self._minifat = []
+        if num_minifat and first_minifat <= MAXREGSECT:
+            minifat = self._regular_stream(first_minifat, None)
+            self._minifat = list(struct.unpack(f"<{minifat.size // 4}I", minifat.read(0, minifat.size)))
+
+    def _read_sector(self, sector, within, length):
+        if sector > MAXREGSECT or sector >= self._max_sectors:
+            raise OleError(f"sector {sector} is outside the file")
+        self._f.seek((sector + 1) * self.sector_size + within)
+        data = self._f.read(length)
+        if len(data) != length:
+            raise OleError("unexpected end of file")
+        return data
+
+    def _chain(self, start, table, limit):
+        chain = []
+        sector = start
+        while sector <= MAXREGSECT:
+            if sector >= len(table) or len(chain) > limit:
+                raise OleError("broken sector chain")
+            chain.append(sector)
+            sector = table[sector]
+        return chain
+
+    def _regular_stream(self, start, size):
+        sectors = self._chain(start, self._fat, len(self._fat))
+        if size is None:
+            size = len(sectors) * self.sector_size
+        return _Stream(self._read_sector, sectors, self.sector_size, size)
+
+    def _read_mini_sector(self, sector, within, length):
+        return self._mini_stream.read(sector * self.mini_sector_size + within, length)
+
+    def open_stream(self, name):
+        for entry_name, entry_type, start, size in self.entries:
+            if entry_type == STREAM_OBJECT and entry_name.lower() == name.lower():
+                if size < self.mini_cutoff and self._mini_stream is not None:
+                    sectors = self._chain(start, self._minifat, len(self._minifat))
+                    return _Stream(self._read_mini_sector, sectors, self.mini_sector_size, size)
+                return self._regular_stream(start, size)
+        raise OleError(f"stream {name!r} not found")
+
+
+def _pieces(clx):
+    """(cp_start, cp_end, byte_offset, compressed) for each piece in a CLX."""
+    pos = 0
+    while pos < len(clx):
+        kind = clx[pos]
+        if kind == 0x01:  # Prc: property modifiers, not needed for text
+            (size,) = struct.unpack_from("<h", clx, pos + 1)
+            pos += 3 + max(size, 0)
+        elif kind == 0x02:  # Pcdt: the piece table
+            (size,) = struct.unpack_from("<I", clx, pos + 1)
+            plc = clx[pos + 5:pos + 5 + size]
+            count = (len(plc) - 4) // 12
+            cps = struct.unpack_from(f"<{count + 1}I", plc, 0)
+            pieces = []
+            for i in range(count):
+                (fc,) = struct.unpack_from("<I", plc, 4 * (count + 1) + 8 * i + 2)
+                compressed = bool(fc & 0x40000000)
+                fc &= 0x3FFFFFFF
+                pieces.append((cps[i], cps[i + 1], fc // 2 if compressed else fc, compressed))
+            return pieces
+        else:
+            break
+    raise OleError("no piece table in CLX")
+
+
+def _clean_text(raw):
+    """Drop field codes and control characters; keep field results, paragraph breaks and cell marks."""
+    out = []
+    fields = []  # one entry per open field: True once its result part started
+    for char in raw:
+        if char == "\x13":
+            fields.append(False)
+        elif char == "\x14":
+            if fields:
+                fields[-1] = True
+        elif char == "\x15":
+            if fields:
+                fields.pop()
+        elif not all(fields):
+            continue
+        elif char in _SPECIAL_CHARS:
+            out.append(_SPECIAL_CHARS[char])
+        elif char >= " ":
+            out.append(char)
+    return "".join(out)
+
+
+class WordDocument:
+    """Main text and default footers of a .doc file."""
+
+    def __init__(self, body, footers):
+        self.body = body
+        self.footers = footers
+
+    def paragraphs(self):
+        return [p.replace(CELL_MARK, "\t") for p in self.body.split("\n")]
+
+    def body_text(self):
+        """Paragraphs joined like DocumentAnalysis.body_text, with cell marks shown as tabs."""
+        return "\n".join(self.paragraphs())
+
+    def table_cells(self):
+        """Text of each table cell in document order; a cell keeps only its last paragraph."""
+        if CELL_MARK not in self.body:
+            return []
+        segments = self.body.split(CELL_MARK)[:-1]
+        return [segment.rsplit("\n", 1)[-1] for segment in segments]
+
+    def footer_texts(self):
+        """Non-empty footer paragraph texts, like DocumentAnalysis.footer_texts."""
+        texts = []
+        for footer in self.footers:
+            for paragraph in footer.replace(CELL_MARK, " ").split("\n"):
+                if paragraph.strip():
+                    texts.append(paragraph.strip())
+        return texts
+
+
+def read_word_document(path, max_chars=None):
+    """Read the main text (at most `max_chars` characters) and footers of the .doc at `path`."""
+    # An ArchiveMember (archives.py) opens itself
+    with open(path, "rb") if isinstance(path, (str, os.PathLike)) else path.open() as f:
+        ole = CompoundFile(f)
+        word = ole.open_stream("WordDocument")
+        fib = word.read(0, 4096)
+        if len(fib) < 34 or struct.unpack_from("<H", fib, 0)[0] != WORD_IDENT:
+            raise OleError("not a Word 97-2003 document")
+        (flags,) = struct.unpack_from("<H", fib, 0x0A)
+        if flags & FIB_ENCRYPTED:
+            raise OleError("document is encrypted")
+
+        (csw,) = struct.unpack_from("<H", fib, 32)
+        lw_offset = 34 + csw * 2 + 2
+        (cslw,) = struct.unpack_from("<H", fib, lw_offset - 2)
+        fc_offset = lw_offset + cslw * 4 + 2
+        (fc_count,) = struct.unpack_from("<H", fib, fc_offset - 2)
+        if cslw <= LW_CCP_HDD or fc_count <= FC_CLX or fc_offset + fc_count * 8 > len(fib):
+            raise OleError("unsupported FIB")
+        ccp_text, ccp_ftn, ccp_hdd = struct.unpack_from("<3I", fib, lw_offset + LW_CCP_TEXT * 4)
+        fc_clx, lcb_clx = struct.unpack_from("<II", fib, fc_offset + FC_CLX * 8)
+        fc_hdd, lcb_hdd = struct.unpack_from("<II", fib, fc_offset + FC_PLCF_HDD * 8)
+
+        table = ole.open_stream("1Table" if flags & FIB_WHICH_TABLE else "0Table")
+        pieces = _pieces(table.read(fc_clx, lcb_clx))
+
+        def text_range(start, end):
+            parts = []
+            for cp_start, cp_end, offset, compressed in pieces:
+                low, high = max(start, cp_start), min(end, cp_end)
+                if low >= high:
+                    continue
+                if compressed:
+                    data = word.read(offset + (low - cp_start), high - low)
+                    parts.append(data.decode("cp1252", errors="replace"))
+                else:
+                    data = word.read(offset + 2 * (low - cp_start), 2 * (high - low))
+                    parts.append(data.decode("utf-16-le", errors="replace"))
+            return "".join(parts)
+
+        body_end = ccp_text if max_chars is None else min(ccp_text, max_chars)
+        body = _clean_text(text_range(0, body_end))
+
+        footers = []
+        if ccp_hdd and lcb_hdd >= 8:
+            plc = table.read(fc_hdd, lcb_hdd)
+            cps = struct.unpack(f"<{len(plc) // 4}I", plc[:len(plc) // 4 * 4])
+            story_start = ccp_text + ccp_ftn
+            sections = (len(cps) - 1 - HDD_SEPARATORS) // HDD_STORIES_PER_SECTION
+            current = None
+            for section in range(max(sections, 0)):
+                index = HDD_SEPARATORS + section * HDD_STORIES_PER_SECTION + HDD_ODD_FOOTER
+                start, end = cps[index], min(cps[index + 1], ccp_hdd)
+                # An empty story means the section reuses the previous section's footer
+                if end > start:
+                    current = _clean_text(text_range(story_start + start, story_start + end))
+                if current is not None:
+                    footers.append(current)
+
+    return WordDocument(body, footers)
@@ -2,21 +2,152 @@ import os
 import time
 import json
 import sys
+import threading
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from extract_data import process_folder
+from extract_data import process_folder, get_db_writer
 from logger import general_logger, dir_logger
+import dir_watcher
+import manifest
+import metrics
+import run_journal
+import leases
 
 base_directory = "C:\PythonEmbed\Data"
 EXCLUDED_DIRS = {"Processed", "Unprocessed"}
 JSON_FILENAME = "directory_info.json"
 VALID_EXTENSIONS = {".doc", ".docx"}
+# "scan" rescans the whole tree every SCAN_INTERVAL seconds; "watch" only revisits
+# the directories dir_watcher reports as changed (inotify on Linux, mtime polling elsewhere)
+SCAN_MODE = "scan"
+SCAN_INTERVAL = 5
+# Pause before descending into each subdirectory, to go easy on network shares
+SUBDIRECTORY_DELAY = 1
+# Also compare content hashes when a file's size or mtime changed, so re-copies of the same document are skipped
+MANIFEST_HASH = False
+# Seconds a directory must be quiet before it is processed in watch mode
+WATCH_SETTLE_SECONDS = 2
+# Per-stage timings and counters (metrics.py); off costs next to nothing
+METRICS_ENABLED = False
+# Written next to directory_info.json after each folder pass
+RUN_SUMMARY_FILENAME = "directory_metrics.json"
+# Prometheus text-format file rewritten after each folder pass (node_exporter textfile collector), or None
+METRICS_TEXTFILE = None
+# Serve the same text at http://127.0.0.1:METRICS_PORT/metrics, or None
+METRICS_PORT = None
+# Several instances may share base_directory: each folder is processed by the
+# instance holding its lease file (see leases.py)
+LEASES_ENABLED = False
+# Seconds without a heartbeat after which a lease counts as abandoned, and between heartbeats
+LEASE_TTL = 120
+LEASE_HEARTBEAT = 15
+# Read .zip batches in place as the folders they would unpack to (see archives.py),
+# instead of waiting for someone to unpack them into the tree
+ARCHIVE_INGESTION = False
+# Kept here rather than taken from archives.py, which is only imported once an archive is found
+ARCHIVE_EXTENSIONS = {".zip"}
 
-def create_or_update_json(directory, files):
+# Directories whose rows are still waiting for the database writer; they are
+# not looked at again until their directory_info.json has been written
+pending_directories = set()
+pending_lock = threading.Lock()
+# This instance's LeaseManager while LEASES_ENABLED
+lease_manager = None
+
+def write_json(json_path, data):
+    with open(json_path, "w") as f:
+        try:
+            json.dump(data, f, indent=4)
+        except Exception as e:
+            general_logger.error(f"Error writing JSON file {json_path}: {e}")
+
+def report_error(message):
+    """Log `message` with the traceback being handled, count it in the metrics and show it on stderr."""
+    general_logger.error(message, exc_info=True)
+    metrics.count("errors")
+    print(f"ERROR: {message}: {sys.exc_info()[1]!r}", file=sys.stderr)
+
+def start_metrics():
+    metrics.ENABLED = True
+    if METRICS_PORT:
+        try:
+            metrics.serve(METRICS_PORT)
+        except OSError as e:
+            general_logger.error(f"Cannot serve metrics on port {METRICS_PORT}: {e}")
+
+def start_leases():
+    global lease_manager
+    lease_manager = leases.LeaseManager(LEASE_TTL, LEASE_HEARTBEAT)
+    dir_logger.info(f"Sharing the tree with other workers as {lease_manager.worker_id}")
+
+def record_run(directory, files, changes, started, cond, length):
+    """Write the folder pass's summary next to directory_info.json and refresh the Prometheus file."""
+    summary = metrics.run_summary(changes, time.perf_counter() - started, url=os.path.abspath(directory),
+                                  items=len(files), processedItems=length, inserted=cond)
+    if RUN_SUMMARY_FILENAME:
+        metrics.write_json(os.path.join(directory, RUN_SUMMARY_FILENAME), summary)
+    if METRICS_TEXTFILE:
+        metrics.write_textfile(METRICS_TEXTFILE)
+
+def run_process_folder(directory, files, finish, sources=None):
+    """process_folder, then finish(cond, length) once the folder's rows are committed.
+
+    cond is process_folder's `inserted`: only False, a failed insert, means the
+    files must be tried again.
+
+    With extract_data.BACKGROUND_DB_WRITER, finish runs later on the writer
+    thread; until then the directory is skipped by create_or_update_json.
+    """
+    with pending_lock:
+        pending_directories.add(directory)
+    measured = metrics.ENABLED
+    before, started = (metrics.snapshot(), time.perf_counter()) if measured else (None, None)
+    # The pass's own share, taken when its rows are handed to the background writer
+    passed = []
+
+    def queued():
+        if measured:
+            passed.append(metrics.delta(before, metrics.snapshot()))
+
+    def done(cond, length):
+        try:
+            finish(cond, length)
+            if cond is not False:
+                # The pass is in directory_info.json now; a restart no longer needs the journal
+                run_journal.clear(directory)
+            if measured:
+                if passed:
+                    # Plus the batch the rows were written in, not whatever else ran in the meantime
+                    written = get_db_writer().last_write
+                    changes = metrics.combine(passed[0], written) if written is not None else passed[0]
+                else:
+                    changes = metrics.delta(before, metrics.snapshot())
+                record_run(directory, files, changes, started, cond, length)
+        except Exception:
+            report_error(f"Unexpected error in create_or_update_json for directory {directory}")
+        finally:
+            with pending_lock:
+                pending_directories.discard(directory)
+            if lease_manager is not None:
+                lease_manager.release(directory)
+
+    try:
+        process_folder(directory, files, on_complete=done, sources=sources, on_queued=queued)
+    except Exception:
+        with pending_lock:
+            pending_directories.discard(directory)
+        report_error(f"Error processing folder {directory}")
+
+def create_or_update_json(directory, files, sources=None):
     if not files:
         return  
 
+    with pending_lock:
+        if directory in pending_directories:
+            dir_logger.info(f"{directory} is still being written to the database; checking it later")
+            return
+
     json_path = os.path.join(directory, JSON_FILENAME)
     data = {
         "url": os.path.abspath(directory),
@@ -32,115 +163,225 @@ def create_or_update_json(directory, files):
             except (json.JSONDecodeError, IOError) as e:
                 general_logger.error(f"Error reading JSON file {json_path}: {e}")
                 existing_data = data
-            
-            if existing_data["items"] < len(files):
-                dir_logger.info(f"New files detected in {directory}. Reprocessing...")
-                try:
-                    cond, length = process_folder(directory, files)
-                    if cond:
+
+            previous = existing_data.get("files", {})
+            files_manifest, changed = manifest.diff_manifest(directory, files, previous, MANIFEST_HASH, sources)
+            if "files" not in existing_data and existing_data["items"] >= len(files):
+                # Written before the per-file manifest existed: trust the item count once and adopt the listing
+                changed = []
+
+            if changed:
+                dir_logger.info(f"{len(changed)} new or changed files detected in {directory}. Reprocessing...")
+
+                def finish(cond, length):
+                    if cond is not False:
                         existing_data["items"] = len(files)
                         existing_data["processedItems"] = length
+                        existing_data["files"] = files_manifest
                     else:
-                        data["processedItems"] = length                    
-                except Exception as e:
-                    general_logger.error(f"Error processing folder {directory}: {e}")
-                    return
-                
-                dir_logger.info(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
-                print(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
-            elif existing_data['items'] == len(files):
+                        existing_data["files"] = manifest.keep_previous(files_manifest, previous, changed)
+
+                    dir_logger.info(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
+                    print(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
+                    write_json(json_path, existing_data)
+
+                run_process_folder(directory, changed, finish, sources)
+            else:
+                existing_data["items"] = len(files)
                 print(f"Checked! Already Processed.....")
-            data = existing_data
+                existing_data["files"] = files_manifest
+                write_json(json_path, existing_data)
 
         else:
             dir_logger.info(f"Creating JSON for {directory}")
-            try:
-                cond, length = process_folder(directory, files)
+            files_manifest, _ = manifest.diff_manifest(directory, files, {}, MANIFEST_HASH, sources)
+
+            def finish(cond, length):
                 data["processedItems"] = length
-            except Exception as e:
-                general_logger.error(f"Error processing folder {directory}: {e}")
-                return
-            
-            dir_logger.info(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
-            print(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
-        
-        with open(json_path, "w") as f:
+                # After a failed insert no file is recorded as seen, so the next scan tries them again
+                data["files"] = files_manifest if cond is not False else {}
+
+                dir_logger.info(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
+                print(f"Total Files in current dir are: {len(files)} and processed are: {length}.")
+                write_json(json_path, data)
+
+            run_process_folder(directory, files, finish, sources)
+    except Exception:
+        report_error(f"Unexpected error in create_or_update_json for directory {directory}")
+
+def update_directory(directory, files, sources=None):
+    """create_or_update_json under this instance's lease on `directory`; False if another instance holds it."""
+    if not files:
+        return True
+    if lease_manager is None:
+        create_or_update_json(directory, files, sources)
+        return True
+    if not lease_manager.acquire(directory):
+        dir_logger.info(f"{directory} is claimed by another worker; skipping it")
+        return False
+    try:
+        create_or_update_json(directory, files, sources)
+    finally:
+        with pending_lock:
+            busy = directory in pending_directories
+        # Otherwise released once the rows are written (run_process_folder)
+        if not busy:
+            lease_manager.release(directory)
+    return True
+
+def scan_directory(directory):
+    """Read `directory` once and return (document file names, subdirectory entries, archive paths).
+
+    The DirEntry type information from the single os.scandir call is reused,
+    so no extra stat is made per entry on platforms that report it. Archives
+    are only listed with ARCHIVE_INGESTION.
+    """
+    files, subdirectories, archive_paths = [], [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
             try:
-                json.dump(data, f, indent=4)
-            except Exception as e:
-                general_logger.error(f"Error writing JSON file {json_path}: {e}")
+                if entry.is_dir():
+                    if entry.name not in EXCLUDED_DIRS:
+                        subdirectories.append(entry)
+                elif entry.is_file() and entry.name != JSON_FILENAME:
+                    if os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS:
+                        files.append(entry.name)
+                    elif ARCHIVE_INGESTION and is_archive(entry.name):
+                        archive_paths.append(entry.path)
+            except OSError as e:
+                general_logger.error(f"Error processing {entry.path}: {e}")
+    return files, subdirectories, archive_paths
+
+def is_archive(name):
+    return os.path.splitext(name)[1].lower() in ARCHIVE_EXTENSIONS
+
+def list_archive_contents(archive_path):
+    """update_directory for each folder the zip at `archive_path` would unpack to, reading the documents in place.
+
+    Returns False if a folder was left for later: the archive cannot be read
+    yet (typically still being copied in; its directory is written last) or
+    another instance holds a folder's lease.
+    """
+    import archives
+    try:
+        folders = archives.list_members(archive_path, VALID_EXTENSIONS)
     except Exception as e:
-        general_logger.error(f"Unexpected error in create_or_update_json for directory {directory}: {e}")
+        general_logger.error(f"Cannot read archive {archive_path}; trying again later: {e}")
+        return False
+    complete = True
+    for folder, sources in sorted(folders.items()):
+        try:
+            if os.path.isdir(folder) and directory_files(folder):
+                # Unpacked by hand as before; those copies are processed as an ordinary folder
+                dir_logger.info(f"{folder} already holds unpacked documents; not reading them from {archive_path}")
+                continue
+            os.makedirs(folder, exist_ok=True)
+            complete = update_directory(folder, sorted(sources), sources) and complete
+        except Exception:
+            report_error(f"Error processing {folder} from {archive_path}")
+    return complete
 
 def list_directory_contents(directory, indent=0):
     try:
-        if not os.path.exists(directory):
+        try:
+            files, subdirectories, archive_paths = scan_directory(directory)
+        except FileNotFoundError:
             general_logger.error(f"Directory '{directory}' does not exist!")
             return
-
-        try:
-            files = [
-                f for f in os.listdir(directory)
-                if os.path.isfile(os.path.join(directory, f)) 
-                and f != JSON_FILENAME
-                and os.path.splitext(f)[1].lower() in VALID_EXTENSIONS
-            ]
         except Exception as e:
             general_logger.error(f"Error listing files in {directory}: {e}")
             return
         
         if files:
             try:
-                create_or_update_json(directory, files)
-            except Exception as e:
-                general_logger.error(f"Error processing files in {directory}: {e}")
-        
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
+                update_directory(directory, files)
+            except Exception:
+                report_error(f"Error processing files in {directory}")
 
+        for archive_path in archive_paths:
+            list_archive_contents(archive_path)
+
+        if lease_manager is not None:
+            subdirectories = lease_manager.order(subdirectories)
+        for entry in subdirectories:
             try:
-                if os.path.isdir(item_path):
-                    if item in EXCLUDED_DIRS:\
-                        continue
-                    
-                    dir_logger.info(f"Processing directory: {item}/")
-                    print(f"Processing directory: {item}/")
-
-                    try:
-                        sub_files = [
-                            f for f in os.listdir(item_path)
-                            if os.path.isfile(os.path.join(item_path, f)) 
-                            and f != JSON_FILENAME
-                            and os.path.splitext(f)[1].lower() in VALID_EXTENSIONS
-                        ]
-                    except Exception as e:
-                        general_logger.error(f"Error listing files in {item_path}: {e}")
-                        continue
+                dir_logger.info(f"Processing directory: {entry.name}/")
+                print(f"Processing directory: {entry.name}/")
 
-                    if sub_files:
-                        try:
-                            create_or_update_json(item_path, sub_files)
-                        except Exception as e:
-                            general_logger.error(f"Error processing files in {item_path}: {e}")
-                    
-                    time.sleep(1)
-                    list_directory_contents(item_path, indent + 1)
-                
-            except Exception as e:
-                general_logger.error(f"Error processing {item_path}: {e}")
+                time.sleep(SUBDIRECTORY_DELAY)
+                list_directory_contents(entry.path, indent + 1)
+            except Exception:
+                report_error(f"Error processing {entry.path}")
     
-    except Exception as e:
-        general_logger.error(f"Unexpected error in list_directory_contents: {e}")
+    except Exception:
+        report_error("Unexpected error in list_directory_contents")
 
-# base_directory = input("Enter the base directory path: ")
+def directory_files(directory):
+    """Document files directly inside `directory`, as list_directory_contents selects them."""
+    return scan_directory(directory)[0]
 
-while True:
-    if not os.path.exists(base_directory):
+def watch_directory_tree(root):
+    """Process the tree once, then only the directories whose contents change."""
+    while not os.path.exists(root):
         general_logger.error("Invalid path. Try again.")
-        continue
-    dir_logger.info(f"Scanning '{base_directory}'...")
-    list_directory_contents(base_directory)
-    time.sleep(5)
+        time.sleep(SCAN_INTERVAL)
+
+    # Created before the first pass so files arriving during it are not missed
+    extensions = VALID_EXTENSIONS | ARCHIVE_EXTENSIONS if ARCHIVE_INGESTION else VALID_EXTENSIONS
+    watcher = dir_watcher.create_watcher(
+        root, EXCLUDED_DIRS, extensions,
+        settle_seconds=WATCH_SETTLE_SECONDS, poll_interval=SCAN_INTERVAL
+    )
+    dir_logger.info(f"Watching '{root}' using {type(watcher).__name__}")
+    try:
+        list_directory_contents(root)
+        while True:
+            for directory in watcher.changed_directories(timeout=60):
+                dir_logger.info(f"Change detected in {directory}")
+                with pending_lock:
+                    busy = directory in pending_directories
+                if busy:
+                    # Its previous rows are still queued for the database; look again once it is quiet
+                    watcher.defer(directory)
+                    continue
+                try:
+                    files, _, archive_paths = scan_directory(directory)
+                except OSError as e:
+                    general_logger.error(f"Error listing files in {directory}: {e}")
+                    continue
+                try:
+                    complete = update_directory(directory, files)
+                    for archive_path in archive_paths:
+                        complete = list_archive_contents(archive_path) and complete
+                    if not complete:
+                        # Another instance is on it, or an archive is still arriving; check again later
+                        watcher.defer(directory)
+                        continue
+                except Exception:
+                    report_error(f"Error processing files in {directory}")
+                watcher.mark_seen(directory)
+    finally:
+        watcher.close()
+
+# base_directory = input("Enter the base directory path: ")
+
+# Guarded so extraction worker processes (see EXTRACTION_WORKERS) can import this module without starting the loop
+if __name__ == "__main__":
+    if METRICS_ENABLED:
+        start_metrics()
+    if LEASES_ENABLED:
+        start_leases()
+
+    if SCAN_MODE == "watch":
+        watch_directory_tree(base_directory)
+
+    while True:
+        if not os.path.exists(base_directory):
+            general_logger.error("Invalid path. Try again.")
+            continue
+        dir_logger.info(f"Scanning '{base_directory}'...")
+        list_directory_contents(base_directory)
+        time.sleep(SCAN_INTERVAL)
 
 # print(f"\n📁 Scanning '{base_directory}'...\n")
 # list_directory_contents(base_directory)
\ No newline at end of file
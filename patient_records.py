@@ -0,0 +1,80 @@
+from datetime import datetime
+
+# Rows headed for the patient_data table.
+#
+# A PatientRecord is built once per processed document, with the name already
+# split and the dates already parsed, and goes unchanged from the folder pass
+# to the DB writer. This replaces the DataFrame that used to be built per
+# folder and reshaped with apply() before the insert; pandas is not needed on
+# this path.
+
+COLUMNS = (
+    "patient_first_name", "patient_last_name", "dob", "request_date",
+    "old_document", "new_document", "old_document_path", "new_document_path", "is_deleted",
+)
+
+# What a missing request date used to be filled with before the insert
+MISSING_REQUEST_DATE = datetime(1900, 1, 1)
+# Dates pd.to_datetime accepted; anything outside was stored as NULL
+DATE_MIN = datetime(1677, 9, 22)
+DATE_MAX = datetime(2262, 4, 11)
+
+
+def parse_db_date(value, missing=None):
+    """datetime for a "yyyy-mm-dd" string, None if it is not a valid date, `missing` if there is no value."""
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):  # None, or NaN from a DataFrame
+        return missing
+    try:
+        parsed = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return parsed if DATE_MIN <= parsed <= DATE_MAX else None
+
+
+class PatientRecord:
+    __slots__ = COLUMNS
+
+    def __init__(self, patient_first_name, patient_last_name, dob, request_date,
+                 old_document, new_document, old_document_path, new_document_path, is_deleted=0):
+        self.patient_first_name = patient_first_name
+        self.patient_last_name = patient_last_name
+        self.dob = dob
+        self.request_date = request_date
+        self.old_document = old_document
+        self.new_document = new_document
+        self.old_document_path = old_document_path
+        self.new_document_path = new_document_path
+        self.is_deleted = is_deleted
+
+    @classmethod
+    def from_row(cls, row):
+        """Record from a mapping with the patient_data columns and "yyyy-mm-dd" dates, as the DataFrame had."""
+        return cls(
+            row["patient_first_name"],
+            row["patient_last_name"] if isinstance(row["patient_last_name"], str) else "",
+            parse_db_date(row["dob"]),
+            parse_db_date(row["request_date"], MISSING_REQUEST_DATE),
+            row["old_document"],
+            row["new_document"],
+            row["old_document_path"],
+            row["new_document_path"],
+            row.get("is_deleted", 0),
+        )
+
+    def values(self):
+        return tuple(getattr(self, name) for name in COLUMNS)
+
+    def params(self):
+        """Bind parameters for db_data_insert.insert_query."""
+        return dict(zip(COLUMNS, self.values()))
+
+    def __eq__(self, other):
+        return isinstance(other, PatientRecord) and self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        return f"PatientRecord({self.old_document!r} -> {self.new_document!r})"
@@ -0,0 +1,126 @@
+import errno
+import os
+import shutil
+import sys
+
+# How classified documents are put into Processed / Unprocessed.
+#
+#   "copy"     - shutil.copy2, a full byte copy (the original behaviour)
+#   "hardlink" - a second directory entry for the same data; no bytes written
+#   "reflink"  - a copy-on-write clone (Linux FICLONE: Btrfs, XFS, ...)
+#   "move"     - rename the source into place; the source folder loses the file
+#
+# Anything that cannot be done without copying (different devices, a
+# filesystem without links or clones) falls back to copy2, so every mode
+# always leaves the destination in place. Hardlinked files share their data
+# with the source: editing one edits the other. Documents inside zip batches
+# (archives.py) are always copied out, whatever the mode.
+
+PLACEMENT_MODES = ("copy", "hardlink", "reflink", "move")
+
+FICLONE = 0x40049409
+
+# errno values meaning "this filesystem or pair of paths can't do it", as opposed to a real failure
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EINVAL, errno.ENOTSUP,
+                    getattr(errno, "EOPNOTSUPP", errno.ENOTSUP), errno.ENOTTY, errno.EMLINK}
+
+
+class PlacementStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes_copied = 0
+        self.bytes_avoided = 0
+        self.methods = {}
+
+    def record(self, method, size):
+        self.files += 1
+        self.methods[method] = self.methods.get(method, 0) + 1
+        if method == "copy":
+            self.bytes_copied += size
+        else:
+            self.bytes_avoided += size
+
+    def merge(self, other):
+        self.files += other.files
+        self.bytes_copied += other.bytes_copied
+        self.bytes_avoided += other.bytes_avoided
+        for method, count in other.methods.items():
+            self.methods[method] = self.methods.get(method, 0) + count
+
+    def summary(self):
+        methods = ", ".join(f"{method}={count}" for method, count in sorted(self.methods.items()))
+        return (f"{self.files} files placed ({methods or 'none'}), "
+                f"{self.bytes_copied} bytes copied, {self.bytes_avoided} bytes avoided")
+
+
+def _temporary_name(destination):
+    directory, name = os.path.split(destination)
+    return os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+
+
+def _hardlink(source, destination):
+    # Link under a temporary name and rename over the destination, which may
+    # already exist (an allocator placeholder or an earlier Unprocessed copy)
+    temporary = _temporary_name(destination)
+    os.link(source, temporary)
+    try:
+        os.replace(temporary, destination)
+    except OSError:
+        os.remove(temporary)
+        raise
+
+
+def _reflink(source, destination):
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOTSUP, "reflink is only supported on Linux", destination)
+    import fcntl
+    temporary = _temporary_name(destination)
+    try:
+        with open(source, "rb") as src, open(temporary, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, temporary)
+        os.replace(temporary, destination)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def place_file(source, destination, mode="copy", stats=None):
+    """Put `source` at `destination` using `mode`, falling back to copy2; returns the method used."""
+    if mode not in PLACEMENT_MODES:
+        raise ValueError(f"Unknown placement mode {mode!r}; expected one of {PLACEMENT_MODES}")
+    method = "copy"
+    if not isinstance(source, (str, os.PathLike)):
+        # An ArchiveMember: only a copy can take a document out of a zip batch
+        import archives
+        archives.copy_member(source, destination)
+        if stats is not None:
+            stats.record(method, source.size)
+        return method
+    size = os.path.getsize(source)
+
+    if mode == "hardlink" or mode == "reflink":
+        try:
+            (_hardlink if mode == "hardlink" else _reflink)(source, destination)
+            method = mode
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+            shutil.copy2(source, destination)
+    elif mode == "move":
+        try:
+            os.replace(source, destination)
+            method = "move"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(source, destination)
+    else:
+        shutil.copy2(source, destination)
+
+    if stats is not None:
+        stats.record(method, size)
+    return method
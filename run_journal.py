@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+
+from logger import general_logger
+
+# Crash-safe record of a folder pass, kept as JOURNAL_FILENAME in the folder
+# until its directory_info.json has been written.
+#
+# process_folder appends one JSON line per file and step:
+#
+#   "extracted"  the outcome and fields, and the Processed name allocated
+#   "placed"     the file is in Processed or Unprocessed
+#   "committed"  its row is in the database
+#
+# All "extracted" lines of a pass are fsync'd together before any file is
+# placed, so a pass restarted after a crash reuses the same Processed names
+# instead of allocating "_1" copies. "placed" lines are fsync'd before the
+# rows go to the database and "committed" once they are written. For files
+# whose size and mtime still match, the restarted pass skips what the journal
+# says was done: committed files entirely, placed files up to the database
+# write, extracted files up to placement. A processed file moved away
+# (PLACEMENT_MODE "move") by a pass cut short before its "placed" line counts
+# as placed once its Processed name holds a file of its size.
+#
+# A torn last line (the process died while writing it) is ignored. A journal
+# holding many superseded lines is rewritten with one line per file.
+
+JOURNAL_FILENAME = "directory_journal.jsonl"
+STATES = ("extracted", "placed", "committed")
+# Rewrite the journal on open once it has this many lines and over twice as many lines as files
+COMPACT_MIN_LINES = 1000
+
+
+class RunJournal:
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.path = os.path.join(directory, JOURNAL_FILENAME)
+        self.fsync = fsync
+        # File name -> its latest "extracted" line, with "state" advanced by later lines
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._torn = False
+        lines = self._load()
+        if lines >= COMPACT_MIN_LINES and lines > 2 * len(self.entries):
+            self.compact()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            general_logger.error(f"Cannot read run journal {self.path}, starting a new one: {e}")
+            return 0
+        for line in lines:
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue  # torn write
+        self._torn = bool(lines) and not lines[-1].endswith("\n")
+        return len(lines)
+
+    def _apply(self, record):
+        if "file" in record:
+            self.entries[record["file"]] = record
+            return
+        for name in record["files"]:
+            entry = self.entries.get(name)
+            if entry is not None:
+                entry["state"] = record["state"]
+
+    def _append(self, records):
+        if not records:
+            return
+        text = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+                if self._torn:
+                    # End the torn line so it cannot swallow the next one
+                    self._file.write("\n")
+                    self._torn = False
+            self._file.write(text)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            for record in records:
+                self._apply(record)
+
+    def lookup(self, name, path):
+        """The entry for `name` if the file at `path` is the one it was recorded for, else None."""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        try:
+            st = _stat(path)
+        except FileNotFoundError:
+            # Moved into place (PLACEMENT_MODE "move"); nothing left to redo before that
+            return entry if entry["state"] != "extracted" else None
+        if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime"]:
+            return entry
+        return None
+
+    def unlisted_placed(self, names, processed_folder):
+        """Entries placed but not committed whose file is not in `names` because it was moved away.
+
+        An entry still "extracted" counts too when its name in
+        `processed_folder` holds a file of the recorded size: the pass was cut
+        short after moving it but before writing the "placed" lines.
+        """
+        names = set(names)
+        return [entry for name, entry in self.entries.items()
+                if name not in names and entry["outcome"] == "processed"
+                and (entry["state"] == "placed" or entry["state"] == "extracted" and _moved(entry, processed_folder))
+                and not os.path.exists(os.path.join(self.directory, name))]
+
+    def committed(self):
+        return [name for name, entry in self.entries.items() if entry["state"] == "committed"]
+
+    def record_extracted(self, items):
+        """Record (name, path, outcome, fields, new name) for freshly classified files."""
+        records = []
+        for name, path, outcome, fields, new_name in items:
+            try:
+                st = _stat(path)
+            except OSError:
+                continue
+            records.append({"file": name, "state": "extracted", "size": st.st_size, "mtime": st.st_mtime_ns,
+                            "outcome": outcome, "fields": fields, "name": new_name})
+        self._append(records)
+
+    def record_placed(self, names):
+        if names:
+            self._append([{"state": "placed", "files": list(names)}])
+
+    def record_committed(self, names):
+        if names:
+            self._append([{"state": "committed", "files": list(names)}])
+
+    def compact(self):
+        """Rewrite the journal with one line per file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(temporary, "w", encoding="utf-8") as f:
+                    for entry in self.entries.values():
+                        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary, self.path)
+                self._torn = False
+            except OSError as e:
+                general_logger.error(f"Cannot compact run journal {self.path}: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _stat(path):
+    # An ArchiveMember (archives.py) reports the size and mtime recorded in its archive
+    return os.stat(path) if isinstance(path, (str, os.PathLike)) else path.stat()
+
+
+def _moved(entry, processed_folder):
+    try:
+        return os.path.getsize(os.path.join(processed_folder, entry["name"])) == entry["size"]
+    except OSError:
+        return False
+
+
+def clear(directory):
+    """Remove the journal of `directory` once its pass is fully recorded in directory_info.json."""
+    try:
+        os.remove(os.path.join(directory, JOURNAL_FILENAME))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        general_logger.error(f"Cannot remove run journal in {directory}: {e}")